@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright (c) 2016 Dean Jackson <deanishe@deanishe.net>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2016-06-18
+#
+
+"""Benchmark BIFF8 record parsing in records/sec.
+
+The workbooks generated by `workbooks.py` contain little but the cell
+records xlrd unpacks in place. This script writes BIFF8 workbooks that
+also have the records that are dispatched to a handler (formulas,
+booleans, blank runs, column info, merged cells, sheet settings) and
+records that xlrd ignores, and times xlrd.open_workbook() on them with
+and without formatting_info.
+
+Usage:
+
+    python bench/records.py --rows 20000 --json before.json
+    python bench/records.py --rows 20000 --compare before.json
+
+"""
+
+from __future__ import print_function, absolute_import, division
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import struct
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.join(os.path.dirname(HERE), 'src')
+
+sys.path.insert(0, HERE)
+sys.path.insert(0, SRC)
+
+import workbooks  # noqa: E402
+from workbooks import (  # noqa: E402
+    BOF, EOF, DIMENSIONS, ROW, NUMBER, LABELSST, WINDOW2,
+    STRING, DATE, XF_GENERAL, XF_DATE, record,
+)
+
+# More BIFF8 record codes
+FORMULA = 0x0006
+BOOLERR = 0x0205
+MULBLANK = 0x00BE
+BLANK = 0x0201
+DBCELL = 0x00D7
+COLINFO = 0x007D
+DEFCOLWIDTH = 0x0055
+DEFAULTROWHEIGHT = 0x0225
+MERGEDCELLS = 0x00E5
+SCL = 0x00A0
+PANE = 0x0041
+SELECTION = 0x001D
+HEADER = 0x0014
+CALCMODE = 0x000D
+
+# Cells added to the right of the table's columns in each row:
+# a formula, a boolean, a blank and a run of blanks
+EXTRA_COLS = 6
+
+# ptgInt 1, ptgInt 2, ptgAdd
+FORMULA_TOKENS = b'\x1e\x01\x00\x1e\x02\x00\x03'
+
+
+def log(s, *args):
+    """Simple STDERR logger."""
+    if args:
+        s = s % args
+    print(s, file=sys.stderr)
+
+
+def mixed_sheet(table, rows):
+    """Worksheet substream for `rows` with a mix of record types."""
+    kinds = table.kinds
+    ncols = len(kinds)
+    lastcol = ncols + EXTRA_COLS
+    out = [record(BOF, struct.pack('<HHHHII', 0x0600, 0x0010,
+                                   0x0DBB, 0x07CC, 0, 6)),
+           record(CALCMODE, struct.pack('<h', 1)),
+           record(HEADER),
+           record(DEFCOLWIDTH, struct.pack('<H', 8)),
+           record(DEFAULTROWHEIGHT, struct.pack('<HH', 0, 255))]
+    for colx in range(lastcol):
+        out.append(record(COLINFO, struct.pack('<HHHHHH', colx, colx,
+                                               2500, XF_GENERAL, 0, 0)))
+    out.append(record(DIMENSIONS, struct.pack('<IIHHH', 0, len(rows),
+                                              0, lastcol, 0)))
+    for block in range(0, len(rows), 32):
+        chunk = rows[block:block + 32]
+        for rowx in range(block, block + len(chunk)):
+            out.append(record(ROW, struct.pack('<HHHHHHI', rowx, 0, lastcol,
+                                               0xFF, 0, 0, 0x100)))
+        for rowx, row in enumerate(chunk, block):
+            for colx, v in enumerate(row):
+                if kinds[colx] == STRING:
+                    out.append(record(LABELSST, struct.pack(
+                        '<HHHI', rowx, colx, XF_GENERAL, v)))
+                else:
+                    xf = XF_DATE if kinds[colx] == DATE else XF_GENERAL
+                    out.append(record(NUMBER, struct.pack(
+                        '<HHHd', rowx, colx, xf, v)))
+            out.append(record(FORMULA, struct.pack(
+                '<HHHdHIH', rowx, ncols, XF_GENERAL, 3.0, 0, 0,
+                len(FORMULA_TOKENS)) + FORMULA_TOKENS))
+            out.append(record(BOOLERR, struct.pack(
+                '<HHHBB', rowx, ncols + 1, XF_GENERAL, rowx & 1, 0)))
+            out.append(record(BLANK, struct.pack(
+                '<HHH', rowx, ncols + 2, XF_GENERAL)))
+            blanks = [struct.pack('<HH', rowx, ncols + 3)]
+            blanks.extend(struct.pack('<H', XF_GENERAL)
+                          for _ in range(ncols + 3, lastcol))
+            blanks.append(struct.pack('<H', lastcol - 1))
+            out.append(record(MULBLANK, b''.join(blanks)))
+        # Excel follows each block with a DBCELL, which xlrd ignores
+        out.append(record(DBCELL, struct.pack('<I', 0) + b'\0\0' * len(chunk)))
+    merged = [(rowx, rowx, ncols + 3, lastcol - 1)
+              for rowx in range(0, len(rows), 100)][:1000]
+    out.append(record(MERGEDCELLS, struct.pack('<H', len(merged)) + b''.join(
+        struct.pack('<HHHH', *m) for m in merged)))
+    out.append(record(WINDOW2, struct.pack('<HHHHHHHI', 0x06B6, 0, 0,
+                                           0x40, 0, 0, 0, 0)))
+    out.append(record(SCL, struct.pack('<HH', 1, 1)))
+    out.append(record(PANE, struct.pack('<HHHHB', 0, 1, 1, 0, 2)))
+    out.append(record(SELECTION, struct.pack('<BHHHHHHBB', 3, 1, 0, 0,
+                                             1, 1, 1, 0, 0)))
+    out.append(record(EOF))
+    return b''.join(out)
+
+
+def write_mixed_xls(table, path):
+    """Write `table` to `path` as a BIFF8 workbook of mixed records."""
+    if table.shape.rows > 65536 or len(table.kinds) + EXTRA_COLS > 256:
+        raise ValueError('BIFF8 worksheets are limited to 65536 rows '
+                         'and 256 columns')
+    sheets = [mixed_sheet(table, rows) for rows in table.sheets]
+    size = len(workbooks.biff_globals(table, [0] * len(sheets)))
+    offsets = []
+    for data in sheets:
+        offsets.append(size)
+        size += len(data)
+    stream = workbooks.biff_globals(table, offsets) + b''.join(sheets)
+    with open(path, 'wb') as fp:
+        fp.write(workbooks.ole2_document(stream,
+                                         fragment=table.shape.fragment))
+
+
+def time_open(path, repeat, **kwargs):
+    """Open `path` `repeat` times and return the best result.
+
+    Returns:
+        dict: ``seconds`` (fastest run), ``records`` and
+            ``records_per_sec``.
+
+    """
+    from xlrd import open_workbook
+    best = None
+    records = 0
+    for _ in range(repeat):
+        st = time.time()
+        wb = open_workbook(path, **kwargs)
+        elapsed = time.time() - st
+        records = wb.stats.records
+        wb.release_resources()
+        if best is None or elapsed < best:
+            best = elapsed
+    return {
+        'seconds': best,
+        'records': records,
+        'records_per_sec': records / best if best else 0.0,
+    }
+
+
+def environment():
+    """Versions of things that affect the results."""
+    import xlrd
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'xlrd': xlrd.__VERSION__,
+    }
+
+
+def print_results(results, previous=None):
+    """Print results as a table, compared to `previous` if given."""
+    old = {}
+    for r in (previous or {}).get('results', []):
+        old[r['mode']] = r
+
+    head = '{:<10} {:>9} {:>10} {:>12}'.format(
+        'mode', 'records', 'seconds', 'records/sec')
+    if old:
+        head += ' {:>8}'.format('speedup')
+    print(head)
+    print('-' * len(head))
+    for r in results:
+        line = '{mode:<10} {records:>9d} {seconds:>10.4f} ' \
+               '{records_per_sec:>12.0f}'.format(**r)
+        prev = old.get(r['mode'])
+        if prev and r['seconds']:
+            line += ' {:>7.2f}x'.format(prev['seconds'] / r['seconds'])
+        print(line)
+
+
+def parse_args():
+    """Parse command-line options."""
+    p = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    p.add_argument('-n', '--repeat', type=int, default=3,
+                   help="Runs of each mode. The fastest is reported. "
+                   "Default: %(default)s")
+    p.add_argument('--json', metavar='FILE',
+                   help="Save results to FILE as JSON")
+    p.add_argument('--compare', metavar='FILE',
+                   help="Compare results to those saved in FILE")
+    p.add_argument('--keep', metavar='FILE',
+                   help="Save the generated workbook as FILE")
+    workbooks.add_shape_args(p)
+    return p.parse_args()
+
+
+def main():
+    """Run benchmark."""
+    o = parse_args()
+    shape = workbooks.shape_from_args(o)
+
+    previous = None
+    if o.compare:
+        with open(o.compare) as fp:
+            previous = json.load(fp)
+
+    tempdir = tempfile.mkdtemp(prefix='isyn-bench-')
+    path = o.keep or os.path.join(tempdir, 'records.xls')
+
+    report = environment()
+    report['shape'] = dict(vars(shape))
+    report['results'] = results = []
+    log('%s', shape)
+    try:
+        log('Generating %s ...', path)
+        write_mixed_xls(workbooks.Table(shape), path)
+        for mode, kwargs in (('values', {}),
+                             ('formatting', {'formatting_info': True})):
+            log('Timing %s ...', mode)
+            r = time_open(path, o.repeat, **kwargs)
+            r['mode'] = mode
+            results.append(r)
+    finally:
+        shutil.rmtree(tempdir)
+
+    print_results(results, previous)
+
+    if o.json:
+        with open(o.json, 'w') as fp:
+            json.dump(report, fp, indent=2, sort_keys=True)
+        log('Saved results to %s', o.json)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
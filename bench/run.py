@@ -0,0 +1,330 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright (c) 2016 Dean Jackson <deanishe@deanishe.net>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2016-05-21
+#
+
+"""Benchmark reading workbooks with xlrd and I Sheet You Not.
+
+Generates synthetic workbooks (see `workbooks.py`) and times the stages
+of turning them into Alfred results:
+
+    open   xlrd.open_workbook() on the whole workbook
+    expat  The same with use_expat=True (XLSX only)
+    multi  The same with the sheets loaded in one process per CPU
+    read   isheetyounot.core.read_data() on the first worksheet
+    json   Serialising read_data()'s results to Alfred JSON
+    cache  A complete run of the workflow script that hits the cache
+
+Each stage runs in a fresh child process, so its peak RSS can be
+measured in isolation. The "cache" stage is timed from the outside and
+so includes interpreter start-up; the other stages are timed inside
+the child.
+
+Results are printed as a table and optionally saved as JSON, which
+can be passed to a later run with --compare to compare releases.
+
+Usage:
+
+    python bench/run.py --rows 50000 --json before.json
+    python bench/run.py --rows 50000 --compare before.json
+
+"""
+
+from __future__ import print_function, absolute_import, division
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.join(os.path.dirname(HERE), 'src')
+
+sys.path.insert(0, HERE)
+sys.path.insert(0, SRC)
+
+import workbooks  # noqa: E402
+
+STAGES = ('open', 'expat', 'multi', 'read', 'json', 'cache')
+FORMATS = ('xlsx', 'xlsb', 'xls')
+
+# Stages that only make sense for some formats
+STAGE_FORMATS = {
+    'expat': ('xlsx',),
+}
+
+
+def log(s, *args):
+    """Simple STDERR logger."""
+    if args:
+        s = s % args
+    print(s, file=sys.stderr)
+
+
+def maxrss_mb(rusage):
+    """Peak RSS in MB from a `resource.struct_rusage`."""
+    # Linux reports kilobytes, OS X bytes
+    if sys.platform == 'darwin':
+        return rusage.ru_maxrss / (1024 * 1024)
+    return rusage.ru_maxrss / 1024
+
+
+# ---------------------------------------------------------------------
+# Child processes
+# ---------------------------------------------------------------------
+
+def stage_open(path):
+    """Open the whole workbook."""
+    from xlrd import open_workbook
+    st = time.time()
+    wb = open_workbook(path)
+    elapsed = time.time() - st
+    return elapsed, sum(s.nrows for s in wb.sheets())
+
+
+def stage_expat(path):
+    """Open the whole workbook, parsing worksheets with expat."""
+    from xlrd import open_workbook
+    st = time.time()
+    wb = open_workbook(path, use_expat=True)
+    elapsed = time.time() - st
+    return elapsed, sum(s.nrows for s in wb.sheets())
+
+
+def stage_multi(path):
+    """Open the whole workbook, loading sheets in worker processes."""
+    import multiprocessing
+    from xlrd import open_workbook
+    st = time.time()
+    wb = open_workbook(path, processes=multiprocessing.cpu_count())
+    elapsed = time.time() - st
+    return elapsed, sum(s.nrows for s in wb.sheets())
+
+
+def stage_read(path):
+    """Generate Alfred results from the first worksheet."""
+    from isheetyounot.core import read_data
+    st = time.time()
+    items = read_data(path, '1', [1, 2, 3])
+    return time.time() - st, len(items)
+
+
+def stage_json(path):
+    """Serialise Alfred results to JSON."""
+    from isheetyounot.aw3 import Feedback
+    from isheetyounot.core import read_data
+    items = read_data(path, '1', [1, 2, 3])
+    st = time.time()
+    str(Feedback(items))
+    return time.time() - st, len(items)
+
+
+CHILD_STAGES = {
+    'open': stage_open,
+    'expat': stage_expat,
+    'multi': stage_multi,
+    'read': stage_read,
+    'json': stage_json,
+}
+
+
+def child(stage, path):
+    """Run `stage` on `path` and print the result as JSON."""
+    # Keep per-row logging out of the timings' way, but still pay for it
+    devnull = open(os.devnull, 'w')
+    stderr, sys.stderr = sys.stderr, devnull
+    try:
+        elapsed, rows = CHILD_STAGES[stage](path)
+    finally:
+        sys.stderr = stderr
+    print(json.dumps({'seconds': elapsed, 'rows': rows}))
+    return 0
+
+
+# ---------------------------------------------------------------------
+# Parent process
+# ---------------------------------------------------------------------
+
+def spawn(cmd, env=None, cwd=None):
+    """Run `cmd` and return its output, wall time and peak RSS.
+
+    Returns:
+        tuple: ``(stdout, seconds, maxrss_mb)``
+
+    """
+    devnull = open(os.devnull, 'w')
+    st = time.time()
+    p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=devnull,
+                         env=env, cwd=cwd)
+    out = p.stdout.read()
+    _, status, rusage = os.wait4(p.pid, 0)
+    elapsed = time.time() - st
+    p.stdout.close()
+    p.returncode = status
+    if status:
+        raise RuntimeError('command failed ({}): {!r}'.format(status, cmd))
+    return out, elapsed, maxrss_mb(rusage)
+
+
+def run_stage(stage, path, rows, repeat, env):
+    """Run `stage` `repeat` times and return the best result.
+
+    Returns:
+        dict: ``seconds`` (fastest run), ``rows``, ``rows_per_sec``
+            and ``maxrss_mb`` (largest of all runs).
+
+    """
+    best = None
+    rss = 0.0
+    if stage == 'cache':
+        cmd = [sys.executable, '-m', 'isheetyounot', '-p', path]
+        spawn(cmd, env, SRC)  # warm cache
+    else:
+        cmd = [sys.executable, os.path.abspath(__file__),
+               '--child', stage, path]
+
+    for _ in range(repeat):
+        out, elapsed, maxrss = spawn(cmd, env, SRC)
+        if stage != 'cache':
+            d = json.loads(out)
+            elapsed, rows = d['seconds'], d['rows']
+        rss = max(rss, maxrss)
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return {
+        'seconds': best,
+        'rows': rows,
+        'rows_per_sec': rows / best if best else 0.0,
+        'maxrss_mb': rss,
+    }
+
+
+def environment():
+    """Versions of things that affect the results."""
+    import xlrd
+    from isheetyounot.core import version
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'xlrd': xlrd.__VERSION__,
+        'isheetyounot': version,
+    }
+
+
+def print_results(results, previous=None):
+    """Print results as a table, compared to `previous` if given."""
+    old = {}
+    for r in (previous or {}).get('results', []):
+        old[(r['format'], r['stage'])] = r
+
+    head = '{:<6} {:<6} {:>8} {:>10} {:>12} {:>9}'.format(
+        'format', 'stage', 'rows', 'seconds', 'rows/sec', 'RSS (MB)')
+    if old:
+        head += ' {:>8}'.format('speedup')
+    print(head)
+    print('-' * len(head))
+    for r in results:
+        line = '{format:<6} {stage:<6} {rows:>8d} {seconds:>10.4f} ' \
+               '{rows_per_sec:>12.0f} {maxrss_mb:>9.1f}'.format(**r)
+        prev = old.get((r['format'], r['stage']))
+        if prev and r['seconds']:
+            line += ' {:>7.2f}x'.format(prev['seconds'] / r['seconds'])
+        print(line)
+
+
+def parse_args():
+    """Parse command-line options."""
+    p = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    p.add_argument('--child', nargs=2, metavar=('STAGE', 'FILE'),
+                   help=argparse.SUPPRESS)
+    p.add_argument('-f', '--formats', default=','.join(FORMATS),
+                   help="Comma-separated workbook formats to test. "
+                   "Default: %(default)s")
+    p.add_argument('-s', '--stages', default=','.join(STAGES),
+                   help="Comma-separated stages to time. "
+                   "Default: %(default)s")
+    p.add_argument('-n', '--repeat', type=int, default=3,
+                   help="Runs of each stage. The fastest is reported. "
+                   "Default: %(default)s")
+    p.add_argument('--json', metavar='FILE',
+                   help="Save results to FILE as JSON")
+    p.add_argument('--compare', metavar='FILE',
+                   help="Compare results to those saved in FILE")
+    p.add_argument('--keep', metavar='DIR',
+                   help="Generate workbooks in DIR and keep them")
+    workbooks.add_shape_args(p)
+    return p.parse_args()
+
+
+def main():
+    """Run benchmarks."""
+    o = parse_args()
+    if o.child:
+        return child(*o.child)
+
+    shape = workbooks.shape_from_args(o)
+    formats = [s.strip() for s in o.formats.split(',') if s.strip()]
+    stages = [s.strip() for s in o.stages.split(',') if s.strip()]
+    for s in stages:
+        if s not in STAGES:
+            log('Unknown stage: %s', s)
+            return 1
+
+    previous = None
+    if o.compare:
+        with open(o.compare) as fp:
+            previous = json.load(fp)
+
+    tempdir = tempfile.mkdtemp(prefix='isyn-bench-')
+    outdir = o.keep or tempdir
+    if not os.path.exists(outdir):
+        os.makedirs(outdir)
+
+    env = dict(os.environ)
+    env.pop('METRICS_FILE', None)
+    env['alfred_workflow_cache'] = os.path.join(tempdir, 'cache')
+    env['DEV'] = '1'  # don't try to change the bundle ID
+    env['PYTHONPATH'] = SRC
+
+    report = environment()
+    report['shape'] = dict(vars(shape))
+    report['results'] = results = []
+    log('%s', shape)
+    try:
+        for fmt in formats:
+            path = os.path.join(outdir, 'bench.{}'.format(fmt))
+            log('Generating %s ...', path)
+            workbooks.generate(path, shape)
+            for stage in stages:
+                if fmt not in STAGE_FORMATS.get(stage, (fmt,)):
+                    continue
+                log('Timing %s/%s ...', fmt, stage)
+                r = run_stage(stage, path, shape.rows, o.repeat, env)
+                r.update(format=fmt, stage=stage)
+                results.append(r)
+    finally:
+        shutil.rmtree(tempdir)
+
+    print_results(results, previous)
+
+    if o.json:
+        with open(o.json, 'wb') as fp:
+            json.dump(report, fp, indent=2, sort_keys=True)
+        log('Saved results to %s', o.json)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
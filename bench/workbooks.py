@@ -0,0 +1,868 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright (c) 2016 Dean Jackson <deanishe@deanishe.net>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2016-05-21
+#
+
+"""Generate synthetic Excel workbooks for benchmarking.
+
+Workbooks are written in XLSX, XLSB or BIFF8 (.xls) format without any
+third-party libraries. Their shape (rows, columns, mix of cell types,
+uniqueness of strings and number of sheets) is configurable and their
+contents are fully determined by the random seed, so the same command
+always produces the same workbook.
+
+BIFF8 workbooks can also be laid out the way Excel sometimes writes
+them: with shared strings split across CONTINUE records (--split-strings)
+and with the Workbook stream's sectors out of order (--fragment).
+
+Usage:
+
+    python bench/workbooks.py -o big.xlsx --rows 100000 --cols 10
+
+"""
+
+from __future__ import print_function, absolute_import, division
+
+import argparse
+import os
+import random
+import struct
+import sys
+import tempfile
+import zipfile
+from xml.sax.saxutils import escape
+
+
+# Cell kinds
+STRING, NUMBER, DATE = 'string', 'number', 'date'
+
+# Excel serial number of 2000-01-01
+DATE_BASE = 36526
+
+WORDS = ('alpha bravo charlie delta echo foxtrot golf hotel india juliet '
+         'kilo lima mike november oscar papa quebec romeo sierra tango '
+         'uniform victor whiskey xray yankee zulu').split()
+
+
+def log(s, *args):
+    """Simple STDERR logger."""
+    if args:
+        s = s % args
+    print(s, file=sys.stderr)
+
+
+def colname(colx):
+    """Excel column name for 0-based column index, e.g. 0 -> A, 26 -> AA."""
+    name = ''
+    while True:
+        colx, rem = divmod(colx, 26)
+        name = chr(65 + rem) + name
+        if not colx:
+            return name
+        colx -= 1
+
+
+class Shape(object):
+    """Shape and contents of a synthetic workbook.
+
+    Attributes:
+        rows (int): Rows per sheet.
+        cols (int): Columns per sheet.
+        strings (float): Share of columns containing strings.
+        numbers (float): Share of columns containing numbers.
+        dates (float): Share of columns containing dates.
+        unique (float): Share of string cells with a unique value.
+        sheets (int): Number of worksheets.
+        seed (int): Random seed.
+        split_strings (bool): Split BIFF8 shared strings across
+            CONTINUE records instead of starting a new record with
+            a string that doesn't fit.
+        fragment (bool): Interleave the sectors of the BIFF8
+            Workbook stream, so it isn't contiguous.
+
+    """
+
+    def __init__(self, rows=1000, cols=10, strings=0.5, numbers=0.3,
+                 dates=0.2, unique=0.5, sheets=1, seed=1,
+                 split_strings=False, fragment=False):
+        """Create new `Shape`."""
+        self.rows = rows
+        self.cols = cols
+        self.strings = strings
+        self.numbers = numbers
+        self.dates = dates
+        self.unique = unique
+        self.sheets = sheets
+        self.seed = seed
+        self.split_strings = split_strings
+        self.fragment = fragment
+
+    def __repr__(self):
+        """Shape as string."""
+        return ('Shape(rows={s.rows}, cols={s.cols}, strings={s.strings}, '
+                'numbers={s.numbers}, dates={s.dates}, unique={s.unique}, '
+                'sheets={s.sheets}, seed={s.seed}, '
+                'split_strings={s.split_strings}, '
+                'fragment={s.fragment})').format(s=self)
+
+    def kinds(self):
+        """Kind of cell in each column.
+
+        The first column always contains strings, as it's used for
+        result titles. The remaining columns are allocated by share,
+        rounding by largest remainder.
+
+        Returns:
+            list: `STRING`, `NUMBER` or `DATE` for each column.
+
+        """
+        shares = [(STRING, self.strings), (NUMBER, self.numbers),
+                  (DATE, self.dates)]
+        total = sum(s for _, s in shares) or 1.0
+        exact = [(k, self.cols * s / total) for k, s in shares]
+        counts = dict((k, int(n)) for k, n in exact)
+        left = self.cols - sum(counts.values())
+        for k, n in sorted(exact, key=lambda t: t[1] - int(t[1]),
+                           reverse=True)[:left]:
+            counts[k] += 1
+
+        kinds = []
+        for k, _ in shares:
+            kinds.extend([k] * counts[k])
+        if STRING in kinds:
+            kinds.remove(STRING)
+            kinds.insert(0, STRING)
+        # interleave, so the default title, subtitle and value
+        # columns aren't all the same kind
+        head, tail = kinds[:1], kinds[1:]
+        rng = random.Random(self.seed)
+        rng.shuffle(tail)
+        return head + tail
+
+
+class Table(object):
+    """Cell contents of a synthetic workbook.
+
+    Attributes:
+        kinds (list): Kind of each column.
+        strings (list): Shared strings (unique string values).
+        sheets (list): For each sheet, a list of rows. Each row is
+            a list of string indices (for string columns) and floats
+            (for number and date columns).
+
+    """
+
+    def __init__(self, shape):
+        """Generate table of `shape`."""
+        self.shape = shape
+        self.kinds = kinds = shape.kinds()
+        rng = random.Random(shape.seed)
+        nstr = kinds.count(STRING) * shape.rows * shape.sheets
+        npool = max(1, int(nstr * shape.unique))
+        self.strings = [self._string(rng, i) for i in range(npool)]
+
+        self.sheets = []
+        for _ in range(shape.sheets):
+            rows = []
+            for _ in range(shape.rows):
+                row = []
+                for kind in kinds:
+                    if kind == STRING:
+                        row.append(rng.randrange(npool))
+                    elif kind == NUMBER:
+                        row.append(self._number(rng))
+                    else:
+                        row.append(float(DATE_BASE + rng.randrange(9000)))
+                rows.append(row)
+            self.sheets.append(rows)
+
+    def _string(self, rng, i):
+        """Generate a string value."""
+        words = ' '.join(rng.choice(WORDS) for _ in range(rng.randrange(1, 5)))
+        return u'{} {:06d}'.format(words, i)
+
+    def _number(self, rng):
+        """Generate a mix of integers, 2-dp and full-precision values."""
+        v = rng.uniform(0, 1000000)
+        digits = rng.choice((0, 0, 2, None))
+        if digits is None:
+            return v
+        return round(v, digits)
+
+
+# ---------------------------------------------------------------------
+# XLSX
+# ---------------------------------------------------------------------
+
+XLSX_CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>
+<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>
+<Override PartName="/xl/sharedStrings.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/>
+{sheets}
+</Types>"""
+
+XLSX_CONTENT_TYPE_SHEET = (
+    '<Override PartName="/xl/worksheets/sheet{n}.xml" ContentType="'
+    'application/vnd.openxmlformats-officedocument.spreadsheetml.'
+    'worksheet+xml"/>')
+
+XLSX_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>
+</Relationships>"""
+
+XLSX_WORKBOOK = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">
+<workbookPr date1904="false"/>
+<sheets>
+{sheets}
+</sheets>
+</workbook>"""
+
+XLSX_WORKBOOK_SHEET = '<sheet name="Sheet{n}" sheetId="{n}" r:id="rId{n}"/>'
+
+XLSX_WORKBOOK_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+{sheets}
+<Relationship Id="rIdStyles" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>
+<Relationship Id="rIdSST" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/sharedStrings" Target="sharedStrings.xml"/>
+</Relationships>"""
+
+XLSX_WORKBOOK_REL_SHEET = (
+    '<Relationship Id="rId{n}" Type="http://schemas.openxmlformats.org/'
+    'officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet{n}.xml"/>')
+
+XLSX_STYLES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">
+<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>
+<fills count="1"><fill><patternFill patternType="none"/></fill></fills>
+<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>
+<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>
+<cellXfs count="2">
+<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>
+<xf numFmtId="14" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>
+</cellXfs>
+</styleSheet>"""
+
+XLSX_SHEET_HEAD = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">
+<dimension ref="A1:{ref}"/>
+<sheetData>
+"""
+
+XLSX_SHEET_TAIL = """</sheetData>
+</worksheet>"""
+
+
+def write_xlsx(table, path):
+    """Write `table` to `path` as an XLSX workbook.
+
+    Args:
+        table (Table): Workbook contents.
+        path (str): Path to save workbook to.
+
+    """
+    shape = table.shape
+    names = [colname(i) for i in range(len(table.kinds))]
+    n = range(1, shape.sheets + 1)
+    zf = zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED)
+    try:
+        zf.writestr('[Content_Types].xml', XLSX_CONTENT_TYPES.format(
+            sheets='\n'.join(XLSX_CONTENT_TYPE_SHEET.format(n=i) for i in n)))
+        zf.writestr('_rels/.rels', XLSX_RELS)
+        zf.writestr('xl/workbook.xml', XLSX_WORKBOOK.format(
+            sheets='\n'.join(XLSX_WORKBOOK_SHEET.format(n=i) for i in n)))
+        zf.writestr('xl/_rels/workbook.xml.rels', XLSX_WORKBOOK_RELS.format(
+            sheets='\n'.join(XLSX_WORKBOOK_REL_SHEET.format(n=i) for i in n)))
+        zf.writestr('xl/styles.xml', XLSX_STYLES)
+
+        nrefs = table.kinds.count(STRING) * shape.rows * shape.sheets
+        buf = [u'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+               u'<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml'
+               u'/2006/main" count="{}" uniqueCount="{}">'.format(
+                   nrefs, len(table.strings))]
+        for s in table.strings:
+            buf.append(u'<si><t>{}</t></si>'.format(escape(s)))
+        buf.append(u'</sst>')
+        zf.writestr('xl/sharedStrings.xml', u''.join(buf).encode('utf-8'))
+
+        for i, rows in enumerate(table.sheets):
+            # Write sheet XML to a temporary file to keep memory bounded
+            fd, tmp = tempfile.mkstemp(suffix='.xml')
+            try:
+                with os.fdopen(fd, 'wb') as fp:
+                    ref = '{}{}'.format(names[-1], max(1, len(rows)))
+                    fp.write(XLSX_SHEET_HEAD.format(ref=ref).encode('utf-8'))
+                    for rowx, row in enumerate(rows):
+                        r = rowx + 1
+                        cells = ['<row r="{}">'.format(r)]
+                        for colx, v in enumerate(row):
+                            kind = table.kinds[colx]
+                            if kind == STRING:
+                                cells.append('<c r="{}{}" t="s"><v>{}</v></c>'
+                                             .format(names[colx], r, v))
+                            elif kind == DATE:
+                                cells.append('<c r="{}{}" s="1"><v>{}</v></c>'
+                                             .format(names[colx], r, int(v)))
+                            else:
+                                cells.append('<c r="{}{}"><v>{!r}</v></c>'
+                                             .format(names[colx], r, v))
+                        cells.append('</row>\n')
+                        fp.write(''.join(cells).encode('utf-8'))
+                    fp.write(XLSX_SHEET_TAIL.encode('utf-8'))
+                zf.write(tmp, 'xl/worksheets/sheet{}.xml'.format(i + 1))
+            finally:
+                os.unlink(tmp)
+    finally:
+        zf.close()
+
+
+# ---------------------------------------------------------------------
+# BIFF8
+# ---------------------------------------------------------------------
+
+# BIFF8 record codes
+BOF = 0x0809
+EOF = 0x000A
+CODEPAGE = 0x0042
+DATEMODE = 0x0022
+FORMAT = 0x041E
+XF = 0x00E0
+BOUNDSHEET = 0x0085
+SST = 0x00FC
+CONTINUE = 0x003C
+DIMENSIONS = 0x0200
+ROW = 0x0208
+NUMBER = 0x0203
+RK = 0x027E
+MULRK = 0x00BD
+LABELSST = 0x00FD
+WINDOW2 = 0x023E
+
+# Maximum size of a BIFF8 record's data
+MAX_RECORD = 8224
+
+# OLE2 compound document constants
+OLE_SIGNATURE = b'\xD0\xCF\x11\xE0\xA1\xB1\x1A\xE1'
+SECTOR = 512
+SIDS_PER_SECTOR = SECTOR // 4
+FREESID, EOCSID, SATSID, MSATSID = -1, -2, -3, -4
+MIN_STD_STREAM = 4096
+
+# XF indices written to BIFF8 workbooks
+XF_GENERAL, XF_DATE = 16, 17
+
+
+def record(code, data=b''):
+    """BIFF record with header."""
+    return struct.pack('<HH', code, len(data)) + data
+
+
+def biff_string(s, lenlen=2):
+    """Encode BIFF8 unicode string with `lenlen`-byte length prefix."""
+    try:
+        raw = s.encode('latin-1')
+        options = 0
+    except UnicodeEncodeError:
+        raw = s.encode('utf-16-le')
+        options = 1
+    fmt = '<BB' if lenlen == 1 else '<HB'
+    return struct.pack(fmt, len(s), options) + raw
+
+
+def rk_value(v):
+    """Encode `v` as a 32-bit RK value, or return `None` if not possible."""
+    if v == int(v) and -2 ** 29 <= v < 2 ** 29:
+        return (int(v) << 2) | 2
+    v100 = round(v * 100)
+    if v100 / 100 == v and -2 ** 29 <= v100 < 2 ** 29:
+        return (int(v100) << 2) | 3
+    return None
+
+
+def sst_records(strings, nrefs, split=False):
+    """SST record, plus CONTINUE records if needed.
+
+    By default, records are only split between strings, so a string
+    never straddles a CONTINUE boundary. With `split`, records are
+    filled up to `MAX_RECORD` bytes, and the characters of a string
+    that doesn't fit carry on in the next CONTINUE record, after an
+    options byte, as Excel writes them. A string's length and options
+    are never split.
+
+    """
+    out = []
+    code = SST
+    chunk = [struct.pack('<ii', nrefs, len(strings))]
+    size = 8
+    for s in strings:
+        b = biff_string(s)
+        if size + len(b) <= MAX_RECORD:
+            chunk.append(b)
+            size += len(b)
+            continue
+        options = b[2:3]
+        charsize = 2 if ord(options) & 1 else 1
+        if not split or size + 3 + charsize > MAX_RECORD:
+            # Start the next record with the string, unless it's split
+            # and there's room left for its header and a character
+            out.append(record(code, b''.join(chunk)))
+            code = CONTINUE
+            chunk, size = [], 0
+            if not split or len(b) <= MAX_RECORD:
+                chunk.append(b)
+                size += len(b)
+                continue
+        head, raw = b[:3], b[3:]
+        while True:
+            room = (MAX_RECORD - size - len(head)) // charsize * charsize
+            chunk.append(head + raw[:room])
+            size += len(head) + len(raw[:room])
+            raw = raw[room:]
+            if not raw:
+                break
+            out.append(record(code, b''.join(chunk)))
+            code = CONTINUE
+            chunk, size = [], 0
+            head = options
+    out.append(record(code, b''.join(chunk)))
+    return b''.join(out)
+
+
+def xf_record(format_key, is_style):
+    """Minimal BIFF8 XF record."""
+    type_par = 0xFFF5 if is_style else 0x0001
+    used = 0 if is_style else 0x04 << 2
+    return record(XF, struct.pack('<HHHBBBBIiH', 0, format_key, type_par,
+                                  0x20, 0, 0, used, 0, 0, 0x20C0))
+
+
+def biff_globals(table, offsets):
+    """Workbook globals substream."""
+    out = [record(BOF, struct.pack('<HHHHII', 0x0600, 0x0005,
+                                   0x0DBB, 0x07CC, 0, 6)),
+           record(CODEPAGE, struct.pack('<H', 1200)),
+           record(DATEMODE, struct.pack('<H', 0)),
+           record(FORMAT, struct.pack('<H', 164) + biff_string(u'yyyy-mm-dd'))]
+    for i in range(16):
+        out.append(xf_record(0, True))
+    out.append(xf_record(0, False))      # XF_GENERAL
+    out.append(xf_record(164, False))    # XF_DATE
+    for i, offset in enumerate(offsets):
+        out.append(record(BOUNDSHEET, struct.pack('<iBB', offset, 0, 0) +
+                          biff_string(u'Sheet{}'.format(i + 1), lenlen=1)))
+    nrefs = table.kinds.count(STRING) * table.shape.rows * table.shape.sheets
+    out.append(sst_records(table.strings, nrefs, table.shape.split_strings))
+    out.append(record(EOF))
+    return b''.join(out)
+
+
+def biff_sheet(table, rows):
+    """Worksheet substream for `rows`."""
+    kinds = table.kinds
+    ncols = len(kinds)
+    out = [record(BOF, struct.pack('<HHHHII', 0x0600, 0x0010,
+                                   0x0DBB, 0x07CC, 0, 6)),
+           record(DIMENSIONS, struct.pack('<IIHHH', 0, len(rows),
+                                          0, ncols, 0))]
+    for block in range(0, len(rows), 32):
+        chunk = rows[block:block + 32]
+        # Excel writes the ROW records of a block before its cells
+        for rowx in range(block, block + len(chunk)):
+            out.append(record(ROW, struct.pack('<HHHHHHI', rowx, 0, ncols,
+                                               0xFF, 0, 0, 0x100)))
+        for rowx, row in enumerate(chunk, block):
+            rks = []  # pending run of (colx, xf, rk)
+            for colx, v in enumerate(row):
+                kind = kinds[colx]
+                rk = None
+                if kind != STRING:
+                    rk = rk_value(v)
+                if rk is not None:
+                    xf = XF_DATE if kind == DATE else XF_GENERAL
+                    rks.append((colx, xf, rk))
+                    continue
+                out.append(_rk_records(rowx, rks))
+                rks = []
+                if kind == STRING:
+                    out.append(record(LABELSST, struct.pack(
+                        '<HHHI', rowx, colx, XF_GENERAL, v)))
+                else:
+                    out.append(record(NUMBER, struct.pack(
+                        '<HHHd', rowx, colx, XF_GENERAL, v)))
+            out.append(_rk_records(rowx, rks))
+    out.append(record(WINDOW2, struct.pack('<HHHHHHHI', 0x06B6, 0, 0,
+                                           0x40, 0, 0, 0, 0)))
+    out.append(record(EOF))
+    return b''.join(out)
+
+
+def _rk_records(rowx, rks):
+    """RK record for a single cell or MULRK record for a run of cells."""
+    if not rks:
+        return b''
+    if len(rks) == 1:
+        colx, xf, rk = rks[0]
+        return record(RK, struct.pack('<HHHi', rowx, colx, xf, rk))
+    data = [struct.pack('<HH', rowx, rks[0][0])]
+    for _, xf, rk in rks:
+        data.append(struct.pack('<Hi', xf, rk))
+    data.append(struct.pack('<H', rks[-1][0]))
+    return record(MULRK, b''.join(data))
+
+
+def ole2_document(stream, name=u'Workbook', fragment=False):
+    """Wrap `stream` in an OLE2 compound document.
+
+    The stream is stored in standard sectors (it's padded to at least
+    4096 bytes), so no short-stream container is needed. The MSAT is
+    extended beyond the header if the file needs more than 109
+    SAT sectors.
+
+    With `fragment`, the stream's sectors are stored with the first
+    and second halves interleaved, so no sector is followed in the
+    file by the next one in the stream's SAT chain.
+
+    """
+    if len(stream) < MIN_STD_STREAM:
+        stream += b'\0' * (MIN_STD_STREAM - len(stream))
+    nstream = (len(stream) + SECTOR - 1) // SECTOR
+    stream += b'\0' * (nstream * SECTOR - len(stream))
+
+    # Work out how many SAT and MSAT-extension sectors are needed
+    nsat = nmsat = 0
+    while True:
+        total = nstream + 1 + nsat + nmsat
+        need_sat = (total + SIDS_PER_SECTOR - 1) // SIDS_PER_SECTOR
+        need_msat = max(0, (need_sat - 109 + SIDS_PER_SECTOR - 2) //
+                        (SIDS_PER_SECTOR - 1))
+        if (need_sat, need_msat) == (nsat, nmsat):
+            break
+        nsat, nmsat = need_sat, need_msat
+
+    dir_sid = nstream
+    sat_sids = list(range(dir_sid + 1, dir_sid + 1 + nsat))
+    msat_sids = list(range(dir_sid + 1 + nsat, dir_sid + 1 + nsat + nmsat))
+
+    # Sector of stream at each position in the file
+    order = list(range(nstream))
+    if fragment:
+        half = (nstream + 1) // 2
+        order = [None] * nstream
+        order[::2] = range(half)
+        order[1::2] = range(half, nstream)
+    sids = [0] * nstream
+    for sid, i in enumerate(order):
+        sids[i] = sid
+    sat = [EOCSID] * nstream
+    for i in range(nstream - 1):
+        sat[sids[i]] = sids[i + 1]
+    stream = b''.join(stream[i * SECTOR:(i + 1) * SECTOR] for i in order)
+    sat.append(EOCSID)  # directory
+    sat.extend([SATSID] * nsat)
+    sat.extend([MSATSID] * nmsat)
+    sat.extend([FREESID] * (nsat * SIDS_PER_SECTOR - len(sat)))
+
+    def direntry(name, etype, first_sid, size, child=-1):
+        raw = (name + u'\0').encode('utf-16-le') if name else b''
+        return (raw + b'\0' * (64 - len(raw)) +
+                struct.pack('<HBBiii', len(raw), etype, 1, -1, -1, child) +
+                b'\0' * 36 + struct.pack('<iI', first_sid, size) + b'\0' * 4)
+
+    directory = (direntry(u'Root Entry', 5, EOCSID, 0, child=1) +
+                 direntry(name, 2, sids[0], nstream * SECTOR) +
+                 direntry(u'', 0, FREESID, 0) * 2)
+
+    msat = sat_sids[:109] + [FREESID] * (109 - min(109, nsat))
+    header = (OLE_SIGNATURE + b'\0' * 16 +
+              struct.pack('<HHHHH', 0x003E, 0x0003, 0xFFFE, 9, 6) +
+              b'\0' * 10 +
+              struct.pack('<iiiiiiii', nsat, dir_sid, 0, MIN_STD_STREAM,
+                          EOCSID, 0, msat_sids[0] if msat_sids else EOCSID,
+                          nmsat) +
+              struct.pack('<109i', *msat))
+
+    out = [header, stream, directory]
+    out.append(struct.pack('<%di' % len(sat), *sat))
+    rest = sat_sids[109:]
+    for i, sid in enumerate(msat_sids):
+        ids = rest[:SIDS_PER_SECTOR - 1]
+        rest = rest[SIDS_PER_SECTOR - 1:]
+        ids += [FREESID] * (SIDS_PER_SECTOR - 1 - len(ids))
+        nxt = msat_sids[i + 1] if i + 1 < len(msat_sids) else EOCSID
+        out.append(struct.pack('<%di' % SIDS_PER_SECTOR, *(ids + [nxt])))
+    return b''.join(out)
+
+
+def write_xls(table, path):
+    """Write `table` to `path` as a BIFF8 (Excel 97) workbook.
+
+    Args:
+        table (Table): Workbook contents.
+        path (str): Path to save workbook to.
+
+    Raises:
+        ValueError: Raised if `table` is too big for a BIFF8 worksheet.
+
+    """
+    if table.shape.rows > 65536 or len(table.kinds) > 256:
+        raise ValueError('BIFF8 worksheets are limited to 65536 rows '
+                         'and 256 columns')
+    sheets = [biff_sheet(table, rows) for rows in table.sheets]
+    # BOUNDSHEET records need the sheets' offsets, but the size of the
+    # globals doesn't depend on their values
+    size = len(biff_globals(table, [0] * len(sheets)))
+    offsets = []
+    for data in sheets:
+        offsets.append(size)
+        size += len(data)
+    stream = biff_globals(table, offsets) + b''.join(sheets)
+    with open(path, 'wb') as fp:
+        fp.write(ole2_document(stream, fragment=table.shape.fragment))
+
+
+# ---------------------------------------------------------------------
+# XLSB
+# ---------------------------------------------------------------------
+
+# BIFF12 record types
+BRT_ROW_HDR = 0
+BRT_CELL_RK = 2
+BRT_CELL_REAL = 5
+BRT_CELL_ISST = 7
+BRT_SST_ITEM = 19
+BRT_XF = 47
+BRT_BEGIN_SHEET = 129
+BRT_END_SHEET = 130
+BRT_BEGIN_BOOK = 131
+BRT_END_BOOK = 132
+BRT_BEGIN_BUNDLE_SHS = 143
+BRT_END_BUNDLE_SHS = 144
+BRT_BEGIN_SHEET_DATA = 145
+BRT_END_SHEET_DATA = 146
+BRT_WS_DIM = 148
+BRT_WB_PROP = 153
+BRT_BUNDLE_SH = 156
+BRT_BEGIN_SST = 159
+BRT_END_SST = 160
+BRT_BEGIN_STYLE_SHEET = 278
+BRT_END_STYLE_SHEET = 279
+BRT_BEGIN_CELL_XFS = 617
+BRT_END_CELL_XFS = 618
+
+XLSB_CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="bin" ContentType="application/vnd.ms-excel.sheet.binary.macroEnabled.main"/>
+<Override PartName="/xl/styles.bin" ContentType="application/vnd.ms-excel.styles"/>
+<Override PartName="/xl/sharedStrings.bin" ContentType="application/vnd.ms-excel.sharedStrings"/>
+{sheets}
+</Types>"""
+
+XLSB_CONTENT_TYPE_SHEET = (
+    '<Override PartName="/xl/worksheets/sheet{n}.bin" '
+    'ContentType="application/vnd.ms-excel.worksheet"/>')
+
+
+def xlsb_record(rt, data=b''):
+    """BIFF12 record with its variable-length type and size."""
+    head = bytearray()
+    if rt < 0x80:
+        head.append(rt)
+    else:
+        head.append((rt & 0x7F) | 0x80)
+        head.append(rt >> 7)
+    size = len(data)
+    while True:
+        if size < 0x80:
+            head.append(size)
+            break
+        head.append((size & 0x7F) | 0x80)
+        size >>= 7
+    return bytes(head) + data
+
+
+def xlsb_string(s):
+    """Encode BIFF12 XLWideString."""
+    return struct.pack('<I', len(s)) + s.encode('utf-16-le')
+
+
+def xlsb_sheet_records(table, rows, fp):
+    """Write worksheet records for `rows` to file `fp`."""
+    kinds = table.kinds
+    fp.write(xlsb_record(BRT_BEGIN_SHEET))
+    fp.write(xlsb_record(BRT_WS_DIM, struct.pack(
+        '<iiii', 0, max(0, len(rows) - 1), 0, len(kinds) - 1)))
+    fp.write(xlsb_record(BRT_BEGIN_SHEET_DATA))
+    for rowx, row in enumerate(rows):
+        out = [xlsb_record(BRT_ROW_HDR, struct.pack(
+            '<iiH3xi', rowx, 0, 300, 0))]
+        for colx, v in enumerate(row):
+            kind = kinds[colx]
+            if kind == STRING:
+                out.append(xlsb_record(BRT_CELL_ISST, struct.pack(
+                    '<iII', colx, 0, v)))
+                continue
+            # Cell style 1 is the date format
+            style = 1 if kind == DATE else 0
+            rk = rk_value(v)
+            if rk is not None:
+                out.append(xlsb_record(BRT_CELL_RK, struct.pack(
+                    '<iIi', colx, style, rk)))
+            else:
+                out.append(xlsb_record(BRT_CELL_REAL, struct.pack(
+                    '<iId', colx, style, v)))
+        fp.write(b''.join(out))
+    fp.write(xlsb_record(BRT_END_SHEET_DATA))
+    fp.write(xlsb_record(BRT_END_SHEET))
+
+
+def write_xlsb(table, path):
+    """Write `table` to `path` as an XLSB (Excel binary) workbook.
+
+    Args:
+        table (Table): Workbook contents.
+        path (str): Path to save workbook to.
+
+    """
+    shape = table.shape
+    n = range(1, shape.sheets + 1)
+    zf = zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED)
+    try:
+        zf.writestr('[Content_Types].xml', XLSB_CONTENT_TYPES.format(
+            sheets='\n'.join(XLSB_CONTENT_TYPE_SHEET.format(n=i) for i in n)))
+        zf.writestr('_rels/.rels', XLSX_RELS.replace('workbook.xml',
+                                                     'workbook.bin'))
+
+        out = [xlsb_record(BRT_BEGIN_BOOK),
+               xlsb_record(BRT_WB_PROP, struct.pack('<II', 0, 0) +
+                           xlsb_string(u'')),
+               xlsb_record(BRT_BEGIN_BUNDLE_SHS)]
+        for i in n:
+            out.append(xlsb_record(BRT_BUNDLE_SH, struct.pack('<II', 0, i) +
+                                   xlsb_string(u'rId{}'.format(i)) +
+                                   xlsb_string(u'Sheet{}'.format(i))))
+        out += [xlsb_record(BRT_END_BUNDLE_SHS), xlsb_record(BRT_END_BOOK)]
+        zf.writestr('xl/workbook.bin', b''.join(out))
+        zf.writestr('xl/_rels/workbook.bin.rels', XLSX_WORKBOOK_RELS.format(
+            sheets='\n'.join(XLSX_WORKBOOK_REL_SHEET.format(n=i) for i in n)
+        ).replace('.xml"', '.bin"'))
+
+        # Cell XFs 0 (General) and 1 (built-in date format 14)
+        xf = '<HHHHHBBHH'
+        zf.writestr('xl/styles.bin', b''.join([
+            xlsb_record(BRT_BEGIN_STYLE_SHEET),
+            xlsb_record(BRT_BEGIN_CELL_XFS, struct.pack('<I', 2)),
+            xlsb_record(BRT_XF, struct.pack(xf, 0, 0, 0, 0, 0, 0, 0, 0, 0)),
+            xlsb_record(BRT_XF, struct.pack(xf, 0, 14, 0, 0, 0, 0, 0, 0, 0)),
+            xlsb_record(BRT_END_CELL_XFS),
+            xlsb_record(BRT_END_STYLE_SHEET),
+        ]))
+
+        nrefs = table.kinds.count(STRING) * shape.rows * shape.sheets
+        out = [xlsb_record(BRT_BEGIN_SST,
+                           struct.pack('<ii', nrefs, len(table.strings)))]
+        for s in table.strings:
+            out.append(xlsb_record(BRT_SST_ITEM, b'\0' + xlsb_string(s)))
+        out.append(xlsb_record(BRT_END_SST))
+        zf.writestr('xl/sharedStrings.bin', b''.join(out))
+
+        for i, rows in enumerate(table.sheets):
+            # Write sheet records to a temporary file to keep memory bounded
+            fd, tmp = tempfile.mkstemp(suffix='.bin')
+            try:
+                with os.fdopen(fd, 'wb') as fp:
+                    xlsb_sheet_records(table, rows, fp)
+                zf.write(tmp, 'xl/worksheets/sheet{}.bin'.format(i + 1))
+            finally:
+                os.unlink(tmp)
+    finally:
+        zf.close()
+
+
+WRITERS = {
+    '.xlsx': write_xlsx,
+    '.xlsb': write_xlsb,
+    '.xls': write_xls,
+}
+
+
+def generate(path, shape):
+    """Generate workbook of `shape` at `path`.
+
+    The format is determined by the file extension of `path`.
+
+    Args:
+        path (str): Path to save workbook to.
+        shape (Shape): Shape of workbook.
+
+    Returns:
+        Table: Contents of the generated workbook.
+
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in WRITERS:
+        raise ValueError('unsupported workbook type: {!r}'.format(ext))
+    table = Table(shape)
+    WRITERS[ext](table, path)
+    return table
+
+
+def add_shape_args(p):
+    """Add workbook shape options to `argparse.ArgumentParser` `p`."""
+    p.add_argument('--rows', type=int, default=1000,
+                   help="Rows per worksheet. Default: %(default)s")
+    p.add_argument('--cols', type=int, default=10,
+                   help="Columns per worksheet. Default: %(default)s")
+    p.add_argument('--strings', type=float, default=0.5,
+                   help="Share of string columns. Default: %(default)s")
+    p.add_argument('--numbers', type=float, default=0.3,
+                   help="Share of number columns. Default: %(default)s")
+    p.add_argument('--dates', type=float, default=0.2,
+                   help="Share of date columns. Default: %(default)s")
+    p.add_argument('--unique', type=float, default=0.5,
+                   help="Share of string cells with unique values. "
+                   "Default: %(default)s")
+    p.add_argument('--sheets', type=int, default=1,
+                   help="Number of worksheets. Default: %(default)s")
+    p.add_argument('--seed', type=int, default=1,
+                   help="Random seed. Default: %(default)s")
+    p.add_argument('--split-strings', action='store_true',
+                   help="Split BIFF8 shared strings across CONTINUE "
+                   "records")
+    p.add_argument('--fragment', action='store_true',
+                   help="Interleave the sectors of the BIFF8 Workbook "
+                   "stream")
+
+
+def shape_from_args(o):
+    """Create `Shape` from parsed options."""
+    return Shape(o.rows, o.cols, o.strings, o.numbers, o.dates, o.unique,
+                 o.sheets, o.seed, o.split_strings, o.fragment)
+
+
+def main():
+    """Generate a workbook."""
+    p = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    p.add_argument('-o', '--output', metavar='FILE', required=True,
+                   help="Workbook to create (.xlsx, .xlsb or .xls)")
+    add_shape_args(p)
+    o = p.parse_args()
+    shape = shape_from_args(o)
+    log('Generating %s ...', shape)
+    generate(o.output, shape)
+    log('Saved %s (%d bytes)', o.output, os.path.getsize(o.output))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
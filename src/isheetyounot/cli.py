@@ -33,6 +33,7 @@ from .core import (
     cache_key,
     cached_data,
     read_data,
+    tilde,
     version,
 )
 from .aw3 import (
@@ -43,6 +44,9 @@ from .aw3 import (
     log,
     random_bundle_id,
 )
+from .memory import MEMORY_PROFILE, memprof
+from .profiling import PROFILE, list_profiles, profile
+from .timing import timer
 
 __usage__ = """I Sheet You Not. Search Excel data in Alfred 3.
 
@@ -114,6 +118,13 @@ def parse_args():
                    "Default is the second column after the title column. "
                    "Set to 0 if there is no value column. "
                    "Envvar: VALUE_COL")
+    p.add_argument('--profiles', action='store_true',
+                   help="List the profiles saved when the PROFILE "
+                   "environment variable is set and exit.")
+    p.add_argument('--top',
+                   metavar='N', type=int, default=10,
+                   help="Number of functions to show for each profile "
+                   "listed by --profiles. Default is 10.")
     p.add_argument('--version', action='version', version=version,
                    help="Show workflow version number and exit.")
 
@@ -148,9 +159,45 @@ def parse_args():
 
 
 def main():
-    """Run workflow script."""
-    o = parse_args()
+    """Run workflow script.
 
+    If the ``METRICS_FILE`` environment variable is set, the timings
+    of the run are appended to that file. If ``MEMORY_PROFILE`` is set,
+    a report of the run's memory use is written to STDERR or a file.
+    If ``PROFILE`` is set, the run is profiled and the stats saved in
+    the cache directory.
+
+    """
+    with timer.span('options'):
+        o = parse_args()
+
+    if o.profiles:
+        return list_profiles(o.top)
+
+    if MEMORY_PROFILE:
+        memprof.start()
+
+    try:
+        if PROFILE:
+            return profile(run, cache_key(o), o)
+
+        return run(o)
+    finally:
+        timer.save()
+        memprof.stop()
+        memprof.save()
+
+
+def run(o):
+    """Generate Alfred results for the given options.
+
+    Args:
+        o (argparse.Namespace): Program configuration from `parse_args()`.
+
+    Returns:
+        int: Exit status.
+
+    """
     log('options=%r', o)
 
     if not o.docpath:
@@ -180,10 +227,15 @@ def main():
     # ---------------------------------------------------------
     # Check for valid cached data
 
-    key = cache_key(o)
-    doc_age = time.time() - os.path.getmtime(o.docpath)
-    log('doc_age=%s', human_time(doc_age))
-    cached = cached_data(key, max_age=doc_age)
+    timer.set('docpath', tilde(o.docpath))
+    timer.set('sheet', o.sheet)
+    with timer.span('cache_lookup'):
+        key = cache_key(o)
+        doc_age = time.time() - os.path.getmtime(o.docpath)
+        log('doc_age=%s', human_time(doc_age))
+        cached = cached_data(key, max_age=doc_age)
+
+    timer.set('cached', bool(cached))
     if cached:
         log('Using cached data.')
         print(cached)
@@ -216,8 +268,11 @@ def main():
     s = time.time()
     items = read_data(o.docpath, o.sheet, cols, start_row,
                       o.variables, o.formats, o.match)
-    js = str(Feedback(items))
-    cache_data(key, js)
+    with timer.span('json'):
+        js = str(Feedback(items))
+    memprof.checkpoint('json')
+    with timer.span('cache_write'):
+        cache_data(key, js)
     print(js)
     d = time.time() - s
     log('Updated cache in %s', human_time(d))
@@ -23,11 +23,15 @@ the second as its subtitle and the third as its value (arg).
 
 from __future__ import print_function, unicode_literals, absolute_import
 
+import cPickle
 import hashlib
 import os
+import sys
 import time
 
 from .aw3 import av, human_time, log, make_item
+from .memory import memprof
+from .timing import timer
 
 from xlrd import (
     XL_CELL_EMPTY as TYPE_EMPTY,
@@ -124,14 +128,15 @@ def cache_key(o):
     return hashlib.md5(n.encode('utf-8')).hexdigest()
 
 
-def _cache_path(key):
-    """Path for cached JSON based on key and workflow's cache directory.
+def _cache_path(key, ext='json'):
+    """Path for cached data based on key and workflow's cache directory.
 
     Args:
         key (str): Unique key from `cache_key()`.
+        ext (str, optional): Extension of cache file.
 
     Returns:
-        unicode: Filepath in cache directory with ".json" extension.
+        unicode: Filepath in cache directory with extension `ext`.
 
     """
     root = av.get('workflow_cache', CACHE_DIR)
@@ -146,7 +151,7 @@ def _cache_path(key):
     except OSError:
         pass
 
-    p = os.path.join(dp, '{}.json'.format(key))
+    p = os.path.join(dp, '{}.{}'.format(key, ext))
 
     log('cache_path=%r', tilde(p))
 
@@ -196,6 +201,101 @@ def cache_data(key, data):
         fp.write(data)
 
 
+def _index_path(path):
+    """Path of record index for Excel file.
+
+    The key is the file's path only, so each file has one index,
+    which is overwritten when the file changes.
+
+    Args:
+        path (unicode): Path of Excel file.
+
+    Returns:
+        unicode: Filepath in cache directory with ".xlsidx" extension.
+
+    """
+    p = os.path.abspath(path)
+    key = hashlib.md5(p.encode('utf-8')).hexdigest()
+    return _cache_path(key, 'xlsidx')
+
+
+def _file_version(path):
+    """Return size and modification time of file.
+
+    Args:
+        path (unicode): Path of Excel file.
+
+    Returns:
+        tuple: ``(size, mtime)``
+
+    """
+    st = os.stat(path)
+    return st.st_size, st.st_mtime
+
+
+def cached_record_index(path, version):
+    """Return record index cached for Excel file or `None`.
+
+    Args:
+        path (unicode): Path of Excel file.
+        version (tuple): Size and modification time of the file
+            from `_file_version()`.
+
+    Returns:
+        dict: Index from `xlrd.Book.record_index()`, or `None` if
+            none is cached for the current version of the file.
+
+    """
+    p = _index_path(path)
+
+    if not os.path.exists(p):
+        return None
+
+    try:
+        with open(p, 'rb') as fp:
+            cached_version, index = cPickle.load(fp)
+    except Exception as err:  # Corrupt or from another xlrd
+        log('Error loading record index: %s', err)
+        return None
+
+    if version != cached_version:
+        log('Record index is out of date')
+        return None
+
+    return index
+
+
+def cache_record_index(path, version, index):
+    """Store record index for Excel file.
+
+    `version` should be taken before the file is opened, so an index
+    read from a file that is saved while it's being read is stored
+    with the old version, and isn't used again.
+
+    The index is written to a temporary file, which is then renamed,
+    so an interrupted run can't leave a truncated index behind.
+
+    Args:
+        path (unicode): Path of Excel file.
+        version (tuple): Size and modification time of the file
+            from `_file_version()`.
+        index (dict): Index from `xlrd.Book.record_index()`.
+
+    """
+    p = _index_path(path)
+    tmp = '{}.{}.tmp'.format(p, os.getpid())
+
+    try:
+        with open(tmp, 'wb') as fp:
+            cPickle.dump((version, index), fp,
+                         cPickle.HIGHEST_PROTOCOL)
+        os.rename(tmp, p)
+    except Exception:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
 #                                     dP
 #                                     88
 # .d8888b. dP.  .dP .d8888b. .d8888b. 88
@@ -359,20 +459,42 @@ def read_data(path, sheet, cols, start_row=1, variables=None,
         ConfigError: Raised if an argument is invalid, e.g. non-existent
             sheet name.
     """
-    from xlrd import open_workbook
+    from xlrd import XLRDError, open_workbook
 
     variables = variables or {}
 
-    wb = open_workbook(path)
+    with timer.span('index_load'):
+        version = _file_version(path)
+        index = cached_record_index(path, version)
+
+    with timer.span('open'):
+        # Only the one sheet is loaded (XLS files only). With a cached
+        # record index, the XLS workbook globals aren't scanned again.
+        # Comments, document properties and the rest of the styles
+        # aren't used. xlrd's warnings go to STDERR, not into the JSON.
+        # The file's memory map and the shared strings are released
+        # as soon as the sheet is loaded.
+        with open_workbook(path, logfile=sys.stderr, on_demand=True,
+                           record_index=index, lazy_sst=True,
+                           load_comments=False, load_core_props=False,
+                           load_styles=False) as wb:
+
+            if sheet.isdigit():
+                s = wb.sheet_by_index(int(sheet) - 1)
+            else:  # Name
+                try:
+                    s = wb.sheet_by_name(sheet)
+                except XLRDError:
+                    raise ConfigError(
+                        "Couldn't find sheet: {}".format(sheet))
 
-    if sheet.isdigit():
-        s = wb.sheets()[int(sheet) - 1]
-    else:  # Name
-        for s in wb.sheets():
-            if s.name == sheet:
-                break
-        else:
-            raise ConfigError("Couldn't find sheet: {}".format(sheet))
+    for name, seconds in wb.load_time_phases:
+        timer.add(name, seconds)
+
+    new_index = wb.record_index()
+    if new_index is not None and new_index != index:
+        with timer.span('index_write'):
+            cache_record_index(path, version, new_index)
 
     log('Opened worksheet "%s" of %s', s.name, tilde(path))
 
@@ -383,6 +505,7 @@ def read_data(path, sheet, cols, start_row=1, variables=None,
     items = []
     invalid = 0
 
+    st = time.time()
     i = start_row
 
     while i < s.nrows:
@@ -429,6 +552,18 @@ def read_data(path, sheet, cols, start_row=1, variables=None,
 
         items.append(make_item(tit, sub, arg, match=match_data, **evars))
 
+    timer.add('format', time.time() - st)
+    timer.set('rows', len(items))
     log('Read %d rows from worksheet "%s"', len(items), s.name)
+    # Pathological layouts, e.g. out-of-order rows, show up here
+    log('Parse stats: %s sheet=(%s)', wb.stats, s.stats)
+    timer.set('parse_stats', s.stats.as_dict())
+    # sheet and results are both still in memory
+    memprof.checkpoint('read_data')
+
+    # Sheet and workbook refer to each other. Unloading the sheet
+    # means both are freed on return, not by a later garbage
+    # collection, i.e. before the results are encoded as JSON.
+    wb.unload_sheet(s.number)
 
     return items
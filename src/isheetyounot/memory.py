@@ -0,0 +1,296 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Dean Jackson <deanishe@deanishe.net>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2016-05-21
+#
+
+"""
+memory
+^^^^^^
+
+Opt-in memory profiling for finding out why big workbooks use so much RAM.
+
+If the ``MEMORY_PROFILE`` environment variable is set, the run is traced
+with :mod:`tracemalloc` and a report of the peak memory use and the top
+allocation sites, grouped by subsystem (shared strings, cell storage,
+result dicts, JSON etc.), is written to STDERR (``MEMORY_PROFILE=1``) or
+appended to the file ``MEMORY_PROFILE`` points to.
+
+:mod:`tracemalloc` is not available on the system Python 2.7, in which
+case only the peak RSS of the process is reported.
+
+"""
+
+from __future__ import print_function, unicode_literals, absolute_import
+
+import inspect
+import os
+import sys
+import time
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2 without pytracemalloc
+    tracemalloc = None
+
+from .aw3 import log
+
+# Set to 1 to print the report to STDERR or to the path of a file
+# to append the report to.
+MEMORY_PROFILE = os.getenv('MEMORY_PROFILE')
+
+# Number of traceback frames to record per allocation
+FRAMES = 25
+
+# Number of allocation sites to show in report
+TOP = 10
+
+
+def peak_rss():
+    """Peak resident set size of the current process.
+
+    Returns:
+        int: Peak RSS in bytes, or 0 if unknown.
+
+    """
+    try:
+        import resource
+    except ImportError:  # pragma: no cover
+        return 0
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, OS X bytes
+    if sys.platform != 'darwin':
+        rss *= 1024
+    return rss
+
+
+def human_size(n):
+    """Human-readable size, e.g. 12.3 MB."""
+    for unit in ('B', 'KB', 'MB'):
+        if abs(n) < 1024:
+            return '{:0.1f} {}'.format(n, unit)
+        n /= 1024.0
+    return '{:0.1f} GB'.format(n)
+
+
+def _subsystems():
+    """Source ranges of the code that allocates most of the memory.
+
+    Returns:
+        list: ``(name, filename, first_line, last_line)`` tuples.
+
+    """
+    import json
+    from xlrd import book, sheet, xlsb, xlsx
+    from . import aw3, core
+
+    targets = [
+        ('xlsx.X12SST', xlsx.X12SST),
+        ('xlsx.X12SST', xlsx.LazySST),
+        ('xlsx.X12Sheet', xlsx.X12Sheet),
+        ('xlsb.X12BinSheet', xlsb.X12BinSheet),
+        ('book.unpack_SST_table', book.unpack_SST_table),
+        ('Sheet.read', sheet.Sheet.read),
+        ('Sheet._cell_values', sheet.Sheet.put_cell_ragged),
+        ('Sheet._cell_values', sheet.Sheet.put_cell_unragged),
+        ('Sheet._cell_values', sheet.Sheet.tidy_dimensions),
+        ('make_item', aw3.make_item),
+        ('read_data', core.read_data),
+    ]
+
+    ranges = []
+    for name, obj in targets:
+        path = os.path.realpath(inspect.getsourcefile(obj))
+        lines, first = inspect.getsourcelines(obj)
+        ranges.append((name, path, first, first + len(lines) - 1))
+
+    # Everything in the json package
+    path = os.path.dirname(os.path.realpath(json.__file__))
+    ranges.append(('JSON', path + os.sep, 0, sys.maxsize))
+
+    return ranges
+
+
+class MemoryProfiler(object):
+    """Trace memory allocations and report where the memory went.
+
+    Call :meth:`checkpoint` at points where memory use is likely to
+    be high. The report is based on the checkpoint at which the most
+    memory was in use.
+
+    Attributes:
+        checkpoints (list): ``(name, bytes)`` of traced memory in use
+            at each checkpoint.
+        enabled (bool): Whether the profiler has been started.
+        snapshot (tracemalloc.Snapshot): Snapshot taken at the
+            checkpoint with the highest memory use.
+        snapshot_name (unicode): Name of the checkpoint `snapshot`
+            was taken at.
+
+    """
+
+    def __init__(self):
+        """Create new `MemoryProfiler`."""
+        self.enabled = False
+        self.checkpoints = []
+        self.snapshot = None
+        self.snapshot_name = None
+        self._snapshot_size = -1
+        self._peak = 0
+
+    def start(self):
+        """Start tracing memory allocations."""
+        self.enabled = True
+        if tracemalloc:
+            tracemalloc.start(FRAMES)
+
+    def checkpoint(self, name):
+        """Snapshot memory allocations if usage is highest so far.
+
+        Does nothing if the profiler hasn't been started.
+
+        Args:
+            name (unicode): Name of the checkpoint.
+
+        """
+        if not self.enabled or not tracemalloc:
+            return
+
+        current, _ = tracemalloc.get_traced_memory()
+        self.checkpoints.append((name, current))
+        if current > self._snapshot_size:
+            self.snapshot = tracemalloc.take_snapshot()
+            self.snapshot_name = name
+            self._snapshot_size = current
+
+    def stop(self):
+        """Stop tracing memory allocations."""
+        if not self.enabled:
+            return
+
+        if tracemalloc:
+            self.checkpoint('end')
+            self._peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        self.enabled = False
+
+    def subsystems(self):
+        """Memory in use at the snapshot grouped by subsystem.
+
+        Each allocation is attributed to the innermost frame of its
+        traceback that belongs to one of the subsystems returned by
+        `_subsystems()`, or to "other" if none does.
+
+        Returns:
+            list: ``(name, bytes, blocks)`` tuples, largest first.
+
+        """
+        if not self.snapshot:
+            return []
+
+        ranges = _subsystems()
+        realpath = {}
+        groups = {}
+
+        def group(frames):
+            for frame in frames:
+                path = realpath.get(frame.filename)
+                if path is None:
+                    path = realpath[frame.filename] = os.path.realpath(
+                        frame.filename)
+
+                for name, p, first, last in ranges:
+                    if ((path == p or p.endswith(os.sep) and
+                            path.startswith(p)) and
+                            first <= frame.lineno <= last):
+                        return name
+
+            return 'other'
+
+        for stat in self.snapshot.statistics('traceback'):
+            frames = list(stat.traceback)
+            # Tracebacks are oldest-first as of Python 3.7
+            if sys.version_info >= (3, 7):
+                frames.reverse()
+
+            name = group(frames)
+            size, count = groups.get(name, (0, 0))
+            groups[name] = (size + stat.size, count + stat.count)
+
+        return sorted(((k, v[0], v[1]) for k, v in groups.items()),
+                      key=lambda t: t[1], reverse=True)
+
+    def report(self, top=TOP):
+        """Memory report as text.
+
+        Args:
+            top (int, optional): Number of allocation sites to list.
+
+        Returns:
+            unicode: Multi-line report.
+
+        """
+        lines = ['---------- memory profile ----------',
+                 'time: {}'.format(time.strftime('%Y-%m-%d %H:%M:%S')),
+                 'peak RSS: {}'.format(human_size(peak_rss()))]
+
+        if not tracemalloc:
+            lines.append('tracemalloc is not available: '
+                         'allocation sites not recorded')
+            return '\n'.join(lines)
+
+        lines.append('traced peak: {}'.format(human_size(self._peak)))
+        for name, size in self.checkpoints:
+            lines.append('checkpoint {}: {}'.format(name, human_size(size)))
+
+        if self.snapshot:
+            lines.append('')
+            lines.append('by subsystem at checkpoint {}:'.format(
+                         self.snapshot_name))
+            for name, size, count in self.subsystems():
+                lines.append('  {:<24} {:>10}  {:>9} blocks'.format(
+                             name, human_size(size), count))
+
+            lines.append('')
+            lines.append('top {} lines at checkpoint {}:'.format(
+                         top, self.snapshot_name))
+            for stat in self.snapshot.statistics('lineno')[:top]:
+                frame = stat.traceback[0]
+                lines.append('  {:>10}  {}:{}'.format(
+                             human_size(stat.size), frame.filename,
+                             frame.lineno))
+
+        return '\n'.join(lines)
+
+    def save(self, dest=None):
+        """Write report to STDERR or append it to a file.
+
+        Does nothing if neither `dest` nor ``MEMORY_PROFILE`` is set.
+
+        Args:
+            dest (unicode, optional): ``1`` to write to STDERR or a
+                path to append the report to. Defaults to
+                ``MEMORY_PROFILE``.
+
+        """
+        dest = dest or MEMORY_PROFILE
+        if not dest:
+            return
+
+        text = self.report()
+        if dest == '1':
+            log('%s', text)
+            return
+
+        with open(dest, 'ab') as fp:
+            fp.write(text.encode('utf-8') + b'\n\n')
+
+        log('Saved memory profile to %r', dest)
+
+
+memprof = MemoryProfiler()
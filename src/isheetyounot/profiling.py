@@ -0,0 +1,124 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Dean Jackson <deanishe@deanishe.net>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2016-05-21
+#
+
+"""
+profiling
+^^^^^^^^^
+
+Capture :mod:`cProfile` profiles of runs for diagnosing slow workbooks.
+
+If the ``PROFILE`` environment variable is set, each run is profiled and
+the stats saved in the ``profiles`` subdirectory of the workflow's cache
+directory, named after the run's cache key and the time. Run ``isyn
+--profiles`` to list the saved profiles and the functions with the
+highest cumulative time.
+
+"""
+
+from __future__ import print_function, unicode_literals, absolute_import
+
+import cProfile
+import glob
+import os
+import pstats
+import sys
+import time
+
+from .aw3 import av, log
+from .core import CACHE_DIR, tilde
+
+# Profile runs if set
+PROFILE = os.getenv('PROFILE')
+
+
+def profile_dir():
+    """Directory profiles are saved in.
+
+    Returns:
+        unicode: ``profiles`` subdirectory of workflow's cache directory.
+
+    """
+    return os.path.join(av.get('workflow_cache', CACHE_DIR), 'profiles')
+
+
+def profile(func, key, *args, **kwargs):
+    """Call `func` with `args` and `kwargs` and save a profile of it.
+
+    The profile is saved even if `func` raises an exception.
+
+    Args:
+        func (callable): Function to profile.
+        key (str): Cache key from `cache_key()`.
+        *args (object): Arguments for `func`.
+        **kwargs (object): Keyword arguments for `func`.
+
+    Returns:
+        object: Whatever `func` returns.
+
+    """
+    prof = cProfile.Profile()
+    try:
+        return prof.runcall(func, *args, **kwargs)
+    finally:
+        dp = profile_dir()
+        try:
+            os.makedirs(dp, 0700)
+        except OSError:
+            pass
+
+        name = '{}-{}.pstats'.format(key, time.strftime('%Y%m%d-%H%M%S'))
+        p = os.path.join(dp, name)
+        prof.dump_stats(p)
+        log('Saved profile to %r', tilde(p))
+
+
+def saved_profiles():
+    """Paths of saved profiles.
+
+    Returns:
+        list: Paths of ``.pstats`` files, newest first.
+
+    """
+    paths = glob.glob(os.path.join(profile_dir(), '*.pstats'))
+    return sorted(paths, key=os.path.getmtime, reverse=True)
+
+
+def summarise(path, top=10, stream=None):
+    """Print the `top` functions by cumulative time in profile `path`.
+
+    Args:
+        path (unicode): Path of a ``.pstats`` file.
+        top (int, optional): Number of functions to print.
+        stream (file, optional): Where to print the summary.
+            Defaults to STDOUT.
+
+    """
+    stats = pstats.Stats(path, stream=stream or sys.stdout)
+    stats.strip_dirs().sort_stats('cumulative').print_stats(top)
+
+
+def list_profiles(top=10):
+    """Print summaries of all saved profiles, newest first.
+
+    Args:
+        top (int, optional): Number of functions to show for each profile.
+
+    Returns:
+        int: Exit status.
+
+    """
+    paths = saved_profiles()
+    if not paths:
+        print('No profiles in {}'.format(tilde(profile_dir())))
+        return 0
+
+    for p in paths:
+        summarise(p, top)
+
+    return 0
@@ -0,0 +1,134 @@
+# encoding: utf-8
+#
+# Copyright (c) 2016 Dean Jackson <deanishe@deanishe.net>
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2016-05-21
+#
+
+"""
+timing
+^^^^^^
+
+Lightweight phase timing for finding out where a run spends its time.
+
+Wrap each phase of a run in :meth:`Timer.span`. If the ``METRICS_FILE``
+environment variable is set, :meth:`Timer.save` appends the results
+to that file as a single line of JSON.
+
+"""
+
+from __future__ import print_function, unicode_literals, absolute_import
+
+from contextlib import contextmanager
+import json
+import os
+import time
+
+from .aw3 import log
+
+# Path of file to append metrics to. Metrics are only saved if set.
+METRICS_FILE = os.getenv('METRICS_FILE')
+
+
+class Timer(object):
+    """Record the duration of the phases of a run.
+
+    Attributes:
+        info (dict): Extra data to save with the timings, e.g. the
+            number of rows read.
+        phases (list): ``(name, seconds)`` tuples in the order the phases
+            finished. A phase may occur more than once, e.g. if several
+            worksheets are parsed.
+        start (float): Time the timer was created.
+
+    """
+
+    def __init__(self):
+        """Create new `Timer`."""
+        self.start = time.time()
+        self.phases = []
+        self.info = {}
+
+    @contextmanager
+    def span(self, name):
+        """Context manager that records the duration of its block.
+
+        Args:
+            name (unicode): Name of the phase.
+
+        """
+        st = time.time()
+        try:
+            yield
+        finally:
+            self.add(name, time.time() - st)
+
+    def add(self, name, seconds):
+        """Record an already-measured phase.
+
+        Args:
+            name (unicode): Name of the phase.
+            seconds (float): Duration of the phase.
+
+        """
+        self.phases.append((name, seconds))
+
+    def set(self, key, value):
+        """Save extra data with the timings.
+
+        Args:
+            key (unicode): Name of the value.
+            value (object): JSON-serialisable value.
+
+        """
+        self.info[key] = value
+
+    def totals(self):
+        """Total duration of each phase.
+
+        Returns:
+            dict: Phase name -> seconds. Repeated phases are summed.
+
+        """
+        d = {}
+        for name, seconds in self.phases:
+            d[name] = d.get(name, 0.0) + seconds
+        return d
+
+    def metrics(self):
+        """Timings and extra data as a single dictionary.
+
+        Returns:
+            dict: Metrics for this run.
+
+        """
+        d = dict(self.info)
+        d['time'] = self.start
+        d['total'] = time.time() - self.start
+        d['phases'] = self.totals()
+        return d
+
+    def save(self, path=None):
+        """Append metrics to `path` as one line of JSON.
+
+        Does nothing if neither `path` nor ``METRICS_FILE`` is set.
+
+        Args:
+            path (unicode, optional): File to append metrics to.
+                Defaults to ``METRICS_FILE``.
+
+        """
+        path = path or METRICS_FILE
+        if not path:
+            return
+
+        js = json.dumps(self.metrics(), sort_keys=True)
+        with open(path, 'ab') as fp:
+            fp.write(js + b'\n')
+
+        log('Saved metrics to %r', path)
+
+
+timer = Timer()
@@ -303,8 +303,8 @@ from . import licences
 # statement.</p>
 ##
 
-import sys, zipfile, pprint
-from . import timemachine
+import sys, time, zipfile, pprint
+from . import zipstream
 from .biffh import (
     XLRDError,
     biff_text_from_num,
@@ -345,9 +345,11 @@ USE_MMAP = MMAP_AVAILABLE
 #
 # @param use_mmap Whether to use the mmap module is determined heuristically.
 # Use this arg to override the result. Current heuristic: mmap is used if it exists.
+# An XLSX file is mapped into memory and its parts read straight from the map.
 #
 # @param file_contents ... as a string or an mmap.mmap object or some other behave-alike object.
 # If file_contents is supplied, filename will not be used, except (possibly) in messages.
+# The contents of an XLSX file are read in place, not copied.
 #
 # @param encoding_override Used to overcome missing or bad codepage information
 # in older-version files. Refer to discussion in the <b>Unicode</b> section above.
@@ -375,6 +377,66 @@ USE_MMAP = MMAP_AVAILABLE
 # Sheet.row_len() method.
 # <br /> -- New in version 0.7.2
 #
+# @param use_expat XLSX only. True means worksheets are parsed by expat callbacks
+# that store cells directly, instead of by ElementTree.iterparse, which creates
+# an Element for every row and cell. Ignored for XLS and XLSB files.
+# <br /> -- New in version 0.9.4
+#
+# @param check_cell_names XLSX only. True means each cell's name (e.g. "B5") is
+# decoded a character at a time. False (the default) checks that it ends with the
+# number of the row it is in, and decodes the column letters using a cache.
+# Either way, a cell name that doesn't match its row raises an exception.
+# Ignored for XLS and XLSB files.
+# <br /> -- New in version 0.9.4
+#
+# @param lazy_sst XLSX and XLS (BIFF8) only. True means the shared string table
+# is only indexed when the workbook is opened, and each string is decoded the
+# first time a cell refers to it. Strings that no loaded cell refers to are
+# never decoded. Ignored for XLSB files.
+# <br /> -- New in version 0.9.4
+#
+# @param values_only XLS only. True means each sheet is read for its cells (and,
+# with formatting_info, their formatting and merged cells) and nothing else:
+# hyperlinks, notes, drawings, conditional formats, window settings, page
+# breaks and embedded charts are skipped without being decoded, so the Sheet
+# attributes for them keep their defaults. Ignored for XLSX and XLSB files.
+# <br /> -- New in version 0.9.4
+#
+# @param processes Number of worker processes to load the sheets in. Each worker
+# loads whole sheets, except that the rows of an XLSX workbook's only sheet are
+# split between the workers if its XML is big enough to be worth it.
+# 0 or 1 (the default) means the sheets are loaded in this process, as they are
+# if this platform can't fork. Ignored with on_demand=True.
+# <br /> -- New in version 0.9.4
+#
+# @param keep_formulas XLSX only. True means the text of each cell's formula is
+# stored in the sheet's formula_map. False (the default) means only the values
+# Excel cached for the formulas are read, and the formulas are skipped without
+# being decoded. Ignored for XLS and XLSB files.
+# <br /> -- New in version 0.9.4
+#
+# @param record_index XLS only. What Book.record_index() returned for the same
+# file when it was opened before. The workbook globals are then read from the
+# records it lists instead of being scanned for, and with lazy_sst the shared
+# string table is not indexed again. An index from another file, or from a
+# different version of this one, is noticed by the stream's size and ignored.
+# Ignored for XLSX and XLSB files.
+# <br /> -- New in version 0.9.4
+#
+# @param load_comments XLSX only. False means cell comments are not read, so
+# each sheet's cell_note_map is empty. Ignored for XLS and XLSB files.
+# <br /> -- New in version 0.9.4
+#
+# @param load_core_props XLSX and XLSB only. False means the document properties
+# (author etc.) are not read. Ignored for XLS files.
+# <br /> -- New in version 0.9.4
+#
+# @param load_styles XLSX and XLSB only. False means the styles are only read as far as
+# is needed to tell date cells from number cells: the Book's xf_list and
+# format_map are left empty, and each number format is only checked for being
+# a date format when a cell that uses it is found. Ignored for XLS files.
+# <br /> -- New in version 0.9.4
+#
 # @return An instance of the Book class.
 
 def open_workbook(filename=None,
@@ -386,6 +448,16 @@ def open_workbook(filename=None,
     formatting_info=False,
     on_demand=False,
     ragged_rows=False,
+    use_expat=False,
+    check_cell_names=False,
+    lazy_sst=False,
+    values_only=False,
+    processes=0,
+    keep_formulas=False,
+    record_index=None,
+    load_comments=True,
+    load_core_props=True,
+    load_styles=True,
     ):
     peeksz = 4
     if file_contents:
@@ -395,10 +467,14 @@ def open_workbook(filename=None,
         peek = f.read(peeksz)
         f.close()
     if peek == b"PK\x03\x04": # a ZIP file
+        t0 = time.time()
         if file_contents:
-            zf = zipfile.ZipFile(timemachine.BYTES_IO(file_contents))
+            zf = zipfile.ZipFile(zipstream.BufferFile(file_contents))
+        elif use_mmap:
+            zf = zipstream.open_mapped_zip(filename)
         else:
             zf = zipfile.ZipFile(filename)
+        zip_open_time = time.time() - t0
 
         # Workaround for some third party files that use forward slashes and
         # lower case names. We map the expected name in lowercase to the
@@ -420,10 +496,34 @@ def open_workbook(filename=None,
                 formatting_info=formatting_info,
                 on_demand=on_demand,
                 ragged_rows=ragged_rows,
+                use_expat=use_expat,
+                check_cell_names=check_cell_names,
+                lazy_sst=lazy_sst,
+                processes=processes,
+                keep_formulas=keep_formulas,
+                load_comments=load_comments,
+                load_core_props=load_core_props,
+                load_styles=load_styles,
                 )
+            bk.load_time_phases.insert(0, ('zip_open', zip_open_time))
             return bk
         if 'xl/workbook.bin' in component_names:
-            raise XLRDError('Excel 2007 xlsb file; not supported')
+            from . import xlsb
+            bk = xlsb.open_workbook_2007_bin(
+                zf,
+                component_names,
+                logfile=logfile,
+                verbosity=verbosity,
+                use_mmap=use_mmap,
+                formatting_info=formatting_info,
+                on_demand=on_demand,
+                ragged_rows=ragged_rows,
+                processes=processes,
+                load_core_props=load_core_props,
+                load_styles=load_styles,
+                )
+            bk.load_time_phases.insert(0, ('zip_open', zip_open_time))
+            return bk
         if 'content.xml' in component_names:
             raise XLRDError('Openoffice.org ODS file; not supported')
         raise XLRDError('ZIP file contents not a known type of workbook')
@@ -439,6 +539,10 @@ def open_workbook(filename=None,
         formatting_info=formatting_info,
         on_demand=on_demand,
         ragged_rows=ragged_rows,
+        processes=processes,
+        lazy_sst=lazy_sst,
+        values_only=values_only,
+        record_index=record_index,
         )
     return bk
 
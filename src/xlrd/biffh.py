@@ -68,6 +68,71 @@ class BaseObject(object):
                 fprintf(f, "%s%s: %r\n", pad, attr, value)
         if footer is not None: print(footer, file=f)
 
+##
+# Counters describing how a workbook or worksheet was parsed. Cheap to collect,
+# so always available via Book.stats and Sheet.stats. Useful for spotting
+# layouts that are slow to load.
+# <br /> -- New in version 0.9.4.
+
+class ParseStats(BaseObject):
+
+    ##
+    # Number of BIFF records (XLS) or XML row and cell elements (XLSX) read.
+    records = 0
+
+    ##
+    # Number of cells stored (calls to put_cell).
+    cells = 0
+
+    ##
+    # Number of rows appended to the cell storage.
+    rows_appended = 0
+
+    ##
+    # Number of times an existing row had to be widened, e.g. because
+    # a cell was beyond the end of a row that had already been stored.
+    row_widenings = 0
+
+    ##
+    # Number of cells that could not be stored in the already-allocated
+    # rows and columns (only counted when ragged_rows is false).
+    put_cell_exceptions = 0
+
+    ##
+    # Number of sheets whose cells were not in row order, so all rows had
+    # to be examined when padding ragged rows (Sheet._first_full_rowx == -2).
+    # For a Sheet, this is 0 or 1.
+    out_of_order = 0
+
+    ##
+    # Number of strings in the shared string table (Book only).
+    sst_size = 0
+
+    ##
+    # Number of worksheets loaded (Book only).
+    sheets = 0
+
+    _fields = ('records', 'cells', 'rows_appended', 'row_widenings',
+        'put_cell_exceptions', 'out_of_order', 'sst_size', 'sheets')
+
+    def __init__(self, **kwargs):
+        for k, v in kwargs.items():
+            setattr(self, k, v)
+
+    def __add__(self, other):
+        result = ParseStats()
+        for k in self._fields:
+            setattr(result, k, getattr(self, k) + getattr(other, k))
+        return result
+
+    ##
+    # @return The counters as a dictionary.
+    def as_dict(self):
+        return dict((k, getattr(self, k)) for k in self._fields)
+
+    def __str__(self):
+        return ' '.join('%s=%d' % (k, getattr(self, k)) for k in self._fields)
+
 FUN, FDT, FNU, FGE, FTX = range(5) # unknown, date, number, general, text
 DATEFORMAT = FDT
 NUMBERFORMAT = FNU
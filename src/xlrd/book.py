@@ -8,6 +8,7 @@ from .timemachine import *
 from .biffh import *
 import struct; unpack = struct.unpack
 import sys
+from array import array
 import time
 from . import sheet
 from . import compdoc
@@ -40,6 +41,11 @@ SUPBOOK_UNK, SUPBOOK_INTERNAL, SUPBOOK_EXTERNAL, SUPBOOK_ADDIN, SUPBOOK_DDEOLE =
 
 SUPPORTED_VERSIONS = (80, 70, 50, 45, 40, 30, 21, 20)
 
+##
+# Version of the layout of the dicts returned by Book.record_index().
+# Indexes of another version are ignored by open_workbook.
+RECORD_INDEX_VERSION = 1
+
 _code_from_builtin_name = {
     "Consolidate_Area": "\x00",
     "Auto_Open":        "\x01",
@@ -70,6 +76,7 @@ def open_workbook_xls(filename=None,
     file_contents=None,
     encoding_override=None,
     formatting_info=False, on_demand=False, ragged_rows=False,
+    processes=0, lazy_sst=False, values_only=False, record_index=None,
     ):
     t0 = time.clock()
     if TOGGLE_GC:
@@ -78,6 +85,7 @@ def open_workbook_xls(filename=None,
             gc.disable()
     bk = Book()
     try:
+        w0 = time.time()
         bk.biff2_8_load(
             filename=filename, file_contents=file_contents,
             logfile=logfile, verbosity=verbosity, use_mmap=use_mmap,
@@ -85,7 +93,10 @@ def open_workbook_xls(filename=None,
             formatting_info=formatting_info,
             on_demand=on_demand,
             ragged_rows=ragged_rows,
+            lazy_sst=lazy_sst,
+            values_only=values_only,
             )
+        bk.load_time_phases.append(('file_open', time.time() - w0))
         t1 = time.clock()
         bk.load_time_stage_1 = t1 - t0
         biff_version = bk.getbof(XL_WORKBOOK_GLOBALS)
@@ -113,10 +124,13 @@ def open_workbook_xls(filename=None,
                                     "*** Setting on_demand to False.\n")
                 bk.on_demand = on_demand = False
         else:
-            bk.parse_globals()
+            if record_index and bk.record_index_matches(record_index):
+                bk.parse_globals_from_index(record_index)
+            else:
+                bk.parse_globals()
             bk._sheet_list = [None for sh in bk._sheet_names]
             if not on_demand:
-                bk.get_sheets()
+                bk.get_sheets(processes)
         bk.nsheets = len(bk._sheet_list)
         if biff_version == 45 and bk.nsheets > 1:
             fprintf(bk.logfile,
@@ -416,6 +430,31 @@ class Book(BaseObject):
     # Time in seconds to parse the data from the contiguous string (or mmap equivalent).
     load_time_stage_2 = -1.0
 
+    ##
+    # List of (phase, seconds) tuples giving the wall-clock time taken by each
+    # phase of loading, in the order the phases finished. Phases are
+    # "file_open" or "zip_open", "sst" and one "sheet" entry per sheet loaded.
+    # Sheets loaded in worker processes (see the processes argument of
+    # open_workbook) add a "sheet_merge" entry for copying them into the Book.
+    # XLSX workbooks end with an "inflate" entry: the part of the other phases
+    # spent reading and decompressing zip members rather than parsing them.
+    load_time_phases = []
+
+    ##
+    # Counters describing how the workbook was parsed, as a
+    # {@link #ParseStats} object. The sheet counters are summed over the
+    # sheets loaded so far. records includes the workbook globals.
+    # <br /> -- New in version 0.9.4.
+    @property
+    def stats(self):
+        stats = ParseStats()
+        for sh in self._sheet_list:
+            if sh:
+                stats += sh.stats
+        stats.records = self._records_read
+        stats.sst_size = self._sst_size
+        return stats
+
     ##
     # @return A list of all sheets in the book.
     # All sheets not already loaded will be loaded.
@@ -546,6 +585,14 @@ class Book(BaseObject):
         self.style_name_map = {}
         self.mem = b''
         self.filestr = b''
+        self.load_time_phases = []
+        self._records_read = 0
+        self._sst_size = 0
+        self.values_only = 0
+        self._globals_layout = [] # (code, position, length) of handled globals records
+        self._globals_end = 0 # position after the globals EOF record
+        self._sst_layout = None # for record_index()
+        self._indexed_dimensions = [] # sheets' DIMENSIONS from a record index
 
     def biff2_8_load(self, filename=None, file_contents=None,
         logfile=sys.stdout, verbosity=0, use_mmap=USE_MMAP,
@@ -553,6 +600,8 @@ class Book(BaseObject):
         formatting_info=False,
         on_demand=False,
         ragged_rows=False,
+        lazy_sst=False,
+        values_only=False,
         ):
         # DEBUG = 0
         self.logfile = logfile
@@ -562,6 +611,8 @@ class Book(BaseObject):
         self.formatting_info = formatting_info
         self.on_demand = on_demand
         self.ragged_rows = ragged_rows
+        self.lazy_sst = lazy_sst
+        self.values_only = values_only
 
         if not file_contents:
             with open(filename, "rb") as f:
@@ -601,7 +652,10 @@ class Book(BaseObject):
                     raise XLRDError("Can't find workbook in OLE2 compound document")
                 self.stream_len = len(self.mem)
             del cd
-            if self.mem is not self.filestr:
+            if isinstance(self.mem, compdoc.SectorStream):
+                # It reads from filestr, and closes it when it's closed.
+                self.filestr = b''
+            elif self.mem is not self.filestr:
                 if hasattr(self.filestr, "close"):
                     self.filestr.close()
                 self.filestr = b''
@@ -637,8 +691,38 @@ class Book(BaseObject):
         pos += 4
         data = mem[pos:pos+length]
         self._position = pos + length
+        self._records_read += 1
         return (code, length, data)
 
+    ##
+    # Generator of (code, buffer, offset, length) for the records from the
+    # current position on, where the record's data is at offset in buffer.
+    # Nothing is copied unless the stream is a fragmented
+    # compdoc.SectorStream and the record spans two runs of sectors: the
+    # data can be unpacked in place with struct.unpack_from. The position is
+    # read afresh for each record, so records read with get_record_parts in
+    # the meantime are skipped.
+    def iter_records(self):
+        mem = self.mem
+        unpack_header_from = struct.Struct('<HH').unpack_from
+        if isinstance(mem, compdoc.SectorStream):
+            locate = mem.locate
+            while 1:
+                pos = self._position
+                code, length = unpack_header_from(*locate(pos, 4))
+                pos += 4
+                self._position = pos + length
+                self._records_read += 1
+                buf, offset = locate(pos, length)
+                yield code, buf, offset, length
+        while 1:
+            pos = self._position
+            code, length = unpack_header_from(mem, pos)
+            pos += 4
+            self._position = pos + length
+            self._records_read += 1
+            yield code, mem, pos, length
+
     def get_record_parts_conditional(self, reqd_record):
         pos = self._position
         mem = self.mem
@@ -650,6 +734,16 @@ class Book(BaseObject):
         self._position = pos + length
         return (code, length, data)
 
+    # Empty Sheet for sheet sh_number, for parallel.load_sheets to fill in.
+    def new_sheet(self, sh_number):
+        sh = sheet.Sheet(self,
+                self._sh_abs_posn[sh_number],
+                self._sheet_names[sh_number],
+                sh_number,
+                )
+        self._sheet_list[sh_number] = sh
+        return sh
+
     def get_sheet(self, sh_number, update_pos=True):
         if self._resources_released:
             raise XLRDError("Can't load sheets after releasing resources.")
@@ -666,13 +760,19 @@ class Book(BaseObject):
                 self._sheet_names[sh_number],
                 sh_number,
                 )
+        t0 = time.time()
         sh.read(self)
+        self.load_time_phases.append(('sheet', time.time() - t0))
         self._sheet_list[sh_number] = sh
         return sh
 
-    def get_sheets(self):
+    def get_sheets(self, processes=0):
         # DEBUG = 0
         if DEBUG: print("GET_SHEETS:", self._sheet_names, self._sh_abs_posn, file=self.logfile)
+        if processes > 1 and len(self._sheet_names) > 1:
+            from .parallel import load_sheets
+            if load_sheets(self, self.get_sheet, self.new_sheet, processes):
+                return
         for sheetno in xrange(len(self._sheet_names)):
             if DEBUG: print("GET_SHEETS: sheetno =", sheetno, self._sheet_names, self._sh_abs_posn, file=self.logfile)
             self.get_sheet(sheetno)
@@ -1110,11 +1210,12 @@ class Book(BaseObject):
 
     def handle_sst(self, data):
         # DEBUG = 1
+        t0 = time.time()
         if DEBUG:
             print("SST Processing", file=self.logfile)
-            t0 = time.time()
         nbt = len(data)
         strlist = [data]
+        records = [(self._position - nbt, nbt)]
         uniquestrings = unpack('<i', data[4:8])[0]
         if DEBUG  or self.verbosity >= 2:
             fprintf(self.logfile, "SST: unique strings: %d\n", uniquestrings)
@@ -1126,13 +1227,31 @@ class Book(BaseObject):
             if DEBUG >= 2:
                 fprintf(self.logfile, "CONTINUE: adding %d bytes to SST -> %d\n", nb, nbt)
             strlist.append(data)
-        self._sharedstrings, rt_runlist = unpack_SST_table(strlist, uniquestrings)
-        if self.formatting_info:
-            self._rich_text_runlist_map = rt_runlist        
+            records.append((self._position - nb, nb))
+        self.load_sst(strlist, uniquestrings, records)
+        t1 = time.time()
+        self.load_time_phases.append(('sst', t1 - t0))
         if DEBUG:
-            t1 = time.time()
             print("SST processing took %.2f seconds" % (t1 - t0, ), file=self.logfile)
 
+    ##
+    # Set up the shared string table from the data of the SST record and its
+    # CONTINUE records (datatab), which are at the (position, length) pairs
+    # in records. offsets is passed on to LazySST.
+    def load_sst(self, datatab, nstrings, records, offsets=None):
+        if self.lazy_sst:
+            sst = LazySST(datatab, nstrings, offsets)
+            rt_runlist = sst.richtext_runs
+            offsets = (sst.datainxs, sst.positions, sst.richtext_runs)
+        else:
+            sst, rt_runlist = unpack_SST_table(datatab, nstrings)
+            offsets = None
+        self._sharedstrings = sst
+        self._sst_size = len(sst)
+        if self.formatting_info:
+            self._rich_text_runlist_map = rt_runlist
+        self._sst_layout = (nstrings, records, offsets)
+
     def handle_writeaccess(self, data):
         DEBUG = 0
         if self.biff_version < 80:
@@ -1147,58 +1266,50 @@ class Book(BaseObject):
         strg = strg.rstrip()
         self.user_name = strg
 
+    ##
+    # Map from record code to the method that handles the workbook globals
+    # record's data.
+    def global_record_handlers(self):
+        return {
+            XL_SST: self.handle_sst,
+            XL_FONT: self.handle_font,
+            XL_FONT_B3B4: self.handle_font,
+            XL_FORMAT: self.handle_format, # XL_FORMAT2 is BIFF <= 3.0, can't appear in globals
+            XL_XF: self.handle_xf,
+            XL_BOUNDSHEET: self.handle_boundsheet,
+            XL_DATEMODE: self.handle_datemode,
+            XL_CODEPAGE: self.handle_codepage,
+            XL_COUNTRY: self.handle_country,
+            XL_EXTERNNAME: self.handle_externname,
+            XL_EXTERNSHEET: self.handle_externsheet,
+            XL_FILEPASS: self.handle_filepass,
+            XL_WRITEACCESS: self.handle_writeaccess,
+            XL_SHEETSOFFSET: self.handle_sheetsoffset,
+            XL_SHEETHDR: self.handle_sheethdr,
+            XL_SUPBOOK: self.handle_supbook,
+            XL_NAME: self.handle_name,
+            XL_PALETTE: self.handle_palette,
+            XL_STYLE: self.handle_style,
+            }
+
     def parse_globals(self):
         # DEBUG = 0
         # no need to position, just start reading (after the BOF)
         formatting.initialise_book(self)
-        while 1:
-            rc, length, data = self.get_record_parts()
+        handlers = self.global_record_handlers()
+        layout = self._globals_layout = []
+        for rc, buf, offset, length in self.iter_records():
             if DEBUG: print("parse_globals: record code is 0x%04x" % rc, file=self.logfile)
-            if rc == XL_SST:
-                self.handle_sst(data)
-            elif rc == XL_FONT or rc == XL_FONT_B3B4:
-                self.handle_font(data)
-            elif rc == XL_FORMAT: # XL_FORMAT2 is BIFF <= 3.0, can't appear in globals
-                self.handle_format(data)
-            elif rc == XL_XF:
-                self.handle_xf(data)
-            elif rc ==  XL_BOUNDSHEET:
-                self.handle_boundsheet(data)
-            elif rc == XL_DATEMODE:
-                self.handle_datemode(data)
-            elif rc == XL_CODEPAGE:
-                self.handle_codepage(data)
-            elif rc == XL_COUNTRY:
-                self.handle_country(data)
-            elif rc == XL_EXTERNNAME:
-                self.handle_externname(data)
-            elif rc == XL_EXTERNSHEET:
-                self.handle_externsheet(data)
-            elif rc == XL_FILEPASS:
-                self.handle_filepass(data)
-            elif rc == XL_WRITEACCESS:
-                self.handle_writeaccess(data)
-            elif rc == XL_SHEETSOFFSET:
-                self.handle_sheetsoffset(data)
-            elif rc == XL_SHEETHDR:
-                self.handle_sheethdr(data)
-            elif rc == XL_SUPBOOK:
-                self.handle_supbook(data)
-            elif rc == XL_NAME:
-                self.handle_name(data)
-            elif rc == XL_PALETTE:
-                self.handle_palette(data)
-            elif rc == XL_STYLE:
-                self.handle_style(data)
+            handler = handlers.get(rc)
+            if handler is not None:
+                layout.append((rc, self._position - length, length))
+                handler(buf[offset:offset+length])
             elif rc & 0xff == 9 and self.verbosity:
                 fprintf(self.logfile, "*** Unexpected BOF at posn %d: 0x%04x len=%d data=%r\n",
-                    self._position - length - 4, rc, length, data)
+                    self._position - length - 4, rc, length, buf[offset:offset+length])
             elif rc ==  XL_EOF:
-                self.xf_epilogue()
-                self.names_epilogue()
-                self.palette_epilogue()
-                if not self.encoding:
-                    self.derive_encoding()
+                self._globals_end = self._position
+                self.globals_epilogue()
                 if self.biff_version == 45:
                     # DEBUG = 0
                     if DEBUG: print("global EOF: position", self._position, file=self.logfile)
@@ -1206,10 +1317,117 @@ class Book(BaseObject):
                     #     pos = self._position - 4
                     #     print repr(self.mem[pos:pos+40])
                 return
+            # else:
+            #     if DEBUG:
+            #         print >> self.logfile, "parse_globals: ignoring record code 0x%04x" % rc
+
+    def globals_epilogue(self):
+        self.xf_epilogue()
+        self.names_epilogue()
+        self.palette_epilogue()
+        if not self.encoding:
+            self.derive_encoding()
+
+    ##
+    # An index of where things are in this workbook's BIFF stream, which
+    # open_workbook can use (record_index argument) to open the same file
+    # again without scanning the workbook globals: the position of each
+    # globals record that is used and of the SST and CONTINUE records (with
+    # where each string starts, if they were loaded with lazy_sst), each
+    # sheet's position, and the DIMENSIONS of the sheets loaded so far.
+    # The index is a dict of plain values that can be pickled. It is only
+    # valid for the same file, unchanged.
+    # @return The index, or None if the workbook is not an XLS file of
+    # BIFF 5 or later.
+    # <br /> -- New in version 0.9.4
+    def record_index(self):
+        if not self._globals_layout or self.biff_version < 50:
+            return None
+        sst = None
+        if self._sst_layout:
+            nstrings, records, offsets = self._sst_layout
+            if offsets:
+                datainxs, positions, richtext_runs = offsets
+                offsets = (datainxs.typecode, datainxs.itemsize,
+                    _array_tobytes(datainxs), _array_tobytes(positions),
+                    richtext_runs)
+            sst = (nstrings, records, offsets)
+        sheets = []
+        for sheetx, posn in enumerate(self._sh_abs_posn):
+            sheets.append((posn, self.sheet_dimensions(sheetx)))
+        return {
+            'version': RECORD_INDEX_VERSION,
+            'biff_version': self.biff_version,
+            'base': self.base,
+            'stream_len': self.stream_len,
+            'globals': list(self._globals_layout),
+            'globals_end': self._globals_end,
+            'sst': sst,
+            'sheets': sheets,
+            }
+
+    def record_index_matches(self, index):
+        try:
+            return (
+                index['version'] == RECORD_INDEX_VERSION
+                and index['biff_version'] == self.biff_version
+                and index['base'] == self.base
+                and index['stream_len'] == self.stream_len
+                )
+        except (KeyError, TypeError):
+            return False
+
+    ##
+    # Like parse_globals, but only the records listed in a record index are
+    # read, and the SST is set up from the index.
+    def parse_globals_from_index(self, index):
+        formatting.initialise_book(self)
+        handlers = self.global_record_handlers()
+        mem = self.mem
+        for rc, pos, length in index['globals']:
+            self._position = pos + length
+            self._records_read += 1
+            if rc == XL_SST:
+                self.load_indexed_sst(index['sst'])
+            else:
+                handlers[rc](mem[pos:pos+length])
+        self._globals_layout = list(index['globals'])
+        self._globals_end = self._position = index['globals_end']
+        self._indexed_dimensions = [dims for posn, dims in index['sheets']]
+        self.globals_epilogue()
+
+    def load_indexed_sst(self, sst_index):
+        t0 = time.time()
+        nstrings, records, offsets = sst_index
+        mem = self.mem
+        datatab = [mem[pos:pos+length] for pos, length in records]
+        if offsets:
+            typecode, itemsize, datainxs_bytes, positions_bytes, richtext_runs = offsets
+            datainxs = array(typecode)
+            positions = array(typecode)
+            if datainxs.itemsize == itemsize:
+                _array_frombytes(datainxs, datainxs_bytes)
+                _array_frombytes(positions, positions_bytes)
+                offsets = (datainxs, positions, richtext_runs)
             else:
-                # if DEBUG:
-                #     print >> self.logfile, "parse_globals: ignoring record code 0x%04x" % rc
-                pass
+                offsets = None
+        self.load_sst(datatab, nstrings, records, offsets)
+        self.load_time_phases.append(('sst', time.time() - t0))
+
+    ##
+    # @param sheetx Sheet index in range(nsheets)
+    # @return (nrows, ncols) as given by the sheet's DIMENSIONS record, or None
+    # if that is not known. It is known for XLS sheets that have been loaded,
+    # and for the others if the workbook was opened with a record_index in
+    # which they had been loaded.
+    # <br /> -- New in version 0.9.4
+    def sheet_dimensions(self, sheetx):
+        if sheetx < len(self._sheet_list) and self._sheet_list[sheetx]:
+            sh = self._sheet_list[sheetx]
+            return (sh._dimnrows, sh._dimncols)
+        if sheetx < len(self._indexed_dimensions):
+            return self._indexed_dimensions[sheetx]
+        return None
 
     def read(self, pos, length):
         data = self.mem[pos:pos+length]
@@ -1418,3 +1636,156 @@ def unpack_SST_table(datatab, nstrings):
                 assert _unused_i == nstrings - 1
         strappend(accstrg)
     return strings, richtext_runs
+
+_unpack_H_from = struct.Struct('<H').unpack_from
+_unpack_i_from = struct.Struct('<i').unpack_from
+_array_tobytes = getattr(array, 'tobytes', None) or array.tostring
+_array_frombytes = getattr(array, 'frombytes', None) or array.fromstring
+
+##
+# Walk the SST and CONTINUE records as unpack_SST_table does, but only record
+# where each string starts (record index and offset of its header). Rich text
+# runs are read as they are passed, for formatting_info.
+# Returns (datainxs, positions, richtext_runs).
+
+def index_SST_table(datatab, nstrings):
+    datainxs = array('l')
+    positions = array('l')
+    richtext_runs = {}
+    unpack_H_from = _unpack_H_from
+    local_min = min
+    local_BYTES_ORD = BYTES_ORD
+    datainx = 0
+    ndatas = len(datatab)
+    data = datatab[0]
+    datalen = len(data)
+    pos = 8
+    for stringx in xrange(nstrings):
+        datainxs.append(datainx)
+        positions.append(pos)
+        nchars, = unpack_H_from(data, pos)
+        options = local_BYTES_ORD(data[pos + 2])
+        pos += 3
+        rtcount = 0
+        phosz = 0
+        if options & 0x08: # richtext
+            rtcount, = unpack_H_from(data, pos)
+            pos += 2
+        if options & 0x04: # phonetic
+            phosz, = _unpack_i_from(data, pos)
+            pos += 4
+        nbytes = nchars << (options & 0x01)
+        if pos + nbytes <= datalen:
+            # Not continued in the next record, which is the usual case
+            pos += nbytes
+            charsgot = nchars
+        else:
+            charsgot = 0
+        while charsgot < nchars:
+            charsneed = nchars - charsgot
+            if options & 0x01:
+                charsavail = local_min((datalen - pos) >> 1, charsneed)
+                pos += 2*charsavail
+            else:
+                charsavail = local_min(datalen - pos, charsneed)
+                pos += charsavail
+            charsgot += charsavail
+            if charsgot == nchars:
+                break
+            datainx += 1
+            data = datatab[datainx]
+            datalen = len(data)
+            options = local_BYTES_ORD(data[0])
+            pos = 1
+        if rtcount:
+            runs = []
+            for runindex in xrange(rtcount):
+                if pos == datalen:
+                    pos = 0
+                    datainx += 1
+                    data = datatab[datainx]
+                    datalen = len(data)
+                runs.append(unpack("<HH", data[pos:pos+4]))
+                pos += 4
+            richtext_runs[stringx] = runs
+        pos += phosz # size of the phonetic stuff to skip
+        if pos >= datalen:
+            # adjust to correct position in next record
+            pos = pos - datalen
+            datainx += 1
+            if datainx < ndatas:
+                data = datatab[datainx]
+                datalen = len(data)
+            else:
+                assert stringx == nstrings - 1
+    return datainxs, positions, richtext_runs
+
+class LazySST(object):
+    # Shared string table that decodes each string the first time it is
+    # looked up. offsets is what index_SST_table returns for datatab,
+    # e.g. from a record index; by default it is worked out here.
+
+    def __init__(self, datatab, nstrings, offsets=None):
+        self.datatab = datatab
+        if offsets is None:
+            offsets = index_SST_table(datatab, nstrings)
+        self.datainxs, self.positions, self.richtext_runs = offsets
+        # Decoded strings
+        self.strings = [None] * len(self.positions)
+        # Number of strings decoded
+        self.ndecoded = 0
+
+    def __len__(self):
+        return len(self.strings)
+
+    def __getitem__(self, index):
+        s = self.strings[index]
+        if s is None:
+            s = self.strings[index] = self.decode(index)
+        return s
+
+    def __iter__(self):
+        for index in xrange(len(self.strings)):
+            yield self[index]
+
+    def decode(self, index):
+        self.ndecoded += 1
+        datatab = self.datatab
+        datainx = self.datainxs[index]
+        data = datatab[datainx]
+        pos = self.positions[index]
+        nchars, = _unpack_H_from(data, pos)
+        options = BYTES_ORD(data[pos + 2])
+        pos += 3
+        if options & 0x08: # richtext
+            pos += 2
+        if options & 0x04: # phonetic
+            pos += 4
+        if options & 0x01:
+            end = pos + 2*nchars
+            if end <= len(data):
+                return unicode(data[pos:end], "utf_16_le")
+        else:
+            end = pos + nchars
+            if end <= len(data):
+                return unicode(data[pos:end], "latin_1")
+        pieces = []
+        charsgot = 0
+        while 1:
+            charsneed = nchars - charsgot
+            if options & 0x01:
+                # Uncompressed UTF-16
+                charsavail = min((len(data) - pos) >> 1, charsneed)
+                pieces.append(unicode(data[pos:pos+2*charsavail], "utf_16_le"))
+            else:
+                # Note: this is COMPRESSED (not ASCII!) encoding!!!
+                charsavail = min(len(data) - pos, charsneed)
+                pieces.append(unicode(data[pos:pos+charsavail], "latin_1"))
+            charsgot += charsavail
+            if charsgot == nchars:
+                break
+            datainx += 1
+            data = datatab[datainx]
+            options = BYTES_ORD(data[0])
+            pos = 1
+        return UNICODE_LITERAL('').join(pieces)
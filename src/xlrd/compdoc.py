@@ -17,6 +17,7 @@
 
 from __future__ import print_function
 import sys
+from bisect import bisect_right
 from struct import unpack
 from .timemachine import *
 import array
@@ -374,7 +375,8 @@ class CompDoc(object):
     # If the named stream is found and is contiguous within the original byte sequence ("mem")
     # used when the document was opened,
     # then (mem, offset_to_start_of_stream, length_of_stream) is returned.
-    # Otherwise a new string is built from the fragments and (new_string, 0, length_of_stream) is returned.
+    # Otherwise (SectorStream, 0, length_of_stream) is returned, the SectorStream reading the
+    # fragments in place.
     # @param qname Name of the desired stream e.g. u'Workbook'. Should be in Unicode or convertible thereto.
 
     def locate_named_stream(self, qname):
@@ -443,7 +445,67 @@ class CompDoc(object):
             return (mem, start_pos, expected_stream_size)
         slices.append((start_pos, end_pos))
         # print >> self.logfile, "+++>>> %d fragments" % len(slices)
-        return (b''.join([mem[start_pos:end_pos] for start_pos, end_pos in slices]), 0, expected_stream_size)
+        return (SectorStream(mem, slices, expected_stream_size), 0, expected_stream_size)
+
+##
+# Read-only view of a stream whose sectors are scattered through mem, as
+# returned by CompDoc.locate_named_stream. The stream is never copied
+# whole: slicing it copies just the bytes asked for from the runs of
+# contiguous sectors they are in.
+# @param mem The contents of the file, as for CompDoc.
+# @param runs List of (start, end) offsets in mem of each run of contiguous
+# sectors, in stream order.
+# @param size Length of the stream, which may end part way into its last sector.
+
+class SectorStream(object):
+
+    def __init__(self, mem, runs, size):
+        self.mem = mem
+        self.size = size
+        self.run_starts = [] # offset in the stream of each run
+        self.run_offsets = [] # offset in mem of each run
+        self.run_ends = [] # offset in the stream of the end of each run
+        pos = 0
+        for start_pos, end_pos in runs:
+            self.run_starts.append(pos)
+            self.run_offsets.append(start_pos)
+            pos += end_pos - start_pos
+            self.run_ends.append(min(pos, size))
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, item):
+        start, stop, _unused = item.indices(self.size)
+        if start >= stop:
+            return b''
+        i = bisect_right(self.run_starts, start) - 1
+        if stop <= self.run_ends[i]:
+            offset = self.run_offsets[i] - self.run_starts[i]
+            return self.mem[offset+start:offset+stop]
+        pieces = []
+        while start < stop:
+            end = min(stop, self.run_ends[i])
+            offset = self.run_offsets[i] - self.run_starts[i]
+            pieces.append(self.mem[offset+start:offset+end])
+            start = end
+            i += 1
+        return b''.join(pieces)
+
+    ##
+    # Returns (buffer, offset) such that the length bytes of the stream at
+    # pos are at offset in buffer: mem itself if they are in one run,
+    # otherwise a copy of them.
+    def locate(self, pos, length):
+        i = bisect_right(self.run_starts, pos) - 1
+        if pos + length <= self.run_ends[i]:
+            return self.mem, self.run_offsets[i] + pos - self.run_starts[i]
+        return self[pos:pos+length], 0
+
+    def close(self):
+        if hasattr(self.mem, "close"):
+            self.mem.close()
+        self.mem = None
 
 # ==========================================================================================
 def x_dump_line(alist, stride, f, dpos, equal=0):
@@ -0,0 +1,167 @@
+##
+# Loading a workbook's sheets in worker processes.
+#
+# <p>This module is part of the xlrd package, which is released under a BSD-style licence.</p>
+##
+
+# Sheets are independent of each other once the workbook globals (for XLS) or
+# the shared strings and styles (for XLSX) have been loaded. The workers are
+# forked after that, so they share the parent's Book, and each one loads whole
+# sheets. The cells come back as flat arrays with one entry per cell plus the
+# row lengths, which pickle much more compactly than a list per row, and the
+# parent slices them back into rows. The rows of a single big XLSX sheet can
+# be split between the workers in the same way (see X12Sheet.process_chunks).
+# The parent has the shared strings already, so load_sheets' workers look
+# them up in a range instead: a cell's value is then the index of its
+# string, which is much cheaper to send back than the string, and the
+# parent puts its own string objects in the rows.
+
+from __future__ import print_function
+
+import os
+import time
+from array import array
+from .timemachine import *
+from .biffh import XL_CELL_TEXT
+
+# Sheet attributes that refer to the Book or can't be pickled.
+# The parent's Sheet keeps its own.
+_LOCAL_ATTRS = ('book', 'logfile', 'put_cell', '_xf_index_to_xl_type_map')
+
+# Callable run by the workers of imap_forked.
+# Set in the parent just before the workers are forked.
+_func = None
+
+##
+# Pool of worker processes forked from this one, or None if this platform
+# can't fork.
+def fork_pool(processes, initializer=None):
+    import multiprocessing
+    try:
+        ctx = multiprocessing.get_context('fork')
+    except AttributeError: # Python 2 always forks
+        if not hasattr(os, 'fork'):
+            return None
+        ctx = multiprocessing
+    except ValueError:
+        return None
+    return ctx.Pool(processes, initializer)
+
+def _call(arg):
+    return _func(arg)
+
+def _results(pool, args):
+    try:
+        for result in pool.imap_unordered(_call, args):
+            yield result
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+##
+# Call func(arg) for each arg in args in up to processes forked worker
+# processes. func needn't be picklable (it can be a closure), but its
+# results must be.
+# initializer, if given, is called in each worker when it starts, e.g. to
+# reopen files whose offsets would otherwise be shared with the parent.
+# Returns an iterator over the results in the order they finish, or None if
+# worker processes can't be used.
+def imap_forked(func, args, processes, initializer=None):
+    global _func
+    _func = func
+    try:
+        pool = fork_pool(processes, initializer)
+    finally:
+        _func = None
+    if pool is None:
+        return None
+    return _results(pool, args)
+
+# Sheet's attributes and cells in a form that pickles compactly.
+# With sst_indexes, text cells whose value is an int hold the index of a
+# shared string, and their positions are listed for unpack_rows.
+def pack_sheet(sh, sst_indexes=False):
+    state = {}
+    for attr, value in sh.__dict__.items():
+        if attr not in _LOCAL_ATTRS:
+            state[attr] = value
+    cell_values = state.pop('_cell_values')
+    cell_types = state.pop('_cell_types')
+    cell_xf_indexes = state.pop('_cell_xf_indexes')
+    row_lens = array('l', [len(row) for row in cell_values])
+    values = []
+    types = array('B')
+    for rowx in xrange(len(cell_values)):
+        values.extend(cell_values[rowx])
+        types.extend(cell_types[rowx])
+    xfs = None
+    if cell_xf_indexes:
+        xfs = array('h')
+        for row in cell_xf_indexes:
+            xfs.extend(row)
+    sst_cells = None
+    if sst_indexes:
+        sst_cells = array('l', [pos for pos, ctype in enumerate(types)
+            if ctype == XL_CELL_TEXT and values[pos].__class__ is int])
+    return state, row_lens, values, types, xfs, sst_cells
+
+# Rows of a packed sheet, as (values, types, xf_indexes) lists.
+# xf_indexes is empty unless the sheet has formatting info.
+# sst is the Book's shared strings, for sheets packed with sst_indexes.
+def unpack_rows(packed, sst=None):
+    state, row_lens, values, types, xfs, sst_cells = packed
+    if sst_cells:
+        for pos in sst_cells:
+            values[pos] = sst[values[pos]]
+    cell_values = []
+    cell_types = []
+    cell_xf_indexes = []
+    pos = 0
+    for n in row_lens:
+        end = pos + n
+        cell_values.append(values[pos:end])
+        cell_types.append(types[pos:end])
+        if xfs is not None:
+            cell_xf_indexes.append(xfs[pos:end])
+        pos = end
+    return cell_values, cell_types, cell_xf_indexes
+
+def unpack_sheet(sh, packed, sst=None):
+    sh.__dict__.update(packed[0])
+    sh.__dict__.pop('put_cell', None) # as tidy_dimensions does
+    sh._cell_values, sh._cell_types, sh._cell_xf_indexes = unpack_rows(packed, sst)
+
+##
+# Load all sheets of bk in up to processes worker processes.
+# load(sheetx) is called in a worker and returns the loaded Sheet;
+# sheet_for(sheetx) is called in the parent and returns the Sheet to copy it to.
+# initializer is passed to imap_forked.
+# Returns False, having loaded nothing, if worker processes can't be used.
+def load_sheets(bk, load, sheet_for, processes, initializer=None):
+    sst = bk._sharedstrings
+    sst_indexes = xrange(len(sst))
+
+    def work(sheetx):
+        t0 = time.time()
+        # This is the worker's copy of bk
+        bk._sharedstrings = sst_indexes
+        sh = load(sheetx)
+        return sheetx, time.time() - t0, pack_sheet(sh, sst_indexes=True)
+
+    nsheets = len(bk._sheet_names)
+    results = imap_forked(work, xrange(nsheets), min(processes, nsheets), initializer)
+    if results is None:
+        return False
+    merge_time = 0.0
+    for sheetx, seconds, packed in results:
+        t0 = time.time()
+        sh = sheet_for(sheetx)
+        unpack_sheet(sh, packed, sst)
+        bk._records_read += sh._records_read
+        merge_time += time.time() - t0
+        bk.load_time_phases.append(('sheet', seconds))
+    bk.load_time_phases.append(('sheet_merge', merge_time))
+    return True
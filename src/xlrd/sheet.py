@@ -30,7 +30,7 @@
 from __future__ import print_function
 
 from array import array
-from struct import unpack, calcsize
+from struct import Struct, unpack, unpack_from, calcsize
 from .biffh import *
 from .timemachine import *
 from .formula import dump_formula, decompile_formula, rangename2d, FMLA_TYPE_CELL, FMLA_TYPE_SHARED
@@ -39,6 +39,43 @@ from .formatting import nearest_colour_index, Format
 DEBUG = 0
 OBJ_MSO_DEBUG = 0
 
+# Unpackers for the commonest cell records, which Sheet.read unpacks in place
+_unpack_number_from = Struct('<HHHd').unpack_from # NUMBER
+_unpack_labelsst_from = Struct('<HHHi').unpack_from # LABELSST
+_unpack_cell_from = Struct('<HHH').unpack_from # RK, and the start of MULRK
+_unpack_H_from = Struct('<H').unpack_from
+_unpack_i_from = Struct('<i').unpack_from
+_unpack_d = Struct('<d').unpack
+_pack_q = Struct('<q').pack
+
+# MULRK unpackers, compiled once per record width
+_MULRK_unpackers = {}
+
+# Most cells to preallocate from a DIMENSIONS record or <dimension> element,
+# in case it is wrong.
+PREALLOCATE_MAX_CELLS = 2 ** 20
+
+_array_tobytes = getattr(array, 'tobytes', None) or array.tostring
+
+# Records that Sheet.read handles with open_workbook(values_only=True):
+# cells, the records that go with formula cells, row and column formatting
+# and merged cells (used with formatting_info), the dimensions, embedded
+# substreams (so that they can be skipped) and EOF.
+# Everything else is skipped without its data being copied.
+VALUES_ONLY_RECORDS = frozenset(
+    (XL_NUMBER, XL_LABELSST, XL_RK, XL_MULRK, XL_LABEL, XL_RSTRING,
+    XL_BOOLERR, XL_BLANK, XL_MULBLANK,
+    XL_ROW, XL_COLINFO, XL_GCW, XL_DEFCOLWIDTH, XL_STANDARDWIDTH,
+    XL_DEFAULTROWHEIGHT, XL_MERGEDCELLS,
+    XL_DIMENSION, XL_DIMENSION2, XL_EOF)
+    + XL_FORMULA_OPCODES + bofcodes
+    )
+
+XL_SHRFMLA_ETC_ETC = (
+    XL_SHRFMLA, XL_ARRAY, XL_TABLEOP, XL_TABLEOP2,
+    XL_ARRAY2, XL_TABLEOP_B2,
+    )
+
 _WINDOW2_options = (
     # Attribute names and initial values to use in case
     # a WINDOW2 record is not written.
@@ -260,6 +297,14 @@ class Sheet(BaseObject):
     # Cells not containing a note ("comment") are not mapped.
     # <br />-- New in version 0.7.2 </p>
     cell_note_map = {}    
+
+    ##
+    # <p>A sparse mapping from (rowx, colx) to the text of the cell's formula,
+    # e.g. u"SUM(A1:A3)" (without the leading "=").
+    # Populated only for XLSX files and if open_workbook(keep_formulas=True).
+    # Cells that share a formula defined in another cell are not mapped.
+    # <br />-- New in version 0.9.4 </p>
+    formula_map = {}
     
     ##
     # Number of columns in left pane (frozen panes; for split panes, see comments below in code)
@@ -312,6 +357,9 @@ class Sheet(BaseObject):
         self.verbosity = book.verbosity
         self.formatting_info = book.formatting_info
         self.ragged_rows = book.ragged_rows
+        self.values_only = book.values_only
+        # Bound in the instance while loading, which is faster than the
+        # put_cell method. tidy_dimensions removes it again.
         if self.ragged_rows:
             self.put_cell = self.put_cell_ragged
         else:
@@ -352,6 +400,7 @@ class Sheet(BaseObject):
         self.hyperlink_list = []
         self.hyperlink_map = {}
         self.cell_note_map = {}
+        self.formula_map = {}
 
         # Values calculated by xlrd to predict the mag factors that
         # will actually be used by Excel to display your worksheet.
@@ -381,12 +430,32 @@ class Sheet(BaseObject):
         self.utter_max_cols = 256
 
         self._first_full_rowx = -1
+        self._preallocated = 0
 
-        # self._put_cell_exceptions = 0
-        # self._put_cell_row_widenings = 0
-        # self._put_cell_rows_appended = 0
+        self._records_read = 0
+        self._put_cell_cells = 0
+        self._put_cell_exceptions = 0
+        self._put_cell_row_widenings = 0
+        self._put_cell_rows_appended = 0
         # self._put_cell_cells_appended = 0
 
+    ##
+    # Counters describing how this sheet was parsed, as a
+    # {@link #ParseStats} object. out_of_order is 1 if the cells were
+    # not stored in row order.
+    # <br /> -- New in version 0.9.4.
+    @property
+    def stats(self):
+        return ParseStats(
+            records=self._records_read,
+            cells=self._put_cell_cells,
+            rows_appended=self._put_cell_rows_appended,
+            row_widenings=self._put_cell_row_widenings,
+            put_cell_exceptions=self._put_cell_exceptions,
+            out_of_order=int(self._first_full_rowx == -2),
+            sheets=1,
+            )
+
 
     ##
     # {@link #Cell} object in the given row and column.
@@ -556,12 +625,75 @@ class Sheet(BaseObject):
     # === Following methods are used in building the worksheet.
     # === They are not part of the API.
 
+    ##
+    # Make room for the cells of the extent declared by the DIMENSIONS record
+    # or &lt;dimension&gt; element, so that put_cell doesn't have to grow the rows
+    # as the cells arrive. Does nothing if rows are ragged or cells have been
+    # stored already. At most PREALLOCATE_MAX_CELLS are allocated in case the
+    # declaration is wrong. Rows and columns beyond the last cell are removed
+    # again as soon as a cell falls outside them, or by tidy_dimensions.
+    def preallocate_cells(self):
+        if self.ragged_rows or self._cell_types:
+            return
+        ncols = min(self._dimncols, self.utter_max_cols)
+        if ncols <= 0:
+            return
+        nrows = min(self._dimnrows, self.utter_max_rows, PREALLOCATE_MAX_CELLS // ncols)
+        if nrows <= 0:
+            return
+        bt = self.bt * ncols
+        self._cell_types = [bt[:] for _unused in xrange(nrows)]
+        self._cell_values = [[''] * ncols for _unused in xrange(nrows)]
+        if self.formatting_info:
+            bf = self.bf * ncols
+            self._cell_xf_indexes = [bf[:] for _unused in xrange(nrows)]
+        self.nrows = nrows
+        self.ncols = ncols
+        self._preallocated = 1
+
+    # Shrink preallocated storage to the last row and column with a cell.
+    def trim_preallocated_cells(self):
+        self._preallocated = 0
+        s_cell_types = self._cell_types
+        s_cell_values = self._cell_values
+        s_cell_xf_indexes = self._cell_xf_indexes
+        nrows = self.nrows
+        while nrows and s_cell_types[nrows - 1].count(XL_CELL_EMPTY) == len(s_cell_types[nrows - 1]):
+            nrows -= 1
+        ncols = self.ncols
+        lastcolx = ncols - 1
+        for rowx in xrange(nrows):
+            trow = s_cell_types[rowx]
+            if len(trow) == ncols and trow[lastcolx] != XL_CELL_EMPTY:
+                break # last column is in use
+        else:
+            ncols = 0
+            for rowx in xrange(nrows):
+                rlen = len(_array_tobytes(s_cell_types[rowx]).rstrip(b'\0'))
+                if rlen > ncols:
+                    ncols = rlen
+        del s_cell_types[nrows:]
+        del s_cell_values[nrows:]
+        del s_cell_xf_indexes[nrows:]
+        if ncols < self.ncols:
+            for rowx in xrange(nrows):
+                del s_cell_types[rowx][ncols:]
+                del s_cell_values[rowx][ncols:]
+                if s_cell_xf_indexes:
+                    del s_cell_xf_indexes[rowx][ncols:]
+        if self._first_full_rowx > nrows:
+            self._first_full_rowx = nrows
+        self.nrows = nrows
+        self.ncols = ncols
+
     def tidy_dimensions(self):
         if self.verbosity >= 3:
             fprintf(self.logfile,
                 "tidy_dimensions: nrows=%d ncols=%d \n",
                 self.nrows, self.ncols,
                 )
+        if self._preallocated:
+            self.trim_preallocated_cells()
         if 1 and self.merged_cells:
             nr = nc = 0
             umaxrows = self.utter_max_rows
@@ -582,6 +714,9 @@ class Sheet(BaseObject):
                 # we have the right number of rows. The ragged rows
                 # will sort out the rest if needed.
                 self.put_cell(nr-1, 0, XL_CELL_EMPTY, '', -1)
+        # Loading is finished. The bound put_cell would make this Sheet a
+        # reference cycle, which only the garbage collector could free.
+        self.__dict__.pop('put_cell', None)
         if self.verbosity >= 1 \
         and (self.nrows != self._dimnrows or self.ncols != self._dimncols):
             fprintf(self.logfile,
@@ -615,10 +750,19 @@ class Sheet(BaseObject):
                     if s_fmt_info:
                         s_cell_xf_indexes[rowx][rlen:] = self.bf * nextra
 
+    # Used once the sheet is loaded. Until then the instance has put_cell
+    # bound to one of these itself.
+    def put_cell(self, rowx, colx, ctype, value, xf_index):
+        if self.ragged_rows:
+            self.put_cell_ragged(rowx, colx, ctype, value, xf_index)
+        else:
+            self.put_cell_unragged(rowx, colx, ctype, value, xf_index)
+
     def put_cell_ragged(self, rowx, colx, ctype, value, xf_index):
         if ctype is None:
             # we have a number, so look up the cell type
             ctype = self._xf_index_to_xl_type_map[xf_index]
+        self._put_cell_cells += 1
         assert 0 <= colx < self.utter_max_cols
         assert 0 <= rowx < self.utter_max_rows
         fmt_info = self.formatting_info
@@ -632,6 +776,7 @@ class Sheet(BaseObject):
                 scxa = self._cell_xf_indexes.append
                 bt = self.bt
                 bf = self.bf
+                self._put_cell_rows_appended += nr - self.nrows
                 for _unused in xrange(self.nrows, nr):
                     scta(bt * 0)
                     scva([])
@@ -657,7 +802,7 @@ class Sheet(BaseObject):
                 return
             if num_empty > 0:
                 num_empty += 1
-                # self._put_cell_row_widenings += 1
+                self._put_cell_row_widenings += 1
                 # types_row.extend(self.bt * num_empty)
                 # values_row.extend([''] * num_empty)
                 # if fmt_info:
@@ -674,12 +819,51 @@ class Sheet(BaseObject):
             print("put_cell", rowx, colx, file=self.logfile)
             raise
 
+    ##
+    # Put a run of cells into row rowx, starting at column colx, with one
+    # slice assignment per row list. That needs the row to exist and
+    # either to be long enough already or (ragged rows) to end at colx;
+    # otherwise the cells go through put_cell one at a time.
+    def put_cell_run(self, rowx, colx, ctypes, values, xf_indexes):
+        endx = colx + len(values)
+        if rowx < self.nrows:
+            ltr = len(self._cell_types[rowx])
+            if ltr >= endx or (ltr == colx and self.ragged_rows and endx <= self.utter_max_cols):
+                self._put_cell_cells += endx - colx
+                self._cell_types[rowx][colx:endx] = array('B', ctypes)
+                self._cell_values[rowx][colx:endx] = values
+                if self.formatting_info:
+                    self._cell_xf_indexes[rowx][colx:endx] = array('h', xf_indexes)
+                if endx > self.ncols:
+                    self.ncols = endx
+                return
+        put_cell = self.put_cell
+        for i in xrange(endx - colx):
+            put_cell(rowx, colx + i, ctypes[i], values[i], xf_indexes[i])
+
+    ##
+    # The lists of row rowx, for read() to store a run of cells in without
+    # calling put_cell, as
+    # (types, values, xf_indexes, length, append_limit).
+    # A cell with colx < length replaces the one there. With ragged rows, a
+    # cell with colx == length < append_limit can be appended.
+    def cell_run_row(self, rowx):
+        types_row = self._cell_types[rowx]
+        xfs_row = None
+        if self.formatting_info:
+            xfs_row = self._cell_xf_indexes[rowx]
+        append_limit = 0
+        if self.ragged_rows:
+            append_limit = self.ncols
+        return types_row, self._cell_values[rowx], xfs_row, len(types_row), append_limit
+
     def put_cell_unragged(self, rowx, colx, ctype, value, xf_index):
         if ctype is None:
             # we have a number, so look up the cell type
             ctype = self._xf_index_to_xl_type_map[xf_index]
         # assert 0 <= colx < self.utter_max_cols
         # assert 0 <= rowx < self.utter_max_rows
+        self._put_cell_cells += 1
         try:
             self._cell_types[rowx][colx] = ctype
             self._cell_values[rowx][colx] = value
@@ -688,7 +872,11 @@ class Sheet(BaseObject):
         except IndexError:
             # print >> self.logfile, "put_cell extending", rowx, colx
             # self.extend_cells(rowx+1, colx+1)
-            # self._put_cell_exceptions += 1
+            self._put_cell_exceptions += 1
+            if self._preallocated:
+                # The declared dimensions were wrong, so don't go on
+                # padding new rows to their width.
+                self.trim_preallocated_cells()
             nr = rowx + 1
             nc = colx + 1
             assert 1 <= nc <= self.utter_max_cols
@@ -713,7 +901,7 @@ class Sheet(BaseObject):
                 trow = self._cell_types[rowx]
                 nextra = self.ncols - len(trow)
                 if nextra > 0:
-                    # self._put_cell_row_widenings += 1
+                    self._put_cell_row_widenings += 1
                     trow.extend(self.bt * nextra)
                     if self.formatting_info:
                         self._cell_xf_indexes[rowx].extend(self.bf * nextra)
@@ -726,8 +914,8 @@ class Sheet(BaseObject):
                 nc = self.ncols
                 bt = self.bt
                 bf = self.bf
+                self._put_cell_rows_appended += nr - self.nrows
                 for _unused in xrange(self.nrows, nr):
-                    # self._put_cell_rows_appended += 1
                     scta(bt * nc)
                     scva([''] * nc)
                     if fmt_info:
@@ -751,731 +939,917 @@ class Sheet(BaseObject):
 
     def read(self, bk):
         global rc_stats
-        DEBUG = 0
-        blah = DEBUG or self.verbosity >= 2
-        blah_rows = DEBUG or self.verbosity >= 4
-        blah_formulas = 0 and blah
-        r1c1 = 0
         oldpos = bk._position
         bk._position = self._position
-        XL_SHRFMLA_ETC_ETC = (
-            XL_SHRFMLA, XL_ARRAY, XL_TABLEOP, XL_TABLEOP2,
-            XL_ARRAY2, XL_TABLEOP_B2,
-            )
         self_put_cell = self.put_cell
-        local_unpack = unpack
-        bk_get_record_parts = bk.get_record_parts
-        bv = self.biff_version
+        self_put_cell_run = self.put_cell_run
+        xf_type_map = self._xf_index_to_xl_type_map
+        unpack_number_from = _unpack_number_from
+        unpack_labelsst_from = _unpack_labelsst_from
+        unpack_cell_from = _unpack_cell_from
+        unpack_H_from = _unpack_H_from
         fmt_info = self.formatting_info
         do_sst_rich_text = fmt_info and bk._rich_text_runlist_map
-        rowinfo_sharing_dict = {}
-        txos = {}
+        # BIFF 4 and earlier keep formats etc. in the sheet
+        values_only = self.values_only and self.biff_version > 45
+        sst = bk._sharedstrings
+        # A LazySST's strings list holds None until a string is decoded
+        sst_strings = getattr(sst, 'strings', sst)
+        handlers = self.record_handlers()
+        # State shared between handlers; dropped again after the read.
+        self._rowinfo_sharing_dict = {}
+        self._txos = {}
+        self._saved_obj_id = None
+        # A row's LABELSST, NUMBER, RK and MULRK cells usually come one after
+        # another. Once put_cell has stored the first, the rest go straight
+        # into the row's lists while they fit (see cell_run_row). Any other
+        # record may grow, trim or replace the rows, so it ends the run.
+        run_rowx = -1
+        run_types = run_values = run_xfs = None
+        run_len = run_limit = 0
+        run_cells = 0
         eof_found = 0
-        while 1:
-            # if DEBUG: print "SHEET.READ: about to read from position %d" % bk._position
-            rc, data_len, data = bk_get_record_parts()
-            # if rc in rc_stats:
-            #     rc_stats[rc] += 1
-            # else:
-            #     rc_stats[rc] = 1
-            # if DEBUG: print "SHEET.READ: op 0x%04x, %d bytes %r" % (rc, data_len, data)
-            if rc == XL_NUMBER:
-                # [:14] in following stmt ignores extraneous rubbish at end of record.
-                # Sample file testEON-8.xls supplied by Jan Kraus.
-                rowx, colx, xf_index, d = local_unpack('<HHHd', data[:14])
-                # if xf_index == 0:
-                #     fprintf(self.logfile,
-                #         "NUMBER: r=%d c=%d xfx=%d %f\n", rowx, colx, xf_index, d)
-                self_put_cell(rowx, colx, None, d, xf_index)
-            elif rc == XL_LABELSST:
-                rowx, colx, xf_index, sstindex = local_unpack('<HHHi', data)
-                # print "LABELSST", rowx, colx, sstindex, bk._sharedstrings[sstindex]
-                self_put_cell(rowx, colx, XL_CELL_TEXT, bk._sharedstrings[sstindex], xf_index)
+        records_read_before = bk._records_read
+        for rc, buf, offset, data_len in bk.iter_records():
+            # if DEBUG: print "SHEET.READ: op 0x%04x, %d bytes at %d" % (rc, data_len, offset)
+            # The commonest records are unpacked in place; the others are
+            # looked up in record_handlers() and get a copy of their data.
+            if rc == XL_LABELSST:
+                rowx, colx, xf_index, sstindex = unpack_labelsst_from(buf, offset)
+                strg = sst_strings[sstindex]
+                if strg is None:
+                    strg = sst[sstindex]
                 if do_sst_rich_text:
                     runlist = bk._rich_text_runlist_map.get(sstindex)
                     if runlist:
                         self.rich_text_runlist_map[(rowx, colx)] = runlist
-            elif rc == XL_LABEL:
-                rowx, colx, xf_index = local_unpack('<HHH', data[0:6])
-                if bv < BIFF_FIRST_UNICODE:
-                    strg = unpack_string(data, 6, bk.encoding or bk.derive_encoding(), lenlen=2)
-                else:
-                    strg = unpack_unicode(data, 6, lenlen=2)
+                if rowx == run_rowx:
+                    if colx < run_len:
+                        run_types[colx] = XL_CELL_TEXT
+                        run_values[colx] = strg
+                        if fmt_info:
+                            run_xfs[colx] = xf_index
+                        run_cells += 1
+                        continue
+                    if colx == run_len < run_limit:
+                        run_types.append(XL_CELL_TEXT)
+                        run_values.append(strg)
+                        if fmt_info:
+                            run_xfs.append(xf_index)
+                        run_len += 1
+                        run_cells += 1
+                        continue
                 self_put_cell(rowx, colx, XL_CELL_TEXT, strg, xf_index)
-            elif rc == XL_RSTRING:
-                rowx, colx, xf_index = local_unpack('<HHH', data[0:6])
-                if bv < BIFF_FIRST_UNICODE:
-                    strg, pos = unpack_string_update_pos(data, 6, bk.encoding or bk.derive_encoding(), lenlen=2)
-                    nrt = BYTES_ORD(data[pos])
-                    pos += 1
-                    runlist = []
-                    for _unused in xrange(nrt):
-                        runlist.append(unpack('<BB', data[pos:pos+2]))
-                        pos += 2
-                    assert pos == len(data)
+                run_rowx = rowx
+                run_types, run_values, run_xfs, run_len, run_limit = self.cell_run_row(rowx)
+                continue
+            if rc == XL_RK or rc == XL_NUMBER:
+                if rc == XL_RK:
+                    rowx, colx, xf_index = unpack_cell_from(buf, offset)
+                    d = unpack_RK_from(buf, offset + 6)
                 else:
-                    strg, pos = unpack_unicode_update_pos(data, 6, lenlen=2)
-                    nrt = unpack('<H', data[pos:pos+2])[0]
-                    pos += 2
-                    runlist = []
-                    for _unused in xrange(nrt):
-                        runlist.append(unpack('<HH', data[pos:pos+4]))
-                        pos += 4
-                    assert pos == len(data)
-                self_put_cell(rowx, colx, XL_CELL_TEXT, strg, xf_index)
-                self.rich_text_runlist_map[(rowx, colx)] = runlist
-            elif rc == XL_RK:
-                rowx, colx, xf_index = local_unpack('<HHH', data[:6])
-                d = unpack_RK(data[6:10])
+                    # Any extraneous rubbish at end of record is ignored.
+                    # Sample file testEON-8.xls supplied by Jan Kraus.
+                    rowx, colx, xf_index, d = unpack_number_from(buf, offset)
+                if rowx == run_rowx:
+                    if colx < run_len:
+                        run_types[colx] = xf_type_map[xf_index]
+                        run_values[colx] = d
+                        if fmt_info:
+                            run_xfs[colx] = xf_index
+                        run_cells += 1
+                        continue
+                    if colx == run_len < run_limit:
+                        run_types.append(xf_type_map[xf_index])
+                        run_values.append(d)
+                        if fmt_info:
+                            run_xfs.append(xf_index)
+                        run_len += 1
+                        run_cells += 1
+                        continue
                 self_put_cell(rowx, colx, None, d, xf_index)
-            elif rc == XL_MULRK:
-                mulrk_row, mulrk_first = local_unpack('<HH', data[0:4])
-                mulrk_last, = local_unpack('<H', data[-2:])
-                pos = 4
-                for colx in xrange(mulrk_first, mulrk_last+1):
-                    xf_index, = local_unpack('<H', data[pos:pos+2])
-                    d = unpack_RK(data[pos+2:pos+6])
-                    pos += 6
-                    self_put_cell(mulrk_row, colx, None, d, xf_index)
-            elif rc == XL_ROW:
-                # Version 0.6.0a3: ROW records are just not worth using (for memory allocation).
-                # Version 0.6.1: now used for formatting info.
-                if not fmt_info: continue
-                rowx, bits1, bits2 = local_unpack('<H4xH4xi', data[0:16])
-                if not(0 <= rowx < self.utter_max_rows):
-                    print("*** NOTE: ROW record has row index %d; " \
-                        "should have 0 <= rowx < %d -- record ignored!" \
-                        % (rowx, self.utter_max_rows), file=self.logfile)
-                    continue
-                key = (bits1, bits2)
-                r = rowinfo_sharing_dict.get(key)
-                if r is None:
-                    rowinfo_sharing_dict[key] = r = Rowinfo()
-                    # Using upkbits() is far too slow on a file
-                    # with 30 sheets each with 10K rows :-(
-                    #    upkbits(r, bits1, (
-                    #        ( 0, 0x7FFF, 'height'),
-                    #        (15, 0x8000, 'has_default_height'),
-                    #        ))
-                    #    upkbits(r, bits2, (
-                    #        ( 0, 0x00000007, 'outline_level'),
-                    #        ( 4, 0x00000010, 'outline_group_starts_ends'),
-                    #        ( 5, 0x00000020, 'hidden'),
-                    #        ( 6, 0x00000040, 'height_mismatch'),
-                    #        ( 7, 0x00000080, 'has_default_xf_index'),
-                    #        (16, 0x0FFF0000, 'xf_index'),
-                    #        (28, 0x10000000, 'additional_space_above'),
-                    #        (29, 0x20000000, 'additional_space_below'),
-                    #        ))
-                    # So:
-                    r.height = bits1 & 0x7fff
-                    r.has_default_height = (bits1 >> 15) & 1
-                    r.outline_level = bits2 & 7
-                    r.outline_group_starts_ends = (bits2 >> 4) & 1
-                    r.hidden = (bits2 >> 5) & 1
-                    r.height_mismatch = (bits2 >> 6) & 1
-                    r.has_default_xf_index = (bits2 >> 7) & 1
-                    r.xf_index = (bits2 >> 16) & 0xfff
-                    r.additional_space_above = (bits2 >> 28) & 1
-                    r.additional_space_below = (bits2 >> 29) & 1
-                    if not r.has_default_xf_index:
-                        r.xf_index = -1
-                self.rowinfo_map[rowx] = r
-                if 0 and r.xf_index > -1:
-                    fprintf(self.logfile,
-                        "**ROW %d %d %d\n",
-                        self.number, rowx, r.xf_index)
-                if blah_rows:
-                    print('ROW', rowx, bits1, bits2, file=self.logfile)
-                    r.dump(self.logfile,
-                        header="--- sh #%d, rowx=%d ---" % (self.number, rowx))
-            elif rc in XL_FORMULA_OPCODES: # 06, 0206, 0406
-                # DEBUG = 1
-                # if DEBUG: print "FORMULA: rc: 0x%04x data: %r" % (rc, data)
-                if bv >= 50:
-                    rowx, colx, xf_index, result_str, flags = local_unpack('<HHH8sH', data[0:16])
-                    lenlen = 2
-                    tkarr_offset = 20
-                elif bv >= 30:
-                    rowx, colx, xf_index, result_str, flags = local_unpack('<HHH8sH', data[0:16])
-                    lenlen = 2
-                    tkarr_offset = 16
-                else: # BIFF2
-                    rowx, colx, cell_attr,  result_str, flags = local_unpack('<HH3s8sB', data[0:16])
-                    xf_index =  self.fixed_BIFF2_xfindex(cell_attr, rowx, colx)
-                    lenlen = 1
-                    tkarr_offset = 16
-                if blah_formulas: # testing formula dumper
-                    #### XXXX FIXME
-                    fprintf(self.logfile, "FORMULA: rowx=%d colx=%d\n", rowx, colx)
-                    fmlalen = local_unpack("<H", data[20:22])[0]
-                    decompile_formula(bk, data[22:], fmlalen, FMLA_TYPE_CELL,
-                        browx=rowx, bcolx=colx, blah=1, r1c1=r1c1)
-                if result_str[6:8] == b"\xFF\xFF":
-                    first_byte = BYTES_ORD(result_str[0])
-                    if first_byte == 0:
-                        # need to read next record (STRING)
-                        gotstring = 0
-                        # if flags & 8:
-                        if 1: # "flags & 8" applies only to SHRFMLA
-                            # actually there's an optional SHRFMLA or ARRAY etc record to skip over
-                            rc2, data2_len, data2 = bk.get_record_parts()
-                            if rc2 == XL_STRING or rc2 == XL_STRING_B2:
-                                gotstring = 1
-                            elif rc2 == XL_ARRAY:
-                                row1x, rownx, col1x, colnx, array_flags, tokslen = \
-                                    local_unpack("<HHBBBxxxxxH", data2[:14])
-                                if blah_formulas:
-                                    fprintf(self.logfile, "ARRAY: %d %d %d %d %d\n",
-                                        row1x, rownx, col1x, colnx, array_flags)
-                                    # dump_formula(bk, data2[14:], tokslen, bv, reldelta=0, blah=1)
-                            elif rc2 == XL_SHRFMLA:
-                                row1x, rownx, col1x, colnx, nfmlas, tokslen = \
-                                    local_unpack("<HHBBxBH", data2[:10])
-                                if blah_formulas:
-                                    fprintf(self.logfile, "SHRFMLA (sub): %d %d %d %d %d\n",
-                                        row1x, rownx, col1x, colnx, nfmlas)
-                                    decompile_formula(bk, data2[10:], tokslen, FMLA_TYPE_SHARED,
-                                        blah=1, browx=rowx, bcolx=colx, r1c1=r1c1)
-                            elif rc2 not in XL_SHRFMLA_ETC_ETC:
-                                raise XLRDError(
-                                    "Expected SHRFMLA, ARRAY, TABLEOP* or STRING record; found 0x%04x" % rc2)
-                            # if DEBUG: print "gotstring:", gotstring
-                        # now for the STRING record
-                        if not gotstring:
-                            rc2, _unused_len, data2 = bk.get_record_parts()
-                            if rc2 not in (XL_STRING, XL_STRING_B2):
-                                raise XLRDError("Expected STRING record; found 0x%04x" % rc2)
-                        # if DEBUG: print "STRING: data=%r BIFF=%d cp=%d" % (data2, self.biff_version, bk.encoding)
-                        strg = self.string_record_contents(data2)
-                        self.put_cell(rowx, colx, XL_CELL_TEXT, strg, xf_index)
-                        # if DEBUG: print "FORMULA strg %r" % strg
-                    elif first_byte == 1:
-                        # boolean formula result
-                        value = BYTES_ORD(result_str[2])
-                        self_put_cell(rowx, colx, XL_CELL_BOOLEAN, value, xf_index)
-                    elif first_byte == 2:
-                        # Error in cell
-                        value = BYTES_ORD(result_str[2])
-                        self_put_cell(rowx, colx, XL_CELL_ERROR, value, xf_index)
-                    elif first_byte == 3:
-                        # empty ... i.e. empty (zero-length) string, NOT an empty cell.
-                        self_put_cell(rowx, colx, XL_CELL_TEXT, "", xf_index)
+                run_rowx = rowx
+                run_types, run_values, run_xfs, run_len, run_limit = self.cell_run_row(rowx)
+                continue
+            if rc == XL_MULRK:
+                mulrk_row, mulrk_first, _unused = unpack_cell_from(buf, offset)
+                mulrk_last, = unpack_H_from(buf, offset + data_len - 2)
+                if mulrk_last >= mulrk_first:
+                    xf_indexes, values = unpack_MULRK_from(buf, offset + 4, mulrk_last - mulrk_first + 1)
+                    ctypes = [xf_type_map[xf_index] for xf_index in xf_indexes]
+                    if mulrk_row == run_rowx and mulrk_last < run_len:
+                        mulrk_end = mulrk_last + 1
+                        run_types[mulrk_first:mulrk_end] = array('B', ctypes)
+                        run_values[mulrk_first:mulrk_end] = values
+                        if fmt_info:
+                            run_xfs[mulrk_first:mulrk_end] = array('h', xf_indexes)
+                        run_cells += mulrk_end - mulrk_first
                     else:
-                        raise XLRDError("unexpected special case (0x%02x) in FORMULA" % first_byte)
-                else:
-                    # it is a number
-                    d = local_unpack('<d', result_str)[0]
-                    self_put_cell(rowx, colx, None, d, xf_index)
-            elif rc == XL_BOOLERR:
-                rowx, colx, xf_index, value, is_err = local_unpack('<HHHBB', data[:8])
-                # Note OOo Calc 2.0 writes 9-byte BOOLERR records.
-                # OOo docs say 8. Excel writes 8.
-                cellty = (XL_CELL_BOOLEAN, XL_CELL_ERROR)[is_err]
-                # if DEBUG: print "XL_BOOLERR", rowx, colx, xf_index, value, is_err
-                self_put_cell(rowx, colx, cellty, value, xf_index)
-            elif rc == XL_COLINFO:
-                if not fmt_info: continue
-                c = Colinfo()
-                first_colx, last_colx, c.width, c.xf_index, flags \
-                    = local_unpack("<HHHHH", data[:10])
-                #### Colinfo.width is denominated in 256ths of a character,
-                #### *not* in characters.
-                if not(0 <= first_colx <= last_colx <= 256):
-                    # Note: 256 instead of 255 is a common mistake.
-                    # We silently ignore the non-existing 257th column in that case.
-                    print("*** NOTE: COLINFO record has first col index %d, last %d; " \
-                        "should have 0 <= first <= last <= 255 -- record ignored!" \
-                        % (first_colx, last_colx), file=self.logfile)
-                    del c
-                    continue
-                upkbits(c, flags, (
-                    ( 0, 0x0001, 'hidden'),
-                    ( 1, 0x0002, 'bit1_flag'),
-                    # *ALL* colinfos created by Excel in "default" cases are 0x0002!!
-                    # Maybe it's "locked" by analogy with XFProtection data.
-                    ( 8, 0x0700, 'outline_level'),
-                    (12, 0x1000, 'collapsed'),
-                    ))
-                for colx in xrange(first_colx, last_colx+1):
-                    if colx > 255: break # Excel does 0 to 256 inclusive
-                    self.colinfo_map[colx] = c
-                    if 0:
-                        fprintf(self.logfile,
-                            "**COL %d %d %d\n",
-                            self.number, colx, c.xf_index)
-                if blah:
-                    fprintf(
-                        self.logfile,
-                        "COLINFO sheet #%d cols %d-%d: wid=%d xf_index=%d flags=0x%04x\n",
-                        self.number, first_colx, last_colx, c.width, c.xf_index, flags,
-                        )
-                    c.dump(self.logfile, header='===')
-            elif rc == XL_DEFCOLWIDTH:
-                self.defcolwidth, = local_unpack("<H", data[:2])
-                if 0: print('DEFCOLWIDTH', self.defcolwidth, file=self.logfile)
-            elif rc == XL_STANDARDWIDTH:
-                if data_len != 2:
-                    print('*** ERROR *** STANDARDWIDTH', data_len, repr(data), file=self.logfile)
-                self.standardwidth, = local_unpack("<H", data[:2])
-                if 0: print('STANDARDWIDTH', self.standardwidth, file=self.logfile)
-            elif rc == XL_GCW:
-                if not fmt_info: continue # useless w/o COLINFO
-                assert data_len == 34
-                assert data[0:2] == b"\x20\x00"
-                iguff = unpack("<8i", data[2:34])
-                gcw = []
-                for bits in iguff:
-                    for j in xrange(32):
-                        gcw.append(bits & 1)
-                        bits >>= 1
-                self.gcw = tuple(gcw)
-                if 0:
-                    showgcw = "".join(map(lambda x: "F "[x], gcw)).rstrip().replace(' ', '.')
-                    print("GCW:", showgcw, file=self.logfile)
-            elif rc == XL_BLANK:
-                if not fmt_info: continue
-                rowx, colx, xf_index = local_unpack('<HHH', data[:6])
-                # if 0: print >> self.logfile, "BLANK", rowx, colx, xf_index
-                self_put_cell(rowx, colx, XL_CELL_BLANK, '', xf_index)
-            elif rc == XL_MULBLANK: # 00BE
-                if not fmt_info: continue
-                nitems = data_len >> 1
-                result = local_unpack("<%dH" % nitems, data)
-                rowx, mul_first = result[:2]
-                mul_last = result[-1]
-                # print >> self.logfile, "MULBLANK", rowx, mul_first, mul_last, data_len, nitems, mul_last + 4 - mul_first
-                assert nitems == mul_last + 4 - mul_first
-                pos = 2
-                for colx in xrange(mul_first, mul_last + 1):
-                    self_put_cell(rowx, colx, XL_CELL_BLANK, '', result[pos])
-                    pos += 1
-            elif rc == XL_DIMENSION or rc == XL_DIMENSION2:
-                if data_len == 0:
-                    # Four zero bytes after some other record. See github issue 64.
-                    continue
-                # if data_len == 10:
-                # Was crashing on BIFF 4.0 file w/o the two trailing unused bytes.
-                # Reported by Ralph Heimburger.
-                if bv < 80:
-                    dim_tuple = local_unpack('<HxxH', data[2:8])
-                else:
-                    dim_tuple = local_unpack('<ixxH', data[4:12])
-                self.nrows, self.ncols = 0, 0
-                self._dimnrows, self._dimncols = dim_tuple
-                if bv in (21, 30, 40) and self.book.xf_list and not self.book._xf_epilogue_done:
-                    self.book.xf_epilogue()
-                if blah:
-                    fprintf(self.logfile,
-                        "sheet %d(%r) DIMENSIONS: ncols=%d nrows=%d\n",
-                        self.number, self.name, self._dimncols, self._dimnrows
-                        )
-            elif rc == XL_HLINK:
-                self.handle_hlink(data)
-            elif rc == XL_QUICKTIP:
-                self.handle_quicktip(data)
+                        self_put_cell_run(mulrk_row, mulrk_first, ctypes, values, xf_indexes)
+                        run_rowx = mulrk_row
+                        run_types, run_values, run_xfs, run_len, run_limit = self.cell_run_row(mulrk_row)
+                continue
+            run_rowx = -1
+            if rc == XL_BLANK:
+                if fmt_info:
+                    rowx, colx, xf_index = unpack_cell_from(buf, offset)
+                    self_put_cell(rowx, colx, XL_CELL_BLANK, '', xf_index)
+                continue
+            if rc == XL_MULBLANK:
+                if fmt_info:
+                    mul_row, mul_first, _unused = unpack_cell_from(buf, offset)
+                    nitems = data_len >> 1
+                    mul_last, = unpack_H_from(buf, offset + 2 * nitems - 2)
+                    assert nitems == mul_last + 4 - mul_first
+                    ncells = nitems - 3
+                    xf_indexes = unpack_from('<%dH' % ncells, buf, offset + 4)
+                    self_put_cell_run(mul_row, mul_first, [XL_CELL_BLANK] * ncells, [''] * ncells, xf_indexes)
+                continue
+            handler = handlers.get(rc)
+            if handler is not None:
+                handler(buf[offset:offset+data_len])
             elif rc == XL_EOF:
-                DEBUG = 0
-                if DEBUG: print("SHEET.READ: EOF", file=self.logfile)
                 eof_found = 1
                 break
-            elif rc == XL_OBJ:
-                # handle SHEET-level objects; note there's a separate Book.handle_obj
-                saved_obj = self.handle_obj(data)
-                if saved_obj: saved_obj_id = saved_obj.id
-                else: saved_obj_id = None
-            elif rc == XL_MSO_DRAWING:
-                self.handle_msodrawingetc(rc, data_len, data)
-            elif rc == XL_TXO:
-                txo = self.handle_txo(data)
-                if txo and saved_obj_id:
-                    txos[saved_obj_id] = txo
-                    saved_obj_id = None
-            elif rc == XL_NOTE:
-                self.handle_note(data, txos)
-            elif rc == XL_FEAT11:
-                self.handle_feat11(data)
-            elif rc in bofcodes: ##### EMBEDDED BOF #####
-                version, boftype = local_unpack('<HH', data[0:4])
-                if boftype != 0x20: # embedded chart
-                    print("*** Unexpected embedded BOF (0x%04x) at offset %d: version=0x%04x type=0x%04x" \
-                        % (rc, bk._position - data_len - 4, version, boftype), file=self.logfile)
-                while 1:
-                    code, data_len, data = bk.get_record_parts()
-                    if code == XL_EOF:
-                        break
-                if DEBUG: print("---> found EOF", file=self.logfile)
-            elif rc == XL_COUNTRY:
-                bk.handle_country(data)
-            elif rc == XL_LABELRANGES:
-                pos = 0
-                pos = unpack_cell_range_address_list_update_pos(
-                        self.row_label_ranges, data, pos, bv, addr_size=8,
-                        )
-                pos = unpack_cell_range_address_list_update_pos(
-                        self.col_label_ranges, data, pos, bv, addr_size=8,
-                        )
-                assert pos == data_len
-            elif rc == XL_ARRAY:
-                row1x, rownx, col1x, colnx, array_flags, tokslen = \
-                    local_unpack("<HHBBBxxxxxH", data[:14])
-                if blah_formulas:
-                    print("ARRAY:", row1x, rownx, col1x, colnx, array_flags, file=self.logfile)
-                    # dump_formula(bk, data[14:], tokslen, bv, reldelta=0, blah=1)
-            elif rc == XL_SHRFMLA:
-                row1x, rownx, col1x, colnx, nfmlas, tokslen = \
-                    local_unpack("<HHBBxBH", data[:10])
-                if blah_formulas:
-                    print("SHRFMLA (main):", row1x, rownx, col1x, colnx, nfmlas, file=self.logfile)
-                    decompile_formula(bk, data[10:], tokslen, FMLA_TYPE_SHARED,
-                        blah=1, browx=rowx, bcolx=colx, r1c1=r1c1)
-            elif rc == XL_CONDFMT:
-                if not fmt_info: continue
-                assert bv >= 80
-                num_CFs, needs_recalc, browx1, browx2, bcolx1, bcolx2 = \
-                    unpack("<6H", data[0:12])
-                if self.verbosity >= 1:
-                    fprintf(self.logfile,
-                        "\n*** WARNING: Ignoring CONDFMT (conditional formatting) record\n" \
-                        "*** in Sheet %d (%r).\n" \
-                        "*** %d CF record(s); needs_recalc_or_redraw = %d\n" \
-                        "*** Bounding box is %s\n",
-                        self.number, self.name, num_CFs, needs_recalc,
-                        rangename2d(browx1, browx2+1, bcolx1, bcolx2+1),
-                        )
-                olist = [] # updated by the function
-                pos = unpack_cell_range_address_list_update_pos(
-                    olist, data, 12, bv, addr_size=8)
-                # print >> self.logfile, repr(result), len(result)
-                if self.verbosity >= 1:
-                    fprintf(self.logfile,
-                        "*** %d individual range(s):\n" \
-                        "*** %s\n",
-                        len(olist),
-                        ", ".join([rangename2d(*coords) for coords in olist]),
-                        )
-            elif rc == XL_CF:
-                if not fmt_info: continue
-                cf_type, cmp_op, sz1, sz2, flags = unpack("<BBHHi", data[0:10])
-                font_block = (flags >> 26) & 1
-                bord_block = (flags >> 28) & 1
-                patt_block = (flags >> 29) & 1
-                if self.verbosity >= 1:
-                    fprintf(self.logfile,
-                        "\n*** WARNING: Ignoring CF (conditional formatting) sub-record.\n" \
-                        "*** cf_type=%d, cmp_op=%d, sz1=%d, sz2=%d, flags=0x%08x\n" \
-                        "*** optional data blocks: font=%d, border=%d, pattern=%d\n",
-                        cf_type, cmp_op, sz1, sz2, flags,
-                        font_block, bord_block, patt_block,
-                        )
-                # hex_char_dump(data, 0, data_len, fout=self.logfile)
-                pos = 12
-                if font_block:
-                    (font_height, font_options, weight, escapement, underline,
-                    font_colour_index, two_bits, font_esc, font_underl) = \
-                    unpack("<64x i i H H B 3x i 4x i i i 18x", data[pos:pos+118])
-                    font_style = (two_bits > 1) & 1
-                    posture = (font_options > 1) & 1
-                    font_canc = (two_bits > 7) & 1
-                    cancellation = (font_options > 7) & 1
-                    if self.verbosity >= 1:
-                        fprintf(self.logfile,
-                            "*** Font info: height=%d, weight=%d, escapement=%d,\n" \
-                            "*** underline=%d, colour_index=%d, esc=%d, underl=%d,\n" \
-                            "*** style=%d, posture=%d, canc=%d, cancellation=%d\n",
-                            font_height, weight, escapement, underline,
-                            font_colour_index, font_esc, font_underl,
-                            font_style, posture, font_canc, cancellation,
-                            )
-                    pos += 118
-                if bord_block:
-                    pos += 8
-                if patt_block:
-                    pos += 4
-                fmla1 = data[pos:pos+sz1]
-                pos += sz1
-                if blah and sz1:
-                    fprintf(self.logfile,
-                        "*** formula 1:\n",
-                        )
-                    dump_formula(bk, fmla1, sz1, bv, reldelta=0, blah=1)
-                fmla2 = data[pos:pos+sz2]
-                pos += sz2
-                assert pos == data_len
-                if blah and sz2:
-                    fprintf(self.logfile,
-                        "*** formula 2:\n",
-                        )
-                    dump_formula(bk, fmla2, sz2, bv, reldelta=0, blah=1)
-            elif rc == XL_DEFAULTROWHEIGHT:
-                if data_len == 4:
-                    bits, self.default_row_height = unpack("<HH", data[:4])
-                elif data_len == 2:
-                    self.default_row_height, = unpack("<H", data)
-                    bits = 0
-                    fprintf(self.logfile,
-                        "*** WARNING: DEFAULTROWHEIGHT record len is 2, " \
-                        "should be 4; assuming BIFF2 format\n")
-                else:
-                    bits = 0
-                    fprintf(self.logfile,
-                        "*** WARNING: DEFAULTROWHEIGHT record len is %d, " \
-                        "should be 4; ignoring this record\n",
-                        data_len)
-                self.default_row_height_mismatch = bits & 1
-                self.default_row_hidden = (bits >> 1) & 1
-                self.default_additional_space_above = (bits >> 2) & 1
-                self.default_additional_space_below = (bits >> 3) & 1
-            elif rc == XL_MERGEDCELLS:
-                if not fmt_info: continue
-                pos = unpack_cell_range_address_list_update_pos(
-                    self.merged_cells, data, 0, bv, addr_size=8)
-                if blah:
-                    fprintf(self.logfile,
-                        "MERGEDCELLS: %d ranges\n", (pos - 2) // 8)
-                assert pos == data_len, \
-                    "MERGEDCELLS: pos=%d data_len=%d" % (pos, data_len)
-            elif rc == XL_WINDOW2:
-                if bv >= 80 and data_len >= 14:
-                    (options,
-                    self.first_visible_rowx, self.first_visible_colx,
-                    self.gridline_colour_index,
-                    self.cached_page_break_preview_mag_factor,
-                    self.cached_normal_view_mag_factor
-                    ) = unpack("<HHHHxxHH", data[:14])
-                else:
-                    assert bv >= 30 # BIFF3-7
-                    (options,
-                    self.first_visible_rowx, self.first_visible_colx,
-                    ) = unpack("<HHH", data[:6])
-                    self.gridline_colour_rgb = unpack("<BBB", data[6:9])
-                    self.gridline_colour_index = nearest_colour_index(
-                        self.book.colour_map, self.gridline_colour_rgb, debug=0)
-                    self.cached_page_break_preview_mag_factor = 0 # default (60%)
-                    self.cached_normal_view_mag_factor = 0 # default (100%)
-                # options -- Bit, Mask, Contents:
-                # 0 0001H 0 = Show formula results 1 = Show formulas
-                # 1 0002H 0 = Do not show grid lines 1 = Show grid lines
-                # 2 0004H 0 = Do not show sheet headers 1 = Show sheet headers
-                # 3 0008H 0 = Panes are not frozen 1 = Panes are frozen (freeze)
-                # 4 0010H 0 = Show zero values as empty cells 1 = Show zero values
-                # 5 0020H 0 = Manual grid line colour 1 = Automatic grid line colour
-                # 6 0040H 0 = Columns from left to right 1 = Columns from right to left
-                # 7 0080H 0 = Do not show outline symbols 1 = Show outline symbols
-                # 8 0100H 0 = Keep splits if pane freeze is removed 1 = Remove splits if pane freeze is removed
-                # 9 0200H 0 = Sheet not selected 1 = Sheet selected (BIFF5-BIFF8)
-                # 10 0400H 0 = Sheet not visible 1 = Sheet visible (BIFF5-BIFF8)
-                # 11 0800H 0 = Show in normal view 1 = Show in page break preview (BIFF8)
-                # The freeze flag specifies, if a following PANE record (6.71) describes unfrozen or frozen panes.
-                for attr, _unused_defval in _WINDOW2_options:
-                    setattr(self, attr, options & 1)
-                    options >>= 1
-            elif rc == XL_SCL:
-                num, den = unpack("<HH", data)
-                result = 0
-                if den:
-                    result = (num * 100) // den
-                if not(10 <= result <= 400):
-                    if DEBUG or self.verbosity >= 0:
-                        print((
-                            "WARNING *** SCL rcd sheet %d: should have 0.1 <= num/den <= 4; got %d/%d"
-                            % (self.number, num, den)
-                            ), file=self.logfile)
-                    result = 100
-                self.scl_mag_factor = result
-            elif rc == XL_PANE:
-                (
-                self.vert_split_pos,
-                self.horz_split_pos,
-                self.horz_split_first_visible,
-                self.vert_split_first_visible,
-                self.split_active_pane,
-                ) = unpack("<HHHHB", data[:9])
-                self.has_pane_record = 1
-            elif rc == XL_HORIZONTALPAGEBREAKS:
-                if not fmt_info: continue
-                num_breaks, = local_unpack("<H", data[:2])
-                assert num_breaks * (2 + 4 * (bv >= 80)) + 2 == data_len
-                pos = 2
-                if bv < 80:
-                    while pos < data_len:
-                        self.horizontal_page_breaks.append((local_unpack("<H", data[pos:pos+2])[0], 0, 255))
-                        pos += 2
-                else:
-                    while pos < data_len:
-                        self.horizontal_page_breaks.append(local_unpack("<HHH", data[pos:pos+6]))
-                        pos += 6
-            elif rc == XL_VERTICALPAGEBREAKS:
-                if not fmt_info: continue
-                num_breaks, = local_unpack("<H", data[:2])
-                assert num_breaks * (2 + 4 * (bv >= 80)) + 2 == data_len
-                pos = 2
-                if bv < 80:
-                    while pos < data_len:
-                        self.vertical_page_breaks.append((local_unpack("<H", data[pos:pos+2])[0], 0, 65535))
-                        pos += 2
-                else:
-                    while pos < data_len:
-                        self.vertical_page_breaks.append(local_unpack("<HHH", data[pos:pos+6]))
-                        pos += 6
-            #### all of the following are for BIFF <= 4W
-            elif bv <= 45:
-                if rc == XL_FORMAT or rc == XL_FORMAT2:
-                    bk.handle_format(data, rc)
-                elif rc == XL_FONT or rc == XL_FONT_B3B4:
-                    bk.handle_font(data)
-                elif rc == XL_STYLE:
-                    if not self.book._xf_epilogue_done:
-                        self.book.xf_epilogue()
-                    bk.handle_style(data)
-                elif rc == XL_PALETTE:
-                    bk.handle_palette(data)
-                elif rc == XL_BUILTINFMTCOUNT:
-                    bk.handle_builtinfmtcount(data)
-                elif rc == XL_XF4 or rc == XL_XF3 or rc == XL_XF2: #### N.B. not XL_XF
-                    bk.handle_xf(data)
-                elif rc == XL_DATEMODE:
-                    bk.handle_datemode(data)
-                elif rc == XL_CODEPAGE:
-                    bk.handle_codepage(data)
-                elif rc == XL_FILEPASS:
-                    bk.handle_filepass(data)
-                elif rc == XL_WRITEACCESS:
-                    bk.handle_writeaccess(data)
-                elif rc == XL_IXFE:
-                    self._ixfe = local_unpack('<H', data)[0]
-                elif rc == XL_NUMBER_B2:
-                    rowx, colx, cell_attr, d = local_unpack('<HH3sd', data)
-                    self_put_cell(rowx, colx, None, d, self.fixed_BIFF2_xfindex(cell_attr, rowx, colx))
-                elif rc == XL_INTEGER:
-                    rowx, colx, cell_attr, d = local_unpack('<HH3sH', data)
-                    self_put_cell(rowx, colx, None, float(d), self.fixed_BIFF2_xfindex(cell_attr, rowx, colx))
-                elif rc == XL_LABEL_B2:
-                    rowx, colx, cell_attr = local_unpack('<HH3s', data[0:7])
-                    strg = unpack_string(data, 7, bk.encoding or bk.derive_encoding(), lenlen=1)
-                    self_put_cell(rowx, colx, XL_CELL_TEXT, strg, self.fixed_BIFF2_xfindex(cell_attr, rowx, colx))
-                elif rc == XL_BOOLERR_B2:
-                    rowx, colx, cell_attr, value, is_err = local_unpack('<HH3sBB', data)
-                    cellty = (XL_CELL_BOOLEAN, XL_CELL_ERROR)[is_err]
-                    # if DEBUG: print "XL_BOOLERR_B2", rowx, colx, cell_attr, value, is_err
-                    self_put_cell(rowx, colx, cellty, value, self.fixed_BIFF2_xfindex(cell_attr, rowx, colx))
-                elif rc == XL_BLANK_B2:
-                    if not fmt_info: continue
-                    rowx, colx, cell_attr = local_unpack('<HH3s', data[:7])
-                    self_put_cell(rowx, colx, XL_CELL_BLANK, '', self.fixed_BIFF2_xfindex(cell_attr, rowx, colx))
-                elif rc == XL_EFONT:
-                    bk.handle_efont(data)
-                elif rc == XL_ROW_B2:
-                    if not fmt_info: continue
-                    rowx, bits1, bits2 = local_unpack('<H4xH2xB', data[0:11])
-                    if not(0 <= rowx < self.utter_max_rows):
-                        print("*** NOTE: ROW_B2 record has row index %d; " \
-                            "should have 0 <= rowx < %d -- record ignored!" \
-                            % (rowx, self.utter_max_rows), file=self.logfile)
-                        continue
-                    if not (bits2 & 1):  # has_default_xf_index is false
-                        xf_index = -1
-                    elif data_len == 18:
-                        # Seems the XF index in the cell_attr is dodgy
-                         xfx = local_unpack('<H', data[16:18])[0]
-                         xf_index = self.fixed_BIFF2_xfindex(cell_attr=None, rowx=rowx, colx=-1, true_xfx=xfx)
-                    else:
-                        cell_attr = data[13:16]
-                        xf_index = self.fixed_BIFF2_xfindex(cell_attr, rowx, colx=-1)
-                    key = (bits1, bits2, xf_index)
-                    r = rowinfo_sharing_dict.get(key)
-                    if r is None:
-                        rowinfo_sharing_dict[key] = r = Rowinfo()
-                        r.height = bits1 & 0x7fff
-                        r.has_default_height = (bits1 >> 15) & 1
-                        r.has_default_xf_index = bits2 & 1
-                        r.xf_index = xf_index
-                        # r.outline_level = 0             # set in __init__
-                        # r.outline_group_starts_ends = 0 # set in __init__
-                        # r.hidden = 0                    # set in __init__
-                        # r.height_mismatch = 0           # set in __init__
-                        # r.additional_space_above = 0    # set in __init__
-                        # r.additional_space_below = 0    # set in __init__
-                    self.rowinfo_map[rowx] = r
-                    if 0 and r.xf_index > -1:
-                        fprintf(self.logfile,
-                            "**ROW %d %d %d\n",
-                            self.number, rowx, r.xf_index)
-                    if blah_rows:
-                        print('ROW_B2', rowx, bits1, has_defaults, file=self.logfile)
-                        r.dump(self.logfile,
-                            header="--- sh #%d, rowx=%d ---" % (self.number, rowx))
-                elif rc == XL_COLWIDTH: # BIFF2 only
-                    if not fmt_info: continue
-                    first_colx, last_colx, width\
-                        = local_unpack("<BBH", data[:4])
-                    if not(first_colx <= last_colx):
-                        print("*** NOTE: COLWIDTH record has first col index %d, last %d; " \
-                            "should have first <= last -- record ignored!" \
-                            % (first_colx, last_colx), file=self.logfile)
-                        continue
-                    for colx in xrange(first_colx, last_colx+1):
-                        if colx in self.colinfo_map:
-                            c = self.colinfo_map[colx]
-                        else:
-                            c = Colinfo()
-                            self.colinfo_map[colx] = c
-                        c.width = width
-                    if blah:
-                        fprintf(
-                            self.logfile,
-                            "COLWIDTH sheet #%d cols %d-%d: wid=%d\n",
-                            self.number, first_colx, last_colx, width
-                            )
-                elif rc == XL_COLUMNDEFAULT: # BIFF2 only
-                    if not fmt_info: continue
-                    first_colx, last_colx = local_unpack("<HH", data[:4])
-                    #### Warning OOo docs wrong; first_colx <= colx < last_colx
-                    if blah:
-                        fprintf(
-                            self.logfile,
-                            "COLUMNDEFAULT sheet #%d cols in range(%d, %d)\n",
-                            self.number, first_colx, last_colx
-                            )
-                    if not(0 <= first_colx < last_colx <= 256):
-                        print("*** NOTE: COLUMNDEFAULT record has first col index %d, last %d; " \
-                            "should have 0 <= first < last <= 256" \
-                            % (first_colx, last_colx), file=self.logfile)
-                        last_colx = min(last_colx, 256)
-                    for colx in xrange(first_colx, last_colx):
-                        offset = 4 + 3 * (colx - first_colx)
-                        cell_attr = data[offset:offset+3]
-                        xf_index = self.fixed_BIFF2_xfindex(cell_attr, rowx=-1, colx=colx)
-                        if colx in self.colinfo_map:
-                            c = self.colinfo_map[colx]
-                        else:
-                            c = Colinfo()
-                            self.colinfo_map[colx] = c
-                        c.xf_index = xf_index
-                elif rc == XL_WINDOW2_B2: # BIFF 2 only
-                    attr_names = ("show_formulas", "show_grid_lines", "show_sheet_headers",
-                        "panes_are_frozen", "show_zero_values")
-                    for attr, char in zip(attr_names, data[0:5]):
-                        setattr(self, attr, int(char != b'\0'))
-                    (self.first_visible_rowx, self.first_visible_colx,
-                    self.automatic_grid_line_colour,
-                    ) = unpack("<HHB", data[5:10])
-                    self.gridline_colour_rgb = unpack("<BBB", data[10:13])
-                    self.gridline_colour_index = nearest_colour_index(
-                        self.book.colour_map, self.gridline_colour_rgb, debug=0)
-                    self.cached_page_break_preview_mag_factor = 0 # default (60%)
-                    self.cached_normal_view_mag_factor = 0 # default (100%)
-            else:
-                # if DEBUG: print "SHEET.READ: Unhandled record type %02x %d bytes %r" % (rc, data_len, data)
-                pass
+        del self._rowinfo_sharing_dict, self._txos, self._saved_obj_id
+        self._put_cell_cells += run_cells
         if not eof_found:
             raise XLRDError("Sheet %d (%r) missing EOF record" \
                 % (self.number, self.name))
+        self._records_read = bk._records_read - records_read_before
         self.tidy_dimensions()
-        self.update_cooked_mag_factors()
+        if not values_only:
+            # WINDOW2 and SCL were skipped otherwise
+            self.update_cooked_mag_factors()
         bk._position = oldpos
         return 1
     
+    ##
+    # Map from record code to the method that handles the record's data,
+    # for the records that read() does not unpack in place.
+    # Records that are only useful with formatting_info are left out
+    # without it, and with values_only only VALUES_ONLY_RECORDS are kept.
+    def record_handlers(self):
+        bk = self.book
+        bv = self.biff_version
+        handlers = {}
+        if bv <= 45:
+            # BIFF 4 and earlier keep formats etc. in the sheet
+            handlers.update({
+                XL_FORMAT: bk.handle_format,
+                XL_FORMAT2: self.handle_format2,
+                XL_FONT: bk.handle_font,
+                XL_FONT_B3B4: bk.handle_font,
+                XL_STYLE: self.handle_style,
+                XL_PALETTE: bk.handle_palette,
+                XL_BUILTINFMTCOUNT: bk.handle_builtinfmtcount,
+                XL_XF4: bk.handle_xf, #### N.B. not XL_XF
+                XL_XF3: bk.handle_xf,
+                XL_XF2: bk.handle_xf,
+                XL_DATEMODE: bk.handle_datemode,
+                XL_CODEPAGE: bk.handle_codepage,
+                XL_FILEPASS: bk.handle_filepass,
+                XL_WRITEACCESS: bk.handle_writeaccess,
+                XL_EFONT: bk.handle_efont,
+                XL_IXFE: self.handle_ixfe,
+                XL_NUMBER_B2: self.handle_number_b2,
+                XL_INTEGER: self.handle_integer,
+                XL_LABEL_B2: self.handle_label_b2,
+                XL_BOOLERR_B2: self.handle_boolerr_b2,
+                XL_WINDOW2_B2: self.handle_window2_b2, # BIFF 2 only
+                })
+            if self.formatting_info:
+                handlers.update({
+                    XL_BLANK_B2: self.handle_blank_b2,
+                    XL_ROW_B2: self.handle_row_b2,
+                    XL_COLWIDTH: self.handle_colwidth, # BIFF2 only
+                    XL_COLUMNDEFAULT: self.handle_columndefault, # BIFF2 only
+                    })
+        handlers.update({
+            XL_LABEL: self.handle_label,
+            XL_RSTRING: self.handle_rstring,
+            XL_BOOLERR: self.handle_boolerr,
+            XL_DEFCOLWIDTH: self.handle_defcolwidth,
+            XL_STANDARDWIDTH: self.handle_standardwidth,
+            XL_DIMENSION: self.handle_dimension,
+            XL_DIMENSION2: self.handle_dimension,
+            XL_HLINK: self.handle_hlink,
+            XL_QUICKTIP: self.handle_quicktip,
+            XL_OBJ: self.handle_obj_record,
+            XL_MSO_DRAWING: self.handle_msodrawing,
+            XL_TXO: self.handle_txo_record,
+            XL_NOTE: self.handle_note_record,
+            XL_FEAT11: self.handle_feat11,
+            XL_COUNTRY: bk.handle_country,
+            XL_LABELRANGES: self.handle_labelranges,
+            XL_ARRAY: self.handle_array,
+            XL_SHRFMLA: self.handle_shrfmla,
+            XL_DEFAULTROWHEIGHT: self.handle_defaultrowheight,
+            XL_WINDOW2: self.handle_window2,
+            XL_SCL: self.handle_scl,
+            XL_PANE: self.handle_pane,
+            })
+        for rc in XL_FORMULA_OPCODES:
+            handlers[rc] = self.handle_formula
+        for rc in bofcodes:
+            handlers[rc] = self.handle_embedded_bof
+        if self.formatting_info:
+            handlers.update({
+                XL_ROW: self.handle_row,
+                XL_COLINFO: self.handle_colinfo,
+                XL_GCW: self.handle_gcw, # useless w/o COLINFO
+                XL_CONDFMT: self.handle_condfmt,
+                XL_CF: self.handle_cf,
+                XL_MERGEDCELLS: self.handle_mergedcells,
+                XL_HORIZONTALPAGEBREAKS: self.handle_horizontalpagebreaks,
+                XL_VERTICALPAGEBREAKS: self.handle_verticalpagebreaks,
+                })
+        if self.values_only and bv > 45:
+            handlers = dict(
+                (rc, handler) for rc, handler in handlers.items()
+                if rc in VALUES_ONLY_RECORDS)
+        return handlers
+
+    def handle_obj_record(self, data):
+        # handle SHEET-level objects; note there's a separate Book.handle_obj
+        saved_obj = self.handle_obj(data)
+        if saved_obj: self._saved_obj_id = saved_obj.id
+        else: self._saved_obj_id = None
+
+    def handle_msodrawing(self, data):
+        self.handle_msodrawingetc(XL_MSO_DRAWING, len(data), data)
+
+    def handle_txo_record(self, data):
+        txo = self.handle_txo(data)
+        if txo and self._saved_obj_id:
+            self._txos[self._saved_obj_id] = txo
+            self._saved_obj_id = None
+
+    def handle_note_record(self, data):
+        self.handle_note(data, self._txos)
+
+    def handle_format2(self, data):
+        self.book.handle_format(data, XL_FORMAT2)
+
+    def handle_label(self, data):
+        bk = self.book
+        bv = self.biff_version
+        rowx, colx, xf_index = unpack('<HHH', data[0:6])
+        if bv < BIFF_FIRST_UNICODE:
+            strg = unpack_string(data, 6, bk.encoding or bk.derive_encoding(), lenlen=2)
+        else:
+            strg = unpack_unicode(data, 6, lenlen=2)
+        self.put_cell(rowx, colx, XL_CELL_TEXT, strg, xf_index)
+
+    def handle_rstring(self, data):
+        bk = self.book
+        bv = self.biff_version
+        rowx, colx, xf_index = unpack('<HHH', data[0:6])
+        if bv < BIFF_FIRST_UNICODE:
+            strg, pos = unpack_string_update_pos(data, 6, bk.encoding or bk.derive_encoding(), lenlen=2)
+            nrt = BYTES_ORD(data[pos])
+            pos += 1
+            runlist = []
+            for _unused in xrange(nrt):
+                runlist.append(unpack('<BB', data[pos:pos+2]))
+                pos += 2
+            assert pos == len(data)
+        else:
+            strg, pos = unpack_unicode_update_pos(data, 6, lenlen=2)
+            nrt = unpack('<H', data[pos:pos+2])[0]
+            pos += 2
+            runlist = []
+            for _unused in xrange(nrt):
+                runlist.append(unpack('<HH', data[pos:pos+4]))
+                pos += 4
+            assert pos == len(data)
+        self.put_cell(rowx, colx, XL_CELL_TEXT, strg, xf_index)
+        self.rich_text_runlist_map[(rowx, colx)] = runlist
+
+    def handle_row(self, data):
+        # Version 0.6.0a3: ROW records are just not worth using (for memory allocation).
+        # Version 0.6.1: now used for formatting info.
+        rowx, bits1, bits2 = unpack('<H4xH4xi', data[0:16])
+        if not(0 <= rowx < self.utter_max_rows):
+            print("*** NOTE: ROW record has row index %d; " \
+                "should have 0 <= rowx < %d -- record ignored!" \
+                % (rowx, self.utter_max_rows), file=self.logfile)
+            return
+        key = (bits1, bits2)
+        rowinfo_sharing_dict = self._rowinfo_sharing_dict
+        r = rowinfo_sharing_dict.get(key)
+        if r is None:
+            rowinfo_sharing_dict[key] = r = Rowinfo()
+            # Using upkbits() is far too slow on a file
+            # with 30 sheets each with 10K rows :-(
+            #    upkbits(r, bits1, (
+            #        ( 0, 0x7FFF, 'height'),
+            #        (15, 0x8000, 'has_default_height'),
+            #        ))
+            #    upkbits(r, bits2, (
+            #        ( 0, 0x00000007, 'outline_level'),
+            #        ( 4, 0x00000010, 'outline_group_starts_ends'),
+            #        ( 5, 0x00000020, 'hidden'),
+            #        ( 6, 0x00000040, 'height_mismatch'),
+            #        ( 7, 0x00000080, 'has_default_xf_index'),
+            #        (16, 0x0FFF0000, 'xf_index'),
+            #        (28, 0x10000000, 'additional_space_above'),
+            #        (29, 0x20000000, 'additional_space_below'),
+            #        ))
+            # So:
+            r.height = bits1 & 0x7fff
+            r.has_default_height = (bits1 >> 15) & 1
+            r.outline_level = bits2 & 7
+            r.outline_group_starts_ends = (bits2 >> 4) & 1
+            r.hidden = (bits2 >> 5) & 1
+            r.height_mismatch = (bits2 >> 6) & 1
+            r.has_default_xf_index = (bits2 >> 7) & 1
+            r.xf_index = (bits2 >> 16) & 0xfff
+            r.additional_space_above = (bits2 >> 28) & 1
+            r.additional_space_below = (bits2 >> 29) & 1
+            if not r.has_default_xf_index:
+                r.xf_index = -1
+        self.rowinfo_map[rowx] = r
+        if 0 and r.xf_index > -1:
+            fprintf(self.logfile,
+                "**ROW %d %d %d\n",
+                self.number, rowx, r.xf_index)
+        if DEBUG or self.verbosity >= 4:
+            print('ROW', rowx, bits1, bits2, file=self.logfile)
+            r.dump(self.logfile,
+                header="--- sh #%d, rowx=%d ---" % (self.number, rowx))
+
+    def handle_formula(self, data):
+        bk = self.book
+        bv = self.biff_version
+        blah_formulas = 0
+        r1c1 = 0
+        # DEBUG = 1
+        # if DEBUG: print "FORMULA: rc: 0x%04x data: %r" % (rc, data)
+        if bv >= 50:
+            rowx, colx, xf_index, result_str, flags = unpack('<HHH8sH', data[0:16])
+            lenlen = 2
+            tkarr_offset = 20
+        elif bv >= 30:
+            rowx, colx, xf_index, result_str, flags = unpack('<HHH8sH', data[0:16])
+            lenlen = 2
+            tkarr_offset = 16
+        else: # BIFF2
+            rowx, colx, cell_attr,  result_str, flags = unpack('<HH3s8sB', data[0:16])
+            xf_index =  self.fixed_BIFF2_xfindex(cell_attr, rowx, colx)
+            lenlen = 1
+            tkarr_offset = 16
+        if blah_formulas: # testing formula dumper
+            #### XXXX FIXME
+            fprintf(self.logfile, "FORMULA: rowx=%d colx=%d\n", rowx, colx)
+            fmlalen = unpack("<H", data[20:22])[0]
+            decompile_formula(bk, data[22:], fmlalen, FMLA_TYPE_CELL,
+                browx=rowx, bcolx=colx, blah=1, r1c1=r1c1)
+        if result_str[6:8] == b"\xFF\xFF":
+            first_byte = BYTES_ORD(result_str[0])
+            if first_byte == 0:
+                # need to read next record (STRING)
+                gotstring = 0
+                # if flags & 8:
+                if 1: # "flags & 8" applies only to SHRFMLA
+                    # actually there's an optional SHRFMLA or ARRAY etc record to skip over
+                    rc2, data2_len, data2 = bk.get_record_parts()
+                    if rc2 == XL_STRING or rc2 == XL_STRING_B2:
+                        gotstring = 1
+                    elif rc2 == XL_ARRAY:
+                        row1x, rownx, col1x, colnx, array_flags, tokslen = \
+                            unpack("<HHBBBxxxxxH", data2[:14])
+                        if blah_formulas:
+                            fprintf(self.logfile, "ARRAY: %d %d %d %d %d\n",
+                                row1x, rownx, col1x, colnx, array_flags)
+                            # dump_formula(bk, data2[14:], tokslen, bv, reldelta=0, blah=1)
+                    elif rc2 == XL_SHRFMLA:
+                        row1x, rownx, col1x, colnx, nfmlas, tokslen = \
+                            unpack("<HHBBxBH", data2[:10])
+                        if blah_formulas:
+                            fprintf(self.logfile, "SHRFMLA (sub): %d %d %d %d %d\n",
+                                row1x, rownx, col1x, colnx, nfmlas)
+                            decompile_formula(bk, data2[10:], tokslen, FMLA_TYPE_SHARED,
+                                blah=1, browx=rowx, bcolx=colx, r1c1=r1c1)
+                    elif rc2 not in XL_SHRFMLA_ETC_ETC:
+                        raise XLRDError(
+                            "Expected SHRFMLA, ARRAY, TABLEOP* or STRING record; found 0x%04x" % rc2)
+                    # if DEBUG: print "gotstring:", gotstring
+                # now for the STRING record
+                if not gotstring:
+                    rc2, _unused_len, data2 = bk.get_record_parts()
+                    if rc2 not in (XL_STRING, XL_STRING_B2):
+                        raise XLRDError("Expected STRING record; found 0x%04x" % rc2)
+                # if DEBUG: print "STRING: data=%r BIFF=%d cp=%d" % (data2, self.biff_version, bk.encoding)
+                strg = self.string_record_contents(data2)
+                self.put_cell(rowx, colx, XL_CELL_TEXT, strg, xf_index)
+                # if DEBUG: print "FORMULA strg %r" % strg
+            elif first_byte == 1:
+                # boolean formula result
+                value = BYTES_ORD(result_str[2])
+                self.put_cell(rowx, colx, XL_CELL_BOOLEAN, value, xf_index)
+            elif first_byte == 2:
+                # Error in cell
+                value = BYTES_ORD(result_str[2])
+                self.put_cell(rowx, colx, XL_CELL_ERROR, value, xf_index)
+            elif first_byte == 3:
+                # empty ... i.e. empty (zero-length) string, NOT an empty cell.
+                self.put_cell(rowx, colx, XL_CELL_TEXT, "", xf_index)
+            else:
+                raise XLRDError("unexpected special case (0x%02x) in FORMULA" % first_byte)
+        else:
+            # it is a number
+            d = unpack('<d', result_str)[0]
+            self.put_cell(rowx, colx, None, d, xf_index)
+
+    def handle_boolerr(self, data):
+        rowx, colx, xf_index, value, is_err = unpack('<HHHBB', data[:8])
+        # Note OOo Calc 2.0 writes 9-byte BOOLERR records.
+        # OOo docs say 8. Excel writes 8.
+        cellty = (XL_CELL_BOOLEAN, XL_CELL_ERROR)[is_err]
+        # if DEBUG: print "XL_BOOLERR", rowx, colx, xf_index, value, is_err
+        self.put_cell(rowx, colx, cellty, value, xf_index)
+
+    def handle_colinfo(self, data):
+        blah = DEBUG or self.verbosity >= 2
+        c = Colinfo()
+        first_colx, last_colx, c.width, c.xf_index, flags \
+            = unpack("<HHHHH", data[:10])
+        #### Colinfo.width is denominated in 256ths of a character,
+        #### *not* in characters.
+        if not(0 <= first_colx <= last_colx <= 256):
+            # Note: 256 instead of 255 is a common mistake.
+            # We silently ignore the non-existing 257th column in that case.
+            print("*** NOTE: COLINFO record has first col index %d, last %d; " \
+                "should have 0 <= first <= last <= 255 -- record ignored!" \
+                % (first_colx, last_colx), file=self.logfile)
+            del c
+            return
+        upkbits(c, flags, (
+            ( 0, 0x0001, 'hidden'),
+            ( 1, 0x0002, 'bit1_flag'),
+            # *ALL* colinfos created by Excel in "default" cases are 0x0002!!
+            # Maybe it's "locked" by analogy with XFProtection data.
+            ( 8, 0x0700, 'outline_level'),
+            (12, 0x1000, 'collapsed'),
+            ))
+        for colx in xrange(first_colx, last_colx+1):
+            if colx > 255: break # Excel does 0 to 256 inclusive
+            self.colinfo_map[colx] = c
+            if 0:
+                fprintf(self.logfile,
+                    "**COL %d %d %d\n",
+                    self.number, colx, c.xf_index)
+        if blah:
+            fprintf(
+                self.logfile,
+                "COLINFO sheet #%d cols %d-%d: wid=%d xf_index=%d flags=0x%04x\n",
+                self.number, first_colx, last_colx, c.width, c.xf_index, flags,
+                )
+            c.dump(self.logfile, header='===')
+
+    def handle_defcolwidth(self, data):
+        self.defcolwidth, = unpack("<H", data[:2])
+        if 0: print('DEFCOLWIDTH', self.defcolwidth, file=self.logfile)
+
+    def handle_standardwidth(self, data):
+        data_len = len(data)
+        if data_len != 2:
+            print('*** ERROR *** STANDARDWIDTH', data_len, repr(data), file=self.logfile)
+        self.standardwidth, = unpack("<H", data[:2])
+        if 0: print('STANDARDWIDTH', self.standardwidth, file=self.logfile)
+
+    def handle_gcw(self, data):
+        data_len = len(data)
+        assert data_len == 34
+        assert data[0:2] == b"\x20\x00"
+        iguff = unpack("<8i", data[2:34])
+        gcw = []
+        for bits in iguff:
+            for j in xrange(32):
+                gcw.append(bits & 1)
+                bits >>= 1
+        self.gcw = tuple(gcw)
+        if 0:
+            showgcw = "".join(map(lambda x: "F "[x], gcw)).rstrip().replace(' ', '.')
+            print("GCW:", showgcw, file=self.logfile)
+
+    def handle_dimension(self, data):
+        bv = self.biff_version
+        data_len = len(data)
+        blah = DEBUG or self.verbosity >= 2
+        if data_len == 0:
+            # Four zero bytes after some other record. See github issue 64.
+            return
+        # if data_len == 10:
+        # Was crashing on BIFF 4.0 file w/o the two trailing unused bytes.
+        # Reported by Ralph Heimburger.
+        if bv < 80:
+            dim_tuple = unpack('<HxxH', data[2:8])
+        else:
+            dim_tuple = unpack('<ixxH', data[4:12])
+        self.nrows, self.ncols = 0, 0
+        self._dimnrows, self._dimncols = dim_tuple
+        self.preallocate_cells()
+        if bv in (21, 30, 40) and self.book.xf_list and not self.book._xf_epilogue_done:
+            self.book.xf_epilogue()
+        if blah:
+            fprintf(self.logfile,
+                "sheet %d(%r) DIMENSIONS: ncols=%d nrows=%d\n",
+                self.number, self.name, self._dimncols, self._dimnrows
+                )
+
+    def handle_embedded_bof(self, data):
+        bk = self.book
+        version, boftype = unpack('<HH', data[0:4])
+        if boftype != 0x20: # embedded chart
+            bof_pos = bk._position - len(data) - 4
+            rc, = unpack('<H', bk.mem[bof_pos:bof_pos+2])
+            print("*** Unexpected embedded BOF (0x%04x) at offset %d: version=0x%04x type=0x%04x" \
+                % (rc, bof_pos, version, boftype), file=self.logfile)
+        # Skip the substream without copying its records
+        for code, _unused, _unused, _unused in bk.iter_records():
+            if code == XL_EOF:
+                break
+        if DEBUG: print("---> found EOF", file=self.logfile)
+
+    def handle_labelranges(self, data):
+        bv = self.biff_version
+        data_len = len(data)
+        pos = 0
+        pos = unpack_cell_range_address_list_update_pos(
+                self.row_label_ranges, data, pos, bv, addr_size=8,
+                )
+        pos = unpack_cell_range_address_list_update_pos(
+                self.col_label_ranges, data, pos, bv, addr_size=8,
+                )
+        assert pos == data_len
+
+    def handle_array(self, data):
+        blah_formulas = 0
+        row1x, rownx, col1x, colnx, array_flags, tokslen = \
+            unpack("<HHBBBxxxxxH", data[:14])
+        if blah_formulas:
+            print("ARRAY:", row1x, rownx, col1x, colnx, array_flags, file=self.logfile)
+            # dump_formula(bk, data[14:], tokslen, bv, reldelta=0, blah=1)
+
+    def handle_shrfmla(self, data):
+        bk = self.book
+        blah_formulas = 0
+        r1c1 = 0
+        row1x, rownx, col1x, colnx, nfmlas, tokslen = \
+            unpack("<HHBBxBH", data[:10])
+        if blah_formulas:
+            print("SHRFMLA (main):", row1x, rownx, col1x, colnx, nfmlas, file=self.logfile)
+            decompile_formula(bk, data[10:], tokslen, FMLA_TYPE_SHARED,
+                blah=1, browx=row1x, bcolx=col1x, r1c1=r1c1)
+
+    def handle_condfmt(self, data):
+        bv = self.biff_version
+        assert bv >= 80
+        num_CFs, needs_recalc, browx1, browx2, bcolx1, bcolx2 = \
+            unpack("<6H", data[0:12])
+        if self.verbosity >= 1:
+            fprintf(self.logfile,
+                "\n*** WARNING: Ignoring CONDFMT (conditional formatting) record\n" \
+                "*** in Sheet %d (%r).\n" \
+                "*** %d CF record(s); needs_recalc_or_redraw = %d\n" \
+                "*** Bounding box is %s\n",
+                self.number, self.name, num_CFs, needs_recalc,
+                rangename2d(browx1, browx2+1, bcolx1, bcolx2+1),
+                )
+        olist = [] # updated by the function
+        pos = unpack_cell_range_address_list_update_pos(
+            olist, data, 12, bv, addr_size=8)
+        # print >> self.logfile, repr(result), len(result)
+        if self.verbosity >= 1:
+            fprintf(self.logfile,
+                "*** %d individual range(s):\n" \
+                "*** %s\n",
+                len(olist),
+                ", ".join([rangename2d(*coords) for coords in olist]),
+                )
+
+    def handle_cf(self, data):
+        bk = self.book
+        bv = self.biff_version
+        data_len = len(data)
+        blah = DEBUG or self.verbosity >= 2
+        cf_type, cmp_op, sz1, sz2, flags = unpack("<BBHHi", data[0:10])
+        font_block = (flags >> 26) & 1
+        bord_block = (flags >> 28) & 1
+        patt_block = (flags >> 29) & 1
+        if self.verbosity >= 1:
+            fprintf(self.logfile,
+                "\n*** WARNING: Ignoring CF (conditional formatting) sub-record.\n" \
+                "*** cf_type=%d, cmp_op=%d, sz1=%d, sz2=%d, flags=0x%08x\n" \
+                "*** optional data blocks: font=%d, border=%d, pattern=%d\n",
+                cf_type, cmp_op, sz1, sz2, flags,
+                font_block, bord_block, patt_block,
+                )
+        # hex_char_dump(data, 0, data_len, fout=self.logfile)
+        pos = 12
+        if font_block:
+            (font_height, font_options, weight, escapement, underline,
+            font_colour_index, two_bits, font_esc, font_underl) = \
+            unpack("<64x i i H H B 3x i 4x i i i 18x", data[pos:pos+118])
+            font_style = (two_bits > 1) & 1
+            posture = (font_options > 1) & 1
+            font_canc = (two_bits > 7) & 1
+            cancellation = (font_options > 7) & 1
+            if self.verbosity >= 1:
+                fprintf(self.logfile,
+                    "*** Font info: height=%d, weight=%d, escapement=%d,\n" \
+                    "*** underline=%d, colour_index=%d, esc=%d, underl=%d,\n" \
+                    "*** style=%d, posture=%d, canc=%d, cancellation=%d\n",
+                    font_height, weight, escapement, underline,
+                    font_colour_index, font_esc, font_underl,
+                    font_style, posture, font_canc, cancellation,
+                    )
+            pos += 118
+        if bord_block:
+            pos += 8
+        if patt_block:
+            pos += 4
+        fmla1 = data[pos:pos+sz1]
+        pos += sz1
+        if blah and sz1:
+            fprintf(self.logfile,
+                "*** formula 1:\n",
+                )
+            dump_formula(bk, fmla1, sz1, bv, reldelta=0, blah=1)
+        fmla2 = data[pos:pos+sz2]
+        pos += sz2
+        assert pos == data_len
+        if blah and sz2:
+            fprintf(self.logfile,
+                "*** formula 2:\n",
+                )
+            dump_formula(bk, fmla2, sz2, bv, reldelta=0, blah=1)
+
+    def handle_defaultrowheight(self, data):
+        data_len = len(data)
+        if data_len == 4:
+            bits, self.default_row_height = unpack("<HH", data[:4])
+        elif data_len == 2:
+            self.default_row_height, = unpack("<H", data)
+            bits = 0
+            fprintf(self.logfile,
+                "*** WARNING: DEFAULTROWHEIGHT record len is 2, " \
+                "should be 4; assuming BIFF2 format\n")
+        else:
+            bits = 0
+            fprintf(self.logfile,
+                "*** WARNING: DEFAULTROWHEIGHT record len is %d, " \
+                "should be 4; ignoring this record\n",
+                data_len)
+        self.default_row_height_mismatch = bits & 1
+        self.default_row_hidden = (bits >> 1) & 1
+        self.default_additional_space_above = (bits >> 2) & 1
+        self.default_additional_space_below = (bits >> 3) & 1
+
+    def handle_mergedcells(self, data):
+        bv = self.biff_version
+        data_len = len(data)
+        blah = DEBUG or self.verbosity >= 2
+        pos = unpack_cell_range_address_list_update_pos(
+            self.merged_cells, data, 0, bv, addr_size=8)
+        if blah:
+            fprintf(self.logfile,
+                "MERGEDCELLS: %d ranges\n", (pos - 2) // 8)
+        assert pos == data_len, \
+            "MERGEDCELLS: pos=%d data_len=%d" % (pos, data_len)
+
+    def handle_window2(self, data):
+        bv = self.biff_version
+        data_len = len(data)
+        if bv >= 80 and data_len >= 14:
+            (options,
+            self.first_visible_rowx, self.first_visible_colx,
+            self.gridline_colour_index,
+            self.cached_page_break_preview_mag_factor,
+            self.cached_normal_view_mag_factor
+            ) = unpack("<HHHHxxHH", data[:14])
+        else:
+            assert bv >= 30 # BIFF3-7
+            (options,
+            self.first_visible_rowx, self.first_visible_colx,
+            ) = unpack("<HHH", data[:6])
+            self.gridline_colour_rgb = unpack("<BBB", data[6:9])
+            self.gridline_colour_index = nearest_colour_index(
+                self.book.colour_map, self.gridline_colour_rgb, debug=0)
+            self.cached_page_break_preview_mag_factor = 0 # default (60%)
+            self.cached_normal_view_mag_factor = 0 # default (100%)
+        # options -- Bit, Mask, Contents:
+        # 0 0001H 0 = Show formula results 1 = Show formulas
+        # 1 0002H 0 = Do not show grid lines 1 = Show grid lines
+        # 2 0004H 0 = Do not show sheet headers 1 = Show sheet headers
+        # 3 0008H 0 = Panes are not frozen 1 = Panes are frozen (freeze)
+        # 4 0010H 0 = Show zero values as empty cells 1 = Show zero values
+        # 5 0020H 0 = Manual grid line colour 1 = Automatic grid line colour
+        # 6 0040H 0 = Columns from left to right 1 = Columns from right to left
+        # 7 0080H 0 = Do not show outline symbols 1 = Show outline symbols
+        # 8 0100H 0 = Keep splits if pane freeze is removed 1 = Remove splits if pane freeze is removed
+        # 9 0200H 0 = Sheet not selected 1 = Sheet selected (BIFF5-BIFF8)
+        # 10 0400H 0 = Sheet not visible 1 = Sheet visible (BIFF5-BIFF8)
+        # 11 0800H 0 = Show in normal view 1 = Show in page break preview (BIFF8)
+        # The freeze flag specifies, if a following PANE record (6.71) describes unfrozen or frozen panes.
+        for attr, _unused_defval in _WINDOW2_options:
+            setattr(self, attr, options & 1)
+            options >>= 1
+
+    def handle_scl(self, data):
+        num, den = unpack("<HH", data)
+        result = 0
+        if den:
+            result = (num * 100) // den
+        if not(10 <= result <= 400):
+            if DEBUG or self.verbosity >= 0:
+                print((
+                    "WARNING *** SCL rcd sheet %d: should have 0.1 <= num/den <= 4; got %d/%d"
+                    % (self.number, num, den)
+                    ), file=self.logfile)
+            result = 100
+        self.scl_mag_factor = result
+
+    def handle_pane(self, data):
+        (
+        self.vert_split_pos,
+        self.horz_split_pos,
+        self.horz_split_first_visible,
+        self.vert_split_first_visible,
+        self.split_active_pane,
+        ) = unpack("<HHHHB", data[:9])
+        self.has_pane_record = 1
+
+    def handle_horizontalpagebreaks(self, data):
+        bv = self.biff_version
+        data_len = len(data)
+        num_breaks, = unpack("<H", data[:2])
+        assert num_breaks * (2 + 4 * (bv >= 80)) + 2 == data_len
+        pos = 2
+        if bv < 80:
+            while pos < data_len:
+                self.horizontal_page_breaks.append((unpack("<H", data[pos:pos+2])[0], 0, 255))
+                pos += 2
+        else:
+            while pos < data_len:
+                self.horizontal_page_breaks.append(unpack("<HHH", data[pos:pos+6]))
+                pos += 6
+
+    def handle_verticalpagebreaks(self, data):
+        bv = self.biff_version
+        data_len = len(data)
+        num_breaks, = unpack("<H", data[:2])
+        assert num_breaks * (2 + 4 * (bv >= 80)) + 2 == data_len
+        pos = 2
+        if bv < 80:
+            while pos < data_len:
+                self.vertical_page_breaks.append((unpack("<H", data[pos:pos+2])[0], 0, 65535))
+                pos += 2
+        else:
+            while pos < data_len:
+                self.vertical_page_breaks.append(unpack("<HHH", data[pos:pos+6]))
+                pos += 6
+
+    def handle_style(self, data):
+        bk = self.book
+        if not self.book._xf_epilogue_done:
+            self.book.xf_epilogue()
+        bk.handle_style(data)
+
+    def handle_ixfe(self, data):
+        self._ixfe = unpack('<H', data)[0]
+
+    def handle_number_b2(self, data):
+        rowx, colx, cell_attr, d = unpack('<HH3sd', data)
+        self.put_cell(rowx, colx, None, d, self.fixed_BIFF2_xfindex(cell_attr, rowx, colx))
+
+    def handle_integer(self, data):
+        rowx, colx, cell_attr, d = unpack('<HH3sH', data)
+        self.put_cell(rowx, colx, None, float(d), self.fixed_BIFF2_xfindex(cell_attr, rowx, colx))
+
+    def handle_label_b2(self, data):
+        bk = self.book
+        rowx, colx, cell_attr = unpack('<HH3s', data[0:7])
+        strg = unpack_string(data, 7, bk.encoding or bk.derive_encoding(), lenlen=1)
+        self.put_cell(rowx, colx, XL_CELL_TEXT, strg, self.fixed_BIFF2_xfindex(cell_attr, rowx, colx))
+
+    def handle_boolerr_b2(self, data):
+        rowx, colx, cell_attr, value, is_err = unpack('<HH3sBB', data)
+        cellty = (XL_CELL_BOOLEAN, XL_CELL_ERROR)[is_err]
+        # if DEBUG: print "XL_BOOLERR_B2", rowx, colx, cell_attr, value, is_err
+        self.put_cell(rowx, colx, cellty, value, self.fixed_BIFF2_xfindex(cell_attr, rowx, colx))
+
+    def handle_blank_b2(self, data):
+        rowx, colx, cell_attr = unpack('<HH3s', data[:7])
+        self.put_cell(rowx, colx, XL_CELL_BLANK, '', self.fixed_BIFF2_xfindex(cell_attr, rowx, colx))
+
+    def handle_row_b2(self, data):
+        data_len = len(data)
+        blah_rows = DEBUG or self.verbosity >= 4
+        rowx, bits1, bits2 = unpack('<H4xH2xB', data[0:11])
+        if not(0 <= rowx < self.utter_max_rows):
+            print("*** NOTE: ROW_B2 record has row index %d; " \
+                "should have 0 <= rowx < %d -- record ignored!" \
+                % (rowx, self.utter_max_rows), file=self.logfile)
+            return
+        if not (bits2 & 1):  # has_default_xf_index is false
+            xf_index = -1
+        elif data_len == 18:
+            # Seems the XF index in the cell_attr is dodgy
+             xfx = unpack('<H', data[16:18])[0]
+             xf_index = self.fixed_BIFF2_xfindex(cell_attr=None, rowx=rowx, colx=-1, true_xfx=xfx)
+        else:
+            cell_attr = data[13:16]
+            xf_index = self.fixed_BIFF2_xfindex(cell_attr, rowx, colx=-1)
+        key = (bits1, bits2, xf_index)
+        r = self._rowinfo_sharing_dict.get(key)
+        if r is None:
+            self._rowinfo_sharing_dict[key] = r = Rowinfo()
+            r.height = bits1 & 0x7fff
+            r.has_default_height = (bits1 >> 15) & 1
+            r.has_default_xf_index = bits2 & 1
+            r.xf_index = xf_index
+            # r.outline_level = 0             # set in __init__
+            # r.outline_group_starts_ends = 0 # set in __init__
+            # r.hidden = 0                    # set in __init__
+            # r.height_mismatch = 0           # set in __init__
+            # r.additional_space_above = 0    # set in __init__
+            # r.additional_space_below = 0    # set in __init__
+        self.rowinfo_map[rowx] = r
+        if 0 and r.xf_index > -1:
+            fprintf(self.logfile,
+                "**ROW %d %d %d\n",
+                self.number, rowx, r.xf_index)
+        if blah_rows:
+            print('ROW_B2', rowx, bits1, bits2, file=self.logfile)
+            r.dump(self.logfile,
+                header="--- sh #%d, rowx=%d ---" % (self.number, rowx))
+
+    def handle_colwidth(self, data):
+        blah = DEBUG or self.verbosity >= 2
+        first_colx, last_colx, width\
+            = unpack("<BBH", data[:4])
+        if not(first_colx <= last_colx):
+            print("*** NOTE: COLWIDTH record has first col index %d, last %d; " \
+                "should have first <= last -- record ignored!" \
+                % (first_colx, last_colx), file=self.logfile)
+            return
+        for colx in xrange(first_colx, last_colx+1):
+            if colx in self.colinfo_map:
+                c = self.colinfo_map[colx]
+            else:
+                c = Colinfo()
+                self.colinfo_map[colx] = c
+            c.width = width
+        if blah:
+            fprintf(
+                self.logfile,
+                "COLWIDTH sheet #%d cols %d-%d: wid=%d\n",
+                self.number, first_colx, last_colx, width
+                )
+
+    def handle_columndefault(self, data):
+        blah = DEBUG or self.verbosity >= 2
+        first_colx, last_colx = unpack("<HH", data[:4])
+        #### Warning OOo docs wrong; first_colx <= colx < last_colx
+        if blah:
+            fprintf(
+                self.logfile,
+                "COLUMNDEFAULT sheet #%d cols in range(%d, %d)\n",
+                self.number, first_colx, last_colx
+                )
+        if not(0 <= first_colx < last_colx <= 256):
+            print("*** NOTE: COLUMNDEFAULT record has first col index %d, last %d; " \
+                "should have 0 <= first < last <= 256" \
+                % (first_colx, last_colx), file=self.logfile)
+            last_colx = min(last_colx, 256)
+        for colx in xrange(first_colx, last_colx):
+            offset = 4 + 3 * (colx - first_colx)
+            cell_attr = data[offset:offset+3]
+            xf_index = self.fixed_BIFF2_xfindex(cell_attr, rowx=-1, colx=colx)
+            if colx in self.colinfo_map:
+                c = self.colinfo_map[colx]
+            else:
+                c = Colinfo()
+                self.colinfo_map[colx] = c
+            c.xf_index = xf_index
+
+    def handle_window2_b2(self, data):
+        attr_names = ("show_formulas", "show_grid_lines", "show_sheet_headers",
+            "panes_are_frozen", "show_zero_values")
+        for attr, char in zip(attr_names, data[0:5]):
+            setattr(self, attr, int(char != b'\0'))
+        (self.first_visible_rowx, self.first_visible_colx,
+        self.automatic_grid_line_colour,
+        ) = unpack("<HHB", data[5:10])
+        self.gridline_colour_rgb = unpack("<BBB", data[10:13])
+        self.gridline_colour_index = nearest_colour_index(
+            self.book.colour_map, self.gridline_colour_rgb, debug=0)
+        self.cached_page_break_preview_mag_factor = 0 # default (60%)
+        self.cached_normal_view_mag_factor = 0 # default (100%)
+
     def string_record_contents(self, data):
         bv = self.biff_version
         bk = self.book
@@ -2173,6 +2547,42 @@ def unpack_RK(rk_str):
             return d / 100.0
         return d
 
+##
+# As unpack_RK, for the RK value at offset in buf.
+def unpack_RK_from(buf, offset):
+    rk, = _unpack_i_from(buf, offset)
+    if rk & 2:
+        # There's a SIGNED 30-bit integer in there!
+        d = float(rk >> 2)
+    else:
+        # It's the most significant 30 bits of an IEEE 754 64-bit FP number
+        d, = _unpack_d(_pack_q((rk & -4) << 32))
+    if rk & 1:
+        return d / 100.0
+    return d
+
+##
+# Unpack the count (xf_index, RK value) pairs that start at offset in buf,
+# as in a MULRK record, with one struct call for the whole record.
+# Returns a tuple of XF indexes and a list of values.
+def unpack_MULRK_from(buf, offset, count):
+    try:
+        unpack_from = _MULRK_unpackers[count]
+    except KeyError:
+        unpack_from = _MULRK_unpackers[count] = Struct('<' + 'Hi' * count).unpack_from
+    pairs = unpack_from(buf, offset)
+    values = []
+    append = values.append
+    for rk in pairs[1::2]:
+        if rk & 2:
+            d = float(rk >> 2)
+        else:
+            d, = _unpack_d(_pack_q((rk & -4) << 32))
+        if rk & 1:
+            d /= 100.0
+        append(d)
+    return pairs[0::2], values
+
 ##### =============== Cell ======================================== #####
 
 cellty_from_fmtty = {
@@ -0,0 +1,404 @@
+##
+# Reading Excel 2007+ binary (XLSB) workbooks.
+#
+# <p>This module is part of the xlrd package, which is released under a BSD-style licence.</p>
+##
+
+# An XLSB file is a zip file laid out like an XLSX file, except that the
+# workbook, styles, shared strings and worksheets are BIFF12 record streams
+# instead of XML. The relationships and document properties are still XML,
+# and are read by xlsx.X12Book. Each record is a 1- or 2-byte type and a 1- to
+# 4-byte size, each 7 bits to the byte, followed by its data.
+
+from __future__ import print_function
+
+import sys
+import time
+from struct import unpack_from
+from .timemachine import *
+from .book import Book
+from .biffh import XLRDError, XL_CELL_BLANK, XL_CELL_TEXT, XL_CELL_BOOLEAN, XL_CELL_ERROR
+from .formatting import is_date_format_string, Format, XF
+from .sheet import Sheet, unpack_RK_from
+from .xlsx import (
+    X12General, X12Book, X12LazyXFTypes, X12Styles,
+    X12_MAX_ROWS, X12_MAX_COLS, ensure_elementtree_imported,
+    )
+from . import zipstream
+
+DLF = sys.stdout # Default Log File
+
+# Record types (MS-XLSB 2.3). Only the ones that are read are listed.
+
+BRT_ROW_HDR = 0
+BRT_CELL_BLANK = 1
+BRT_CELL_RK = 2
+BRT_CELL_ERROR = 3
+BRT_CELL_BOOL = 4
+BRT_CELL_REAL = 5
+BRT_CELL_ST = 6
+BRT_CELL_ISST = 7
+BRT_FMLA_STRING = 8
+BRT_FMLA_NUM = 9
+BRT_FMLA_BOOL = 10
+BRT_FMLA_ERROR = 11
+BRT_SST_ITEM = 19
+BRT_FMT = 44
+BRT_XF = 47
+BRT_CELL_RSTRING = 62
+BRT_WS_DIM = 148
+BRT_WB_PROP = 153
+BRT_BUNDLE_SH = 156
+BRT_MERGE_CELL = 176
+BRT_BEGIN_CELL_XFS = 617
+BRT_END_CELL_XFS = 618
+
+# Longest record header: 2 bytes of type and 4 of size
+_MAX_HEADER_SIZE = 6
+
+##
+# Generator of (record type, data) tuples for the BIFF12 records read from
+# stream, which is read read_size bytes at a time. The data is a bytearray.
+def iter_records(stream, read_size=zipstream.ZIP_READ_SIZE):
+    read = stream.read
+    buf = bytearray()
+    pos = 0
+    eof = False
+    while 1:
+        if len(buf) - pos < _MAX_HEADER_SIZE and not eof:
+            del buf[:pos]
+            pos = 0
+            data = read(read_size)
+            if data:
+                buf += data
+            else:
+                eof = True
+            continue
+        if pos >= len(buf):
+            return
+        try:
+            b = buf[pos]
+            pos += 1
+            rt = b & 0x7f
+            if b & 0x80:
+                rt |= (buf[pos] & 0x7f) << 7
+                pos += 1
+            size = shift = 0
+            while 1:
+                b = buf[pos]
+                pos += 1
+                size |= (b & 0x7f) << shift
+                if not b & 0x80 or shift == 21:
+                    break
+                shift += 7
+        except IndexError:
+            raise XLRDError('Truncated BIFF12 record header')
+        end = pos + size
+        while end > len(buf):
+            if eof:
+                raise XLRDError('Truncated BIFF12 record: type %d, size %d' % (rt, size))
+            del buf[:pos]
+            end -= pos
+            pos = 0
+            data = read(max(read_size, end - len(buf)))
+            if data:
+                buf += data
+            else:
+                eof = True
+        yield rt, buf[pos:end]
+        pos = end
+
+##
+# Returns (string, position after it) for the XLWideString (a 4-byte count of
+# characters, then UTF-16LE) at pos in data. A count of 0xFFFFFFFF (an
+# XLNullableWideString that is null) gives None.
+def unpack_wide_string(data, pos):
+    nchars, = unpack_from('<I', data, pos)
+    pos += 4
+    if nchars == 0xffffffff:
+        return None, pos
+    end = pos + 2 * nchars
+    return data[pos:end].decode('utf-16-le'), end
+
+class X12BinBook(X12Book):
+
+    # The workbook part: the sheet list and the date mode. Defined names are
+    # stored as parsed formulas, which aren't decoded, so name_obj_list is
+    # left empty.
+    def process_stream(self, stream, heading=None):
+        if self.verbosity >= 2 and heading is not None:
+            fprintf(self.logfile, "\n=== %s ===\n", heading)
+        for rt, data in iter_records(stream):
+            if rt == BRT_BUNDLE_SH:
+                self.do_bundle_sh(data)
+            elif rt == BRT_WB_PROP:
+                flags, = unpack_from('<I', data)
+                self.bk.datemode = flags & 1
+                if self.verbosity >= 2:
+                    self.dumpout('datemode=%r', self.bk.datemode)
+        self.finish_off()
+
+    def do_bundle_sh(self, data):
+        bk = self.bk
+        sheetx = bk.nsheets
+        state, sheetId = unpack_from('<II', data)
+        rid, pos = unpack_wide_string(data, 8)
+        name, pos = unpack_wide_string(data, pos)
+        reltype = self.relid2reltype.get(rid)
+        if self.verbosity >= 2:
+            self.dumpout(
+                'sheetx=%d sheetId=%r rid=%r type=%r name=%r',
+                sheetx, sheetId, rid, reltype, name)
+        if reltype != 'worksheet':
+            if self.verbosity >= 2:
+                self.dumpout('Ignoring sheet of type %r (name=%r)', reltype, name)
+            return
+        bk._sheet_visibility.append(state)
+        sheet = Sheet(bk, position=None, name=name, number=sheetx)
+        sheet.utter_max_rows = X12_MAX_ROWS
+        sheet.utter_max_cols = X12_MAX_COLS
+        bk._sheet_list.append(sheet)
+        bk._sheet_names.append(name)
+        bk.nsheets += 1
+        self.sheet_targets.append(self.relid2path[rid])
+        self.sheetIds.append(sheetId)
+
+class X12BinSST(X12General):
+
+    def __init__(self, bk, logfile=DLF, verbosity=0):
+        self.bk = bk
+        self.logfile = logfile
+        self.verbosity = verbosity
+
+    # Rich text runs and phonetic data follow the text of an item, and are
+    # ignored.
+    def process_stream(self, stream, heading=None):
+        if self.verbosity >= 2 and heading is not None:
+            fprintf(self.logfile, "\n=== %s ===\n", heading)
+        sst = self.bk._sharedstrings
+        nrecs = 0
+        for rt, data in iter_records(stream):
+            nrecs += 1
+            if rt == BRT_SST_ITEM:
+                # A flags byte, then the text
+                sst.append(unpack_wide_string(data, 1)[0])
+        self.bk._records_read += nrecs
+        if self.verbosity >= 2:
+            self.dumpout('Entries in SST: %d', len(sst))
+        self.finish_off()
+
+class X12BinStyles(X12Styles):
+
+    def __init__(self, bk, logfile=DLF, verbosity=0, lazy=False):
+        X12Styles.__init__(self, bk, logfile, verbosity)
+        self.lazy = lazy
+
+    # As for X12Styles, only the number format of each cell XF is read.
+    def process_stream(self, stream, heading=None):
+        if self.verbosity >= 2 and heading is not None:
+            fprintf(self.logfile, "\n=== %s ===\n", heading)
+        fmt_codes = {}
+        xf_fmt_ids = []
+        in_cellxfs = 0
+        for rt, data in iter_records(stream):
+            if rt == BRT_XF:
+                if in_cellxfs:
+                    xf_fmt_ids.append(unpack_from('<H', data, 2)[0])
+            elif rt == BRT_FMT:
+                numFmtId, = unpack_from('<H', data)
+                fmt_codes[numFmtId] = unpack_wide_string(data, 2)[0]
+            elif rt == BRT_BEGIN_CELL_XFS:
+                in_cellxfs = 1
+            elif rt == BRT_END_CELL_XFS:
+                in_cellxfs = 0
+        if self.verbosity >= 2:
+            self.dumpout('%d cell XFs, %d number formats', len(xf_fmt_ids), len(fmt_codes))
+        self.store_styles(fmt_codes, xf_fmt_ids)
+        self.finish_off()
+
+    def store_styles(self, fmt_codes, xf_fmt_ids):
+        bk = self.bk
+        if self.lazy:
+            bk._xf_index_to_xl_type_map = X12LazyXFTypes(bk, fmt_codes, xf_fmt_ids, self.fmt_is_date)
+            for sheet in bk._sheet_list:
+                sheet._xf_index_to_xl_type_map = bk._xf_index_to_xl_type_map
+            return
+        for numFmtId, formatCode in fmt_codes.items():
+            is_date = is_date_format_string(bk, formatCode)
+            self.fmt_is_date[numFmtId] = is_date
+            bk.format_map[numFmtId] = Format(numFmtId, is_date + 2, formatCode)
+        for xfx, numFmtId in enumerate(xf_fmt_ids):
+            xf = XF()
+            xf.format_key = numFmtId
+            bk.xf_list.append(xf)
+            bk._xf_index_to_xl_type_map[xfx] = self.fmt_is_date.get(numFmtId, 0) + 2
+        bk.xfcount = len(bk.xf_list)
+
+class X12BinSheet(X12General):
+
+    def __init__(self, sheet, logfile=DLF, verbosity=0):
+        self.sheet = sheet
+        self.logfile = logfile
+        self.verbosity = verbosity
+        self.bk = sheet.book
+
+    # Cells are stored as they are read, with the cached value of each formula
+    # cell. The formulas themselves are parsed expressions, which aren't
+    # decoded.
+    def process_stream(self, stream, heading=None):
+        if self.verbosity >= 2 and heading is not None:
+            fprintf(self.logfile, "\n=== %s ===\n", heading)
+        sheet = self.sheet
+        self_put_cell = sheet.put_cell
+        sst = self.bk._sharedstrings
+        blanks = self.bk.formatting_info
+        local_unpack_from = unpack_from
+        max_rows = X12_MAX_ROWS
+        rowx = -1
+        nrecs = 0
+        for rt, data in iter_records(stream):
+            nrecs += 1
+            if rt > BRT_FMLA_ERROR:
+                if rt == BRT_CELL_RSTRING:
+                    # A flags byte, then the text
+                    colx, style = local_unpack_from('<iI', data)
+                    self_put_cell(rowx, colx, XL_CELL_TEXT, unpack_wide_string(data, 9)[0], style & 0xffffff)
+                elif rt == BRT_WS_DIM:
+                    self.do_dimension(data)
+                elif rt == BRT_MERGE_CELL:
+                    self.do_merge_cell(data)
+                continue
+            if rt == BRT_ROW_HDR:
+                rowx, = local_unpack_from('<i', data)
+                assert 0 <= rowx < max_rows
+                continue
+            # Every cell record starts with its column and its style, whose
+            # top byte holds flags.
+            colx, style = local_unpack_from('<iI', data)
+            style &= 0xffffff
+            if rt == BRT_CELL_ISST:
+                self_put_cell(rowx, colx, XL_CELL_TEXT, sst[local_unpack_from('<i', data, 8)[0]], style)
+            elif rt == BRT_CELL_REAL or rt == BRT_FMLA_NUM:
+                self_put_cell(rowx, colx, None, local_unpack_from('<d', data, 8)[0], style)
+            elif rt == BRT_CELL_RK:
+                self_put_cell(rowx, colx, None, unpack_RK_from(data, 8), style)
+            elif rt == BRT_CELL_ST or rt == BRT_FMLA_STRING:
+                self_put_cell(rowx, colx, XL_CELL_TEXT, unpack_wide_string(data, 8)[0], style)
+            elif rt == BRT_CELL_BLANK:
+                if blanks:
+                    self_put_cell(rowx, colx, XL_CELL_BLANK, '', style)
+            elif rt == BRT_CELL_BOOL or rt == BRT_FMLA_BOOL:
+                self_put_cell(rowx, colx, XL_CELL_BOOLEAN, data[8], style)
+            elif rt == BRT_CELL_ERROR or rt == BRT_FMLA_ERROR:
+                self_put_cell(rowx, colx, XL_CELL_ERROR, data[8], style)
+        sheet._records_read += nrecs
+        self.bk._records_read += nrecs
+        self.finish_off()
+
+    def do_dimension(self, data):
+        first_rowx, last_rowx, first_colx, last_colx = unpack_from('<iiii', data)
+        self.sheet._dimnrows = last_rowx + 1
+        self.sheet._dimncols = last_colx + 1
+        self.sheet.preallocate_cells()
+
+    def do_merge_cell(self, data):
+        first_rowx, last_rowx, first_colx, last_colx = unpack_from('<iiii', data)
+        self.sheet.merged_cells.append((first_rowx, last_rowx + 1,
+                                        first_colx, last_colx + 1))
+
+def open_workbook_2007_bin(
+    zf,
+    component_names,
+    logfile=sys.stdout,
+    verbosity=0,
+    use_mmap=0,
+    formatting_info=0,
+    on_demand=0,
+    ragged_rows=0,
+    processes=0,
+    load_core_props=1,
+    load_styles=1,
+    ):
+    ensure_elementtree_imported(verbosity, logfile)
+    bk = Book()
+    bk.logfile = logfile
+    bk.verbosity = verbosity
+    bk.formatting_info = formatting_info
+    if formatting_info:
+        raise NotImplementedError("formatting_info=True not yet implemented")
+    bk.use_mmap = use_mmap != 0
+    bk.on_demand = on_demand
+    if on_demand:
+        if verbosity:
+            print("WARNING *** on_demand=True not yet implemented; falling back to False", file=bk.logfile)
+        bk.on_demand = False
+    bk.ragged_rows = ragged_rows
+
+    zfs = [zf] # replaced in worker processes
+    members = [] # streams opened, for their inflate_time
+
+    def open_member(name):
+        stream = zipstream.open_member(zfs[0], component_names[name])
+        members.append(stream)
+        return stream
+
+    x12book = X12BinBook(bk, logfile, verbosity)
+    t0 = time.time()
+    zflo = open_member('xl/_rels/workbook.bin.rels')
+    x12book.process_rels(zflo)
+    del zflo
+    zflo = open_member('xl/workbook.bin')
+    x12book.process_stream(zflo, 'Workbook')
+    del zflo
+    props_name = 'docprops/core.xml'
+    if load_core_props and props_name in component_names:
+        zflo = open_member(props_name)
+        x12book.process_coreprops(zflo)
+    t1 = time.time()
+    bk.load_time_phases.append(('workbook', t1 - t0))
+
+    x12sty = X12BinStyles(bk, logfile, verbosity, not load_styles)
+    if 'xl/styles.bin' in component_names:
+        zflo = open_member('xl/styles.bin')
+        x12sty.process_stream(zflo, 'styles')
+        del zflo
+    t0 = time.time()
+    bk.load_time_phases.append(('styles', t0 - t1))
+
+    sst_fname = 'xl/sharedstrings.bin'
+    if sst_fname in component_names:
+        zflo = open_member(sst_fname)
+        X12BinSST(bk, logfile, verbosity).process_stream(zflo, 'SST')
+        del zflo
+    bk._sst_size = len(bk._sharedstrings)
+    t1 = time.time()
+    bk.load_time_phases.append(('sst', t1 - t0))
+
+    def load_sheet(sheetx):
+        fname = x12book.sheet_targets[sheetx]
+        sheet = bk._sheet_list[sheetx]
+        heading = "Sheet %r (sheetx=%d) from %r" % (sheet.name, sheetx, fname)
+        zflo = open_member(fname)
+        X12BinSheet(sheet, logfile, verbosity).process_stream(zflo, heading)
+        del zflo
+        sheet.tidy_dimensions()
+        return sheet
+
+    def reopen_zip():
+        # As for XLSX, workers share the parent's file offset.
+        if zf.filename:
+            import zipfile
+            zfs[0] = zipfile.ZipFile(zf.filename)
+
+    loaded = False
+    if processes > 1 and bk.nsheets > 1:
+        from .parallel import load_sheets
+        loaded = load_sheets(bk, load_sheet, bk._sheet_list.__getitem__, processes, reopen_zip)
+    if not loaded:
+        for sheetx in range(bk.nsheets):
+            t0 = time.time()
+            load_sheet(sheetx)
+            bk.load_time_phases.append(('sheet', time.time() - t0))
+
+    bk.load_time_phases.append(('inflate', sum([getattr(stream, 'inflate_time', 0.0) for stream in members])))
+    return bk
@@ -9,11 +9,14 @@ DEBUG = 0
 
 import sys
 import re
+import time
+from array import array
 from .timemachine import *
 from .book import Book, Name
 from .biffh import error_text_from_code, XLRDError, XL_CELL_BLANK, XL_CELL_TEXT, XL_CELL_BOOLEAN, XL_CELL_ERROR
 from .formatting import is_date_format_string, Format, XF
 from .sheet import Sheet
+from . import zipstream
 
 DLF = sys.stdout # Default Log File
 
@@ -95,6 +98,27 @@ def cell_name_to_rowx_colx(cell_name, letter_value=_UPPERCASE_1_REL_INDEX):
     rowx = int(cell_name[charx:]) - 1
     return rowx, colx
 
+# Column letters (e.g. "XFD" or "$A$") -> column index. Filled as letters are
+# seen; the same few letters repeat on every row of a worksheet.
+_COLX_FROM_LETTERS = {}
+
+def letters_to_colx(letters, letter_value=_UPPERCASE_1_REL_INDEX, cache=_COLX_FROM_LETTERS):
+    # Returns -1 if letters is not a valid column name, e.g. because it was
+    # sliced off a cell name using the wrong row number.
+    colx = 0
+    for c in letters:
+        if c == '$':
+            continue
+        lv = letter_value.get(c)
+        if not lv:
+            return -1
+        colx = colx * 26 + lv
+    colx = colx - 1
+    if not 0 <= colx < X12_MAX_COLS:
+        return -1
+    cache[letters] = colx
+    return colx
+
 error_code_from_text = {}
 for _code, _text in error_text_from_code.items():
     error_code_from_text[_text] = _code
@@ -111,10 +135,24 @@ XML_SPACE_ATTR = "{http://www.w3.org/XML/1998/namespace}space"
 XML_WHITESPACE = "\t\n \r"
 X12_MAX_ROWS = 2 ** 20
 X12_MAX_COLS = 2 ** 14
+# Sheet XML smaller than this isn't worth splitting between processes
+X12_MIN_CHUNKED_SHEET_SIZE = 2 ** 22
 V_TAG = U_SSML12 + 'v' # cell child: value
 F_TAG = U_SSML12 + 'f' # cell child: formula
 IS_TAG = U_SSML12 + 'is' # cell child: inline string
 
+# Element names as reported by expat with namespace_separator='}'
+EX_ROW_TAG = U_SSML12[1:] + 'row'
+EX_C_TAG = U_SSML12[1:] + 'c'
+EX_V_TAG = V_TAG[1:]
+EX_F_TAG = F_TAG[1:]
+EX_IS_TAG = IS_TAG[1:]
+EX_T_TAG = U_SSML12[1:] + 't'
+EX_RPH_TAG = U_SSML12[1:] + 'rPh'
+EX_DIMENSION_TAG = U_SSML12[1:] + 'dimension'
+EX_MERGECELL_TAG = U_SSML12[1:] + 'mergeCell'
+EX_XML_SPACE_ATTR = XML_SPACE_ATTR[1:]
+
 def unescape(s,
     subber=re.compile(r'_x[0-9A-Fa-f]{4,4}_', re.UNICODE).sub,
     repl=lambda mobj: unichr(int(mobj.group(0)[2:6], 16)),
@@ -399,15 +437,32 @@ class X12Book(X12General):
 
 class X12SST(X12General):
 
-    def __init__(self, bk, logfile=DLF, verbosity=0):
+    def __init__(self, bk, logfile=DLF, verbosity=0, lazy=False):
         self.bk = bk
         self.logfile = logfile
         self.verbosity = verbosity
-        if ET_has_iterparse:
+        if lazy:
+            self.process_stream = self.process_stream_lazy
+        elif ET_has_iterparse:
             self.process_stream = self.process_stream_iterparse
         else:
             self.process_stream = self.process_stream_findall
-            
+
+    def process_stream_lazy(self, stream, heading=None):
+        if self.verbosity >= 2 and heading is not None:
+            fprintf(self.logfile, "\n=== %s ===\n", heading)
+        data = stream.read()
+        if data.startswith(b'\xef\xbb\xbf'):
+            data = data[3:]
+        decl = LAZY_SST_ENCODING_DECL(data, 0, 100)
+        if decl and decl.group(1).lower() not in (b'utf-8', b'utf8'):
+            # Offsets below are of UTF-8 bytes
+            self.process_stream_iterparse(BYTES_IO(data), heading)
+            return
+        self.bk._sharedstrings = LazySST(self, data)
+        if self.verbosity >= 2:
+            self.dumpout('Entries in SST: %d', len(self.bk._sharedstrings))
+
     def process_stream_iterparse(self, stream, heading=None):
         if self.verbosity >= 2 and heading is not None:
             fprintf(self.logfile, "\n=== %s ===\n", heading)
@@ -446,9 +501,113 @@ class X12SST(X12General):
         if self.verbosity >= 2:
             self.dumpout('Entries in SST: %d', len(sst))
 
+SHEET_ROOT = re.compile(br'<((?:[\w.-]+:)?)worksheet\b[^>]*>').search
+SHEET_DATA_OPEN = re.compile(br'<((?:[\w.-]+:)?)sheetData\b[^>]*?(/?)>').search
+# <row> with an explicit row number
+SHEET_ROW_START = re.compile(br'<(?:[\w.-]+:)?row\b[^>]*?\sr=["\'](\d+)["\']').search
+
+LAZY_SST_ENCODING_DECL = re.compile(br'<\?xml[^>]*encoding=["\']([^"\']+)').match
+LAZY_SST_ROOT = re.compile(br'<((?:[\w.-]+:)?)sst\b[^>]*>').search
+LAZY_SST_SI = re.compile(br'<(?:[\w.-]+:)?si\b(?:[^>]*/>|.*?</(?:[\w.-]+:)?si>)', re.DOTALL).finditer
+# <si> holding just a plain <t>, which is almost all of them
+LAZY_SST_PLAIN_SI = re.compile(br'<si><t( xml:space="preserve")?>([^<\r]*)</t></si>\Z').match
+
+class LazySST(object):
+    # Shared string table that decodes each string the first time it is
+    # looked up. Loading only records the byte offsets of the <si> elements,
+    # so strings that nobody looks at are never decoded.
+
+    def __init__(self, x12sst, data):
+        self.x12sst = x12sst
+        self.data = data
+        self.starts = starts = array('l')
+        self.ends = ends = array('l')
+        for mobj in LAZY_SST_SI(data):
+            starts.append(mobj.start())
+            ends.append(mobj.end())
+        # Decoded strings
+        self.strings = [None] * len(starts)
+        # Number of strings decoded
+        self.ndecoded = 0
+        root = LAZY_SST_ROOT(data)
+        if root:
+            # Wrapper for <si> elements that need a proper XML parse,
+            # declaring the same namespaces as the original.
+            self.head = root.group(0)
+            self.tail = b'</' + root.group(1) + b'sst>'
+        else:
+            self.head = b'<sst xmlns="' + U_SSML12[1:-1].encode('ascii') + b'">'
+            self.tail = b'</sst>'
+
+    def __len__(self):
+        return len(self.strings)
+
+    def __getitem__(self, index):
+        s = self.strings[index]
+        if s is None:
+            s = self.strings[index] = self.decode(index)
+        return s
+
+    def __iter__(self):
+        for index in xrange(len(self.strings)):
+            yield self[index]
+
+    def decode(self, index):
+        self.ndecoded += 1
+        start, end = self.starts[index], self.ends[index]
+        mobj = LAZY_SST_PLAIN_SI(self.data, start, end)
+        if mobj and b'&#' not in mobj.group(2):
+            t = mobj.group(2).decode('utf-8')
+            if '&' in t:
+                t = t.replace('&lt;', '<').replace('&gt;', '>') \
+                    .replace('&quot;', '"').replace('&apos;', "'") \
+                    .replace('&amp;', '&')
+            if not mobj.group(1):
+                t = t.strip(XML_WHITESPACE)
+            return unescape(t)
+        root = ET.fromstring(self.head + self.data[start:end] + self.tail)
+        return get_text_from_si_or_is(self.x12sst, root[0])
+
+STYLES_NUMFMT = re.compile(br'<(?:[\w.-]+:)?numFmt\b([^>]*?)/?>').finditer
+STYLES_CELLXFS = re.compile(br'<((?:[\w.-]+:)?)cellXfs\b[^>]*?(/?)>').search
+STYLES_XF = re.compile(br'<(?:[\w.-]+:)?xf\b([^>]*?)/?>').finditer
+STYLES_NUMFMTID = re.compile(br'\snumFmtId=["\'](\d+)["\']').search
+
+class X12LazyXFTypes(dict):
+    # XF index -> XL_CELL_NUMBER or XL_CELL_DATE, used when styles aren't
+    # loaded. An XF's number format is only checked for being a date format
+    # the first time a cell with that XF is found.
+
+    def __init__(self, bk, fmt_codes, xf_fmt_ids, fmt_is_date):
+        dict.__init__(self)
+        self.bk = bk
+        self.fmt_codes = fmt_codes # numFmtId -> formatCode
+        self.xf_fmt_ids = xf_fmt_ids # XF index -> numFmtId
+        # numFmtId -> is_date, starting with the built-in formats that
+        # the workbook doesn't redefine
+        self.fmt_is_date = dict(
+            (numFmtId, is_date) for numFmtId, is_date in fmt_is_date.items()
+            if numFmtId not in fmt_codes)
+
+    def __missing__(self, xfx):
+        if not 0 <= xfx < len(self.xf_fmt_ids):
+            if xfx == 0: # as for X12Styles
+                return 2
+            raise KeyError(xfx)
+        numFmtId = self.xf_fmt_ids[xfx]
+        is_date = self.fmt_is_date.get(numFmtId)
+        if is_date is None:
+            formatCode = self.fmt_codes.get(numFmtId)
+            is_date = 0
+            if formatCode is not None:
+                is_date = is_date_format_string(self.bk, formatCode)
+            self.fmt_is_date[numFmtId] = is_date
+        self[xfx] = xl_type = is_date + 2
+        return xl_type
+
 class X12Styles(X12General):
 
-    def __init__(self, bk, logfile=DLF, verbosity=0):
+    def __init__(self, bk, logfile=DLF, verbosity=0, lazy=False):
         self.bk = bk
         self.logfile = logfile
         self.verbosity = verbosity
@@ -460,6 +619,33 @@ class X12Styles(X12General):
         # dummy entry for XF 0 in case no Styles section
         self.bk._xf_index_to_xl_type_map[0] = 2
         # fill_in_standard_formats(bk) #### pre-integration kludge
+        if lazy:
+            self.process_stream = self.process_stream_lazy
+
+    # Reads only the number format of each cell XF and the format codes,
+    # without building a tree, XF objects or the Book's format_map.
+    def process_stream_lazy(self, stream, heading=None):
+        if self.verbosity >= 2 and heading is not None:
+            fprintf(self.logfile, "\n=== %s ===\n", heading)
+        data = stream.read()
+        fmt_codes = {}
+        for mobj in STYLES_NUMFMT(data):
+            elem = ET.fromstring(b'<numFmt' + mobj.group(1) + b'/>')
+            fmt_codes[int(elem.get('numFmtId'))] = ensure_unicode(elem.get('formatCode'))
+        xf_fmt_ids = []
+        cellxfs = STYLES_CELLXFS(data)
+        if cellxfs and not cellxfs.group(2):
+            end = data.find(b'</' + cellxfs.group(1) + b'cellXfs>', cellxfs.end())
+            for mobj in STYLES_XF(data, cellxfs.end(), end):
+                numFmtId = STYLES_NUMFMTID(mobj.group(1))
+                xf_fmt_ids.append(int(numFmtId.group(1)) if numFmtId else 0)
+        if self.verbosity >= 2:
+            self.dumpout('%d cell XFs, %d number formats', len(xf_fmt_ids), len(fmt_codes))
+        bk = self.bk
+        bk._xf_index_to_xl_type_map = X12LazyXFTypes(bk, fmt_codes, xf_fmt_ids, self.fmt_is_date)
+        # The sheets already have the old map
+        for sheet in bk._sheet_list:
+            sheet._xf_index_to_xl_type_map = bk._xf_index_to_xl_type_map
 
     def do_cellstylexfs(self, elem):
         self.xf_type = 0
@@ -505,19 +691,31 @@ class X12Styles(X12General):
         }
     augment_keys(tag2meth, U_SSML12)
 
+# Raised by a worker of X12Sheet.process_chunks on a row numbered before the
+# start of its chunk, which only serial parsing can put in place.
+class _RowBeforeChunk(Exception):
+    pass
+
 class X12Sheet(X12General):
 
-    def __init__(self, sheet, logfile=DLF, verbosity=0):
+    def __init__(self, sheet, logfile=DLF, verbosity=0, use_expat=False,
+                 check_cell_names=False, keep_formulas=False):
         self.sheet = sheet
         self.logfile = logfile
         self.verbosity = verbosity
+        self.use_expat = use_expat
+        self.check_cell_names = check_cell_names
+        self.keep_formulas = keep_formulas
         self.rowx = -1 # We may need to count them.
+        self.rowx_offset = 0 # row number of the first row is 1 + this
         self.bk = sheet.book
         self.sst = self.bk._sharedstrings
         self.merged_cells = sheet.merged_cells
         self.warned_no_cell_name = 0
         self.warned_no_row_num = 0
-        if ET_has_iterparse:
+        if use_expat:
+            self.process_stream = self.expat_process_stream
+        elif ET_has_iterparse:
             self.process_stream = self.own_process_stream
 
     def own_process_stream(self, stream, heading=None):
@@ -526,14 +724,223 @@ class X12Sheet(X12General):
         getmethod = self.tag2meth.get
         row_tag = U_SSML12 + "row"
         self_do_row = self.do_row
+        nelems = 0
         for event, elem in ET.iterparse(stream):
             if elem.tag == row_tag:
+                nelems += 1 + len(elem)
                 self_do_row(elem)
                 elem.clear() # destroy all child elements (cells)
             elif elem.tag == U_SSML12 + "dimension":
                 self.do_dimension(elem)
             elif elem.tag == U_SSML12 + "mergeCell":
                 self.do_merge_cell(elem)
+        self.sheet._records_read += nelems
+        self.bk._records_read += nelems
+        self.finish_off()
+
+    # Alternative to own_process_stream, driven directly by expat callbacks.
+    # Cells go straight from the parser into the sheet, without building an
+    # Element for every <row>, <c>, <v> and <f>. The callbacks run several
+    # times per cell, so they are closures over local variables.
+    def expat_process_stream(self, stream, heading=None):
+        from xml.parsers import expat
+        if self.verbosity >= 2 and heading is not None:
+            fprintf(self.logfile, "\n=== %s ===\n", heading)
+        self_put_cell = self.sheet.put_cell
+        sst = self.sst
+        fmt_info = self.bk.formatting_info
+        letter_value = _UPPERCASE_1_REL_INDEX
+        colx_from_letters = _COLX_FROM_LETTERS
+        check_cell_names = self.check_cell_names
+        rowx_offset = self.rowx_offset
+        keep_formulas = self.keep_formulas
+        formula_map = self.sheet.formula_map
+        text = [] # character data of current <v>, <t> or <f>
+        is_parts = [] # text of <t> elements in current <is>
+        cur = {
+            'attrs': None, # attributes of current <c>
+            'tvalue': None,
+            'v_attrs': None, # attributes of current <v>
+            'formula': None, # text of current <f> if keep_formulas
+            'preserve': False, # xml:space="preserve" on <t> or <f>
+            'collect': False, # inside <v>, <t> of an <is>, or <f> if keep_formulas
+            'in_is': False,
+            'in_rph': False,
+            'row_number': None,
+            'explicit_row_number': 0,
+            'fast': False, # look up column letters without checking row number
+            'lrn': 0, # -len(row_number)
+            'colx': -1,
+            'nelems': 0,
+            }
+
+        def start_element(name, attrs):
+            if name == EX_C_TAG:
+                cur['attrs'] = attrs
+                cur['tvalue'] = None
+                cur['formula'] = None
+            elif name == EX_V_TAG:
+                del text[:]
+                cur['collect'] = True
+                cur['v_attrs'] = attrs
+            elif name == EX_ROW_TAG:
+                cur['nelems'] += 1
+                row_number = attrs.get('r')
+                if row_number is None: # Yes, it's optional.
+                    self.rowx += 1
+                    cur['explicit_row_number'] = 0
+                    if self.verbosity and not self.warned_no_row_num:
+                        self.dumpout("no row number; assuming rowx=%d", self.rowx)
+                        self.warned_no_row_num = 1
+                else:
+                    self.rowx = int(row_number) - 1 - rowx_offset
+                    cur['explicit_row_number'] = 1
+                    cur['lrn'] = -len(row_number)
+                    if self.rowx < 0 and rowx_offset:
+                        raise _RowBeforeChunk
+                assert 0 <= self.rowx < X12_MAX_ROWS
+                cur['row_number'] = row_number
+                cur['fast'] = cur['explicit_row_number'] and not check_cell_names
+                cur['colx'] = -1
+            elif name == EX_F_TAG:
+                # Formulas are skipped unless they are being kept.
+                if keep_formulas:
+                    del text[:]
+                    cur['collect'] = True
+                    cur['preserve'] = attrs.get(EX_XML_SPACE_ATTR) == 'preserve'
+            elif name == EX_T_TAG:
+                if cur['in_is'] and not cur['in_rph']:
+                    del text[:]
+                    cur['collect'] = True
+                    cur['preserve'] = attrs.get(EX_XML_SPACE_ATTR) == 'preserve'
+            elif name == EX_IS_TAG:
+                del is_parts[:]
+                cur['in_is'] = True
+            elif name == EX_RPH_TAG:
+                cur['in_rph'] = True
+            elif name == EX_DIMENSION_TAG:
+                self.do_dimension(attrs)
+            elif name == EX_MERGECELL_TAG:
+                self.do_merge_cell(attrs)
+
+        def character_data(data):
+            if cur['collect']:
+                text.append(data)
+
+        def end_element(name):
+            if name == EX_V_TAG:
+                cur['tvalue'] = ''.join(text)
+                cur['collect'] = False
+            elif name == EX_C_TAG:
+                cur['nelems'] += 1
+                attrs = cur['attrs']
+                rowx = self.rowx
+                cell_name = attrs.get('r')
+                if cell_name is None: # Yes, it's optional.
+                    colx = cur['colx'] + 1
+                    if self.verbosity and not self.warned_no_cell_name:
+                        self.dumpout("no cellname; assuming rowx=%d colx=%d", rowx, colx)
+                        self.warned_no_cell_name = 1
+                elif cur['fast']:
+                    if cell_name[cur['lrn']:] != cur['row_number']:
+                        raise Exception('cell name %r but row number is %r' % (cell_name, cur['row_number']))
+                    letters = cell_name[:cur['lrn']]
+                    try:
+                        colx = colx_from_letters[letters]
+                    except KeyError:
+                        colx = letters_to_colx(letters)
+                        if colx < 0:
+                            raise Exception('cell name %r but row number is %r' % (cell_name, cur['row_number']))
+                else:
+                    # Extract column index from cell name
+                    # A<row number> => 0, Z =>25, AA => 26, XFD => 16383
+                    colx = 0
+                    charx = -1
+                    try:
+                        for c in cell_name:
+                            charx += 1
+                            if c == '$':
+                                continue
+                            lv = letter_value[c]
+                            if lv:
+                                colx = colx * 26 + lv
+                            else: # start of row number; can't be '0'
+                                colx = colx - 1
+                                assert 0 <= colx < X12_MAX_COLS
+                                break
+                    except KeyError:
+                        raise Exception('Unexpected character %r in cell name %r' % (c, cell_name))
+                    if cur['explicit_row_number'] and cell_name[charx:] != cur['row_number']:
+                        raise Exception('cell name %r but row number is %r' % (cell_name, cur['row_number']))
+                cur['colx'] = colx
+                xf_index = int(attrs.get('s', '0'))
+                cell_type = attrs.get('t', 'n')
+                tvalue = cur['tvalue']
+                if cell_type == 'n':
+                    if not tvalue:
+                        if fmt_info:
+                            self_put_cell(rowx, colx, XL_CELL_BLANK, '', xf_index)
+                    else:
+                        self_put_cell(rowx, colx, None, float(tvalue), xf_index)
+                elif cell_type == "s":
+                    if not tvalue:
+                        if fmt_info:
+                            self_put_cell(rowx, colx, XL_CELL_BLANK, '', xf_index)
+                    else:
+                        self_put_cell(rowx, colx, XL_CELL_TEXT, sst[int(tvalue)], xf_index)
+                elif cell_type == "str":
+                    if tvalue is not None:
+                        if cur['v_attrs'].get(EX_XML_SPACE_ATTR) != 'preserve':
+                            tvalue = tvalue.strip(XML_WHITESPACE)
+                        tvalue = ensure_unicode(unescape(tvalue))
+                    self_put_cell(rowx, colx, XL_CELL_TEXT, tvalue, xf_index)
+                elif cell_type == "b":
+                    self_put_cell(rowx, colx, XL_CELL_BOOLEAN, int(tvalue), xf_index)
+                elif cell_type == "e":
+                    value = error_code_from_text[tvalue]
+                    self_put_cell(rowx, colx, XL_CELL_ERROR, value, xf_index)
+                elif cell_type == "inlineStr":
+                    assert tvalue is not None
+                    self_put_cell(rowx, colx, XL_CELL_TEXT, tvalue, xf_index)
+                else:
+                    raise Exception("Unknown cell type %r in rowx=%d colx=%d" % (cell_type, rowx, colx))
+                if cur['formula']:
+                    formula_map[rowx, colx] = cur['formula']
+            elif name == EX_F_TAG:
+                if keep_formulas:
+                    t = ''.join(text)
+                    if not cur['preserve']:
+                        t = t.strip(XML_WHITESPACE)
+                    cur['formula'] = ensure_unicode(unescape(t))
+                    cur['collect'] = False
+            elif name == EX_T_TAG:
+                if cur['collect']:
+                    t = ''.join(text)
+                    if not cur['preserve']:
+                        t = t.strip(XML_WHITESPACE)
+                    is_parts.append(unescape(t))
+                    cur['collect'] = False
+            elif name == EX_IS_TAG:
+                cur['tvalue'] = ''.join(is_parts)
+                cur['in_is'] = False
+            elif name == EX_RPH_TAG:
+                cur['in_rph'] = False
+
+        parser = expat.ParserCreate(namespace_separator='}')
+        parser.buffer_text = True
+        parser.StartElementHandler = start_element
+        parser.EndElementHandler = end_element
+        parser.CharacterDataHandler = character_data
+        # Rather than ParseFile, which reads 2 KB at a time
+        read = stream.read
+        while 1:
+            data = read(zipstream.ZIP_READ_SIZE)
+            if not data:
+                break
+            parser.Parse(data, 0)
+        parser.Parse(b'', 1)
+        self.sheet._records_read += cur['nelems']
+        self.bk._records_read += cur['nelems']
         self.finish_off()
 
     def process_comments_stream(self, stream):
@@ -560,6 +967,102 @@ class X12Sheet(X12General):
                 note.text += cooked_text(self, t)
             cell_note_map[coords] = note
 
+    # Parses sheet XML data, splitting the rows between up to processes forked
+    # worker processes. Each worker parses a slice of <sheetData> starting at
+    # a <row> with a row number, into a Sheet of its own, and the rows are
+    # copied into this sheet in order. Everything outside <sheetData> is
+    # parsed here. Returns False, having loaded no cells, if the data can't
+    # be split, its rows are out of order across chunks, or worker processes
+    # can't be used.
+    def process_chunks(self, data, processes, heading=None):
+        from .parallel import imap_forked, pack_sheet, unpack_rows
+        root = SHEET_ROOT(data)
+        sheet_data = SHEET_DATA_OPEN(data)
+        if not root or not sheet_data or sheet_data.group(2):
+            return False
+        start = sheet_data.end()
+        end_tag = b'</' + sheet_data.group(1) + b'sheetData>'
+        end = data.rfind(end_tag)
+        if end < start:
+            return False
+        # (start of chunk, rowx_offset)
+        bounds = [(start, 0)]
+        for k in xrange(1, processes):
+            pos = max(start + (end - start) * k // processes, bounds[-1][0] + 1)
+            mobj = SHEET_ROW_START(data, pos, end)
+            if not mobj:
+                break
+            bounds.append((mobj.start(), int(mobj.group(1)) - 1))
+        if len(bounds) < 2:
+            return False
+        bounds.append((end, None))
+        head = root.group(0) + sheet_data.group(0)
+        tail = end_tag + b'</' + root.group(1) + b'worksheet>'
+        sheet = self.sheet
+
+        def parse_chunk(chunkx):
+            chunk_start, rowx_offset = bounds[chunkx]
+            chunk_sheet = Sheet(self.bk, sheet._position, sheet.name, sheet.number)
+            chunk_sheet.utter_max_rows = sheet.utter_max_rows
+            chunk_sheet.utter_max_cols = sheet.utter_max_cols
+            x12sheet = X12Sheet(chunk_sheet, self.logfile, self.verbosity,
+                self.use_expat, self.check_cell_names, self.keep_formulas)
+            x12sheet.rowx_offset = rowx_offset
+            try:
+                x12sheet.process_stream(BYTES_IO(head + data[chunk_start:bounds[chunkx + 1][0]] + tail))
+            except _RowBeforeChunk:
+                return chunkx, None
+            return chunkx, pack_sheet(chunk_sheet)
+
+        results = imap_forked(parse_chunk, xrange(len(bounds) - 1), processes)
+        if results is None:
+            return False
+        chunks = [None] * (len(bounds) - 1)
+        for chunkx, packed in results:
+            chunks[chunkx] = packed
+        # A row out of order belongs in an earlier chunk ...
+        if None in chunks:
+            return False
+        # ... or would overlap the next chunk's
+        nrows = 0
+        for chunkx, packed in enumerate(chunks):
+            rowx_offset = bounds[chunkx][1]
+            if rowx_offset < nrows:
+                return False
+            nrows = rowx_offset + len(packed[1])
+
+        cell_values = sheet._cell_values
+        cell_types = sheet._cell_types
+        cell_xf_indexes = sheet._cell_xf_indexes
+        bt = sheet.bt
+        for chunkx, packed in enumerate(chunks):
+            state = packed[0]
+            rowx_offset = bounds[chunkx][1]
+            for _unused in xrange(len(cell_values), rowx_offset):
+                cell_values.append([])
+                cell_types.append(bt * 0)
+            values, types, xfs = unpack_rows(packed)
+            cell_values.extend(values)
+            cell_types.extend(types)
+            cell_xf_indexes.extend(xfs)
+            sheet.ncols = max(sheet.ncols, state['ncols'])
+            sheet._put_cell_cells += state['_put_cell_cells']
+            sheet._put_cell_exceptions += state['_put_cell_exceptions']
+            sheet._put_cell_row_widenings += state['_put_cell_row_widenings']
+            sheet._put_cell_rows_appended += state['_put_cell_rows_appended']
+            sheet._records_read += state['_records_read']
+            self.bk._records_read += state['_records_read']
+            for (rowx, colx), formula in state['formula_map'].items():
+                sheet.formula_map[rowx + rowx_offset, colx] = formula
+        sheet.nrows = len(cell_values)
+        # Rows are as long as their own chunk's widest, so tidy_dimensions
+        # must check all of them.
+        sheet._first_full_rowx = sheet.nrows
+        # Everything but the rows. The cells are in place by now, so the
+        # <dimension> element doesn't preallocate any more.
+        self.process_stream(BYTES_IO(data[:start] + data[end:]), heading)
+        return True
+
     def do_dimension(self, elem):
         ref = elem.get('ref') # example: "A1:Z99" or just "A1"
         if ref:
@@ -568,6 +1071,7 @@ class X12Sheet(X12General):
             rowx, colx = cell_name_to_rowx_colx(last_cell_ref)
             self.sheet._dimnrows = rowx + 1
             self.sheet._dimncols = colx + 1
+            self.sheet.preallocate_cells()
 
     def do_merge_cell(self, elem):
         # The ref attribute should be a cell range like "B1:D5".
@@ -592,8 +1096,10 @@ class X12Sheet(X12General):
                 self.dumpout("no row number; assuming rowx=%d", self.rowx)
                 self.warned_no_row_num = 1
         else:
-            self.rowx = int(row_number) - 1
+            self.rowx = int(row_number) - 1 - self.rowx_offset
             explicit_row_number = 1
+            if self.rowx < 0 and self.rowx_offset:
+                raise _RowBeforeChunk
         assert 0 <= self.rowx < X12_MAX_ROWS
         rowx = self.rowx
         colx = -1
@@ -601,6 +1107,14 @@ class X12Sheet(X12General):
             self.dumpout("<row> row_number=%r rowx=%d explicit=%d",
                 row_number, self.rowx, explicit_row_number)
         letter_value = _UPPERCASE_1_REL_INDEX
+        colx_from_letters = _COLX_FROM_LETTERS
+        keep_formulas = self.keep_formulas
+        # Cell names end with the row number, so unless asked to decode them
+        # a character at a time, check that and slice the column letters off
+        # to look them up.
+        fast = explicit_row_number and not self.check_cell_names
+        if fast:
+            lrn = -len(row_number)
         for cell_elem in row_elem:
             cell_name = cell_elem.get('r')
             if cell_name is None: # Yes, it's optional.
@@ -608,6 +1122,16 @@ class X12Sheet(X12General):
                 if self.verbosity and not self.warned_no_cell_name:
                     self.dumpout("no cellname; assuming rowx=%d colx=%d", rowx, colx)
                     self.warned_no_cell_name = 1
+            elif fast:
+                if cell_name[lrn:] != row_number:
+                    raise Exception('cell name %r but row number is %r' % (cell_name, row_number))
+                letters = cell_name[:lrn]
+                try:
+                    colx = colx_from_letters[letters]
+                except KeyError:
+                    colx = letters_to_colx(letters)
+                    if colx < 0:
+                        raise Exception('cell name %r but row number is %r' % (cell_name, row_number))
             else:
                 # Extract column index from cell name
                 # A<row number> => 0, Z =>25, AA => 26, XFD => 16383
@@ -642,7 +1166,7 @@ class X12Sheet(X12General):
                     if child_tag == V_TAG:
                         tvalue = child.text
                     elif child_tag == F_TAG:
-                        formula = cooked_text(self, child)
+                        formula = child
                     else:
                         raise Exception('unexpected tag %r' % child_tag)
                 if not tvalue:
@@ -659,7 +1183,7 @@ class X12Sheet(X12General):
                         tvalue = child.text
                     elif child_tag == F_TAG:
                         # formula not expected here, but gnumeric does it.
-                        formula = child.text
+                        formula = child
                     else:
                         bad_child_tag(child_tag)
                 if not tvalue:
@@ -678,7 +1202,7 @@ class X12Sheet(X12General):
                     if child_tag == V_TAG:
                         tvalue = cooked_text(self, child)
                     elif child_tag == F_TAG:
-                        formula = cooked_text(self, child)
+                        formula = child
                     else:
                         bad_child_tag(child_tag)
                 # assert tvalue is not None and formula is not None
@@ -694,7 +1218,7 @@ class X12Sheet(X12General):
                     if child_tag == V_TAG:
                         tvalue = child.text
                     elif child_tag == F_TAG:
-                        formula = cooked_text(self, child)
+                        formula = child
                     else:
                         bad_child_tag(child_tag)
                 self.sheet.put_cell(rowx, colx, XL_CELL_BOOLEAN, int(tvalue), xf_index)
@@ -706,7 +1230,7 @@ class X12Sheet(X12General):
                     if child_tag == V_TAG:
                         tvalue = child.text
                     elif child_tag == F_TAG:
-                        formula = cooked_text(self, child)
+                        formula = child
                     else:
                         bad_child_tag(child_tag)
                 value = error_code_from_text[tvalue]
@@ -726,6 +1250,11 @@ class X12Sheet(X12General):
                 self.sheet.put_cell(rowx, colx, XL_CELL_TEXT, tvalue, xf_index)
             else:
                 raise Exception("Unknown cell type %r in rowx=%d colx=%d" % (cell_type, rowx, colx))
+            # The <f> element is only decoded if formulas are being kept.
+            if formula is not None and keep_formulas:
+                formula = cooked_text(self, formula)
+                if formula:
+                    self.sheet.formula_map[rowx, colx] = formula
 
     tag2meth = {
         'row':          do_row,
@@ -741,6 +1270,14 @@ def open_workbook_2007_xml(
     formatting_info=0,
     on_demand=0,
     ragged_rows=0,
+    use_expat=0,
+    check_cell_names=0,
+    lazy_sst=0,
+    processes=0,
+    keep_formulas=0,
+    load_comments=1,
+    load_core_props=1,
+    load_styles=1,
     ):
     ensure_elementtree_imported(verbosity, logfile)
     bk = Book()
@@ -749,7 +1286,7 @@ def open_workbook_2007_xml(
     bk.formatting_info = formatting_info
     if formatting_info:
         raise NotImplementedError("formatting_info=True not yet implemented")
-    bk.use_mmap = False #### Not supported initially
+    bk.use_mmap = use_mmap != 0
     bk.on_demand = on_demand
     if on_demand:
         if verbosity:
@@ -757,48 +1294,88 @@ def open_workbook_2007_xml(
         bk.on_demand = False
     bk.ragged_rows = ragged_rows
 
+    zfs = [zf] # replaced in worker processes
+    members = [] # streams opened, for their inflate_time
+
+    def open_member(name):
+        stream = zipstream.open_member(zfs[0], component_names[name])
+        members.append(stream)
+        return stream
+
     x12book = X12Book(bk, logfile, verbosity)
-    zflo = zf.open(component_names['xl/_rels/workbook.xml.rels'])
+    t0 = time.time()
+    zflo = open_member('xl/_rels/workbook.xml.rels')
     x12book.process_rels(zflo)
     del zflo
-    zflo = zf.open(component_names['xl/workbook.xml'])
+    zflo = open_member('xl/workbook.xml')
     x12book.process_stream(zflo, 'Workbook')
     del zflo
     props_name = 'docprops/core.xml'
-    if props_name in component_names:
-        zflo = zf.open(component_names[props_name])
+    if load_core_props and props_name in component_names:
+        zflo = open_member(props_name)
         x12book.process_coreprops(zflo)
+    t1 = time.time()
+    bk.load_time_phases.append(('workbook', t1 - t0))
 
-    x12sty = X12Styles(bk, logfile, verbosity)
+    x12sty = X12Styles(bk, logfile, verbosity, not load_styles)
     if 'xl/styles.xml' in component_names:
-        zflo = zf.open(component_names['xl/styles.xml'])
+        zflo = open_member('xl/styles.xml')
         x12sty.process_stream(zflo, 'styles')
         del zflo
     else:
         # seen in MS sample file MergedCells.xlsx
         pass
+    t0 = time.time()
+    bk.load_time_phases.append(('styles', t0 - t1))
 
     sst_fname = 'xl/sharedstrings.xml'
-    x12sst = X12SST(bk, logfile, verbosity)
+    x12sst = X12SST(bk, logfile, verbosity, lazy_sst)
     if sst_fname in component_names:
-        zflo = zf.open(component_names[sst_fname])
+        zflo = open_member(sst_fname)
         x12sst.process_stream(zflo, 'SST')
         del zflo
+    bk._sst_size = len(bk._sharedstrings)
+    t1 = time.time()
+    bk.load_time_phases.append(('sst', t1 - t0))
 
-    for sheetx in range(bk.nsheets):
+    def load_sheet(sheetx, chunk_processes=0):
+        zf = zfs[0]
         fname = x12book.sheet_targets[sheetx]
-        zflo = zf.open(component_names[fname])
         sheet = bk._sheet_list[sheetx]
-        x12sheet = X12Sheet(sheet, logfile, verbosity)
+        x12sheet = X12Sheet(sheet, logfile, verbosity, use_expat, check_cell_names, keep_formulas)
         heading = "Sheet %r (sheetx=%d) from %r" % (sheet.name, sheetx, fname)
-        x12sheet.process_stream(zflo, heading)
-        del zflo
+        if not (chunk_processes > 1
+                and zf.getinfo(component_names[fname]).file_size >= X12_MIN_CHUNKED_SHEET_SIZE
+                and x12sheet.process_chunks(open_member(fname).read(), chunk_processes, heading)):
+            zflo = open_member(fname)
+            x12sheet.process_stream(zflo, heading)
+            del zflo
         comments_fname = 'xl/comments%d.xml' % (sheetx + 1)
-        if comments_fname in component_names:
-            comments_stream = zf.open(component_names[comments_fname])
+        if load_comments and comments_fname in component_names:
+            comments_stream = open_member(comments_fname)
             x12sheet.process_comments_stream(comments_stream)
             del comments_stream
 
         sheet.tidy_dimensions()
+        return sheet
+
+    def reopen_zip():
+        # Workers share the parent's file offset, so each needs its own file.
+        # A zip in memory or mapped into it was copied by the fork.
+        if zf.filename:
+            import zipfile
+            zfs[0] = zipfile.ZipFile(zf.filename)
+
+    loaded = False
+    if processes > 1 and bk.nsheets > 1:
+        from .parallel import load_sheets
+        loaded = load_sheets(bk, load_sheet, bk._sheet_list.__getitem__, processes, reopen_zip)
+    if not loaded:
+        for sheetx in range(bk.nsheets):
+            t0 = time.time()
+            # A single sheet's rows are split between the processes instead.
+            load_sheet(sheetx, processes)
+            bk.load_time_phases.append(('sheet', time.time() - t0))
 
+    bk.load_time_phases.append(('inflate', sum([getattr(stream, 'inflate_time', 0.0) for stream in members])))
     return bk
@@ -0,0 +1,160 @@
+##
+# Reading the members of XLSX zip files in bounded pieces.
+#
+# <p>This module is part of the xlrd package, which is released under a BSD-style licence.</p>
+##
+
+# zipfile's own member objects decompress into a growing read-ahead buffer and
+# are read by the parsers in small pieces (2 KB at a time in the case of
+# expat's ParseFile). MemberStream reads the compressed data straight from the
+# zip file and decompresses at most as much as each read asks for, so the
+# parsers can be fed in pieces of ZIP_READ_SIZE bytes without a member ever
+# being in memory whole. The time spent reading and decompressing is kept
+# apart from the time spent parsing.
+#
+# BufferFile lets zipfile open a zip that is already in memory, or mapped into
+# it with mmap, without copying it.
+
+from __future__ import print_function
+
+import struct
+import time
+import zipfile
+import zlib
+
+# Most bytes decompressed and handed to a parser at a time.
+ZIP_READ_SIZE = 2 ** 16
+
+_LOCAL_HEADER_SIZE = 30
+_LOCAL_HEADER_SIG = b'PK\x03\x04'
+
+BadZipfile = getattr(zipfile, 'BadZipfile', None) or zipfile.BadZipFile
+
+##
+# Read-only seekable file over a string, bytes or mmap.mmap object.
+class BufferFile(object):
+
+    def __init__(self, buf):
+        self.buf = buf
+        self.pos = 0
+        self.size = len(buf)
+
+    def read(self, n=-1):
+        pos = self.pos
+        if n is None or n < 0:
+            end = self.size
+        else:
+            end = min(pos + n, self.size)
+        self.pos = max(pos, end)
+        return self.buf[pos:end]
+
+    def seek(self, offset, whence=0):
+        if whence == 1:
+            offset += self.pos
+        elif whence == 2:
+            offset += self.size
+        self.pos = max(0, offset)
+        return self.pos
+
+    def tell(self):
+        return self.pos
+
+    def seekable(self):
+        return True
+
+##
+# Open a zip file by mapping it into memory with mmap.
+def open_mapped_zip(filename):
+    import mmap
+    f = open(filename, 'rb')
+    try:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    finally:
+        f.close() # the map keeps its own handle
+    return zipfile.ZipFile(BufferFile(mm))
+
+##
+# Read-only file over a stored or deflated zip member, decompressing it as it
+# is read. inflate_time is the time in seconds spent reading and
+# decompressing the member so far.
+class MemberStream(object):
+
+    def __init__(self, zf, zinfo, read_size=ZIP_READ_SIZE):
+        fp = zf.fp
+        fp.seek(zinfo.header_offset)
+        header = fp.read(_LOCAL_HEADER_SIZE)
+        if header[:4] != _LOCAL_HEADER_SIG:
+            raise BadZipfile("Bad magic number for file header of %r" % zinfo.filename)
+        name_len, extra_len = struct.unpack('<HH', header[26:30])
+        self.name = zinfo.filename
+        self.fp = fp
+        self.pos = zinfo.header_offset + _LOCAL_HEADER_SIZE + name_len + extra_len
+        self.left = zinfo.compress_size # compressed bytes not yet read
+        self.read_size = read_size
+        self.expected_crc = zinfo.CRC
+        self.crc = 0
+        if zinfo.compress_type == zipfile.ZIP_DEFLATED:
+            self.decompressor = zlib.decompressobj(-15)
+        else:
+            self.decompressor = None
+        self.tail = b'' # compressed bytes read but not yet decompressed
+        self.buf = b'' # decompressed bytes not yet returned
+        self.eof = False
+        self.inflate_time = 0.0
+
+    # Decompress up to n more bytes.
+    def inflate(self, n):
+        t0 = time.time()
+        data = self.tail
+        if not data and self.left > 0:
+            self.fp.seek(self.pos)
+            data = self.fp.read(min(self.left, max(n, self.read_size)))
+            if not data:
+                raise BadZipfile("Truncated data for file %r" % self.name)
+            self.pos += len(data)
+            self.left -= len(data)
+        d = self.decompressor
+        if d is None:
+            out = data[:n]
+            self.tail = data[n:]
+        else:
+            out = d.decompress(data, n)
+            self.tail = d.unconsumed_tail
+            if not out and not self.tail and self.left <= 0:
+                out = d.flush()
+        if not out and not self.tail and self.left <= 0:
+            self.eof = True
+            self.decompressor = None
+            if self.crc != self.expected_crc:
+                raise BadZipfile("Bad CRC-32 for file %r" % self.name)
+        else:
+            self.crc = zlib.crc32(out, self.crc) & 0xffffffff
+        self.inflate_time += time.time() - t0
+        return out
+
+    def read(self, n=-1):
+        if n is None or n < 0:
+            pieces = [self.buf]
+            self.buf = b''
+            while not self.eof:
+                pieces.append(self.inflate(self.read_size))
+            return b''.join(pieces)
+        buf = self.buf
+        while len(buf) < n and not self.eof:
+            buf += self.inflate(n - len(buf))
+        self.buf = buf[n:]
+        return buf[:n]
+
+    def close(self):
+        pass
+
+##
+# File-like object for reading the member of zf named name. Members that
+# MemberStream can't read (encrypted ones, or ones compressed other than with
+# deflate) are opened with zipfile, and have no inflate_time.
+def open_member(zf, name, read_size=ZIP_READ_SIZE):
+    zinfo = zf.getinfo(name)
+    if (zinfo.flag_bits & 1
+        or zinfo.compress_type not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED)):
+        return zf.open(name)
+    return MemberStream(zf, zinfo, read_size)